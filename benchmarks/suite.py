@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+
+"""
+This is a suite of benchmarks for the hot paths of the toolkit (structure
+creation, wyckoff combinations, validators, lattices, file I/O, and
+transformations). Each benchmark uses a fixed composition and resets the random
+seeds before every timing, so that two runs do the exact same work and can be
+compared.
+
+To run all benchmarks and save the results:
+    python benchmarks/suite.py run --output results.json
+
+To only run some benchmarks, give part of their name:
+    python benchmarks/suite.py run --output results.json --filter wyckoff
+
+To see which benchmarks got slower (or faster) between two runs:
+    python benchmarks/suite.py compare old_results.json new_results.json
+
+The compare mode exits with a nonzero status if any benchmark regressed by more
+than the threshold (10% by default), so it can also be used in CI.
+
+Benchmarks whose dependencies aren't installed are skipped, and benchmarks
+that raise an error are recorded as errors rather than stopping the suite.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from timeit import default_timer as time
+
+import numpy
+
+SEED = 0
+
+# Here is a list of the fixed compositions that we use:
+#   Al4O6 (10 sites) is used for structure creation and transformations
+#   Mg4Si4O12 (20 sites) is used for wyckoff combinations
+#   Mg32O32 and Mg256O256 (64 and 512 sites) are rocksalt supercells used for
+#   validators and file I/O
+
+# All benchmarks are registered here as {name: (setup_function, number, repeat)}
+BENCHMARKS = {}
+
+
+def benchmark(name, number=1, repeat=5):
+    """
+    Registers a benchmark. The decorated function does any setup and then
+    returns a function (with no arguments) that is what actually gets timed.
+    The timed function is called `number` times in a row for each of the
+    `repeat` timings, and we record the average time per call.
+
+    Benchmarks are run inside a temporary directory that is deleted afterwards,
+    so any files they write can simply use relative paths.
+    """
+
+    def decorator(setup_function):
+        BENCHMARKS[name] = (setup_function, number, repeat)
+        return setup_function
+
+    return decorator
+
+
+def reset_seeds():
+    numpy.random.seed(SEED)
+    random.seed(SEED)
+
+
+# -----------------------------------------------------------------------------
+
+# Shared inputs for the benchmarks below
+
+
+def get_rocksalt(supercell_size):
+    from pymatgen.core import Structure, Lattice
+
+    structure = Structure.from_spacegroup(
+        "Fm-3m", Lattice.cubic(4.21), ["Mg", "O"], [[0, 0, 0], [0.5, 0.5, 0.5]]
+    )
+    structure.make_supercell([supercell_size] * 3)
+    return structure
+
+
+def get_random_structure(composition="Al4O6", spacegroup=None):
+    from pymatgen.core import Composition
+    from simmate.toolkit.creators.structure.random_symmetry import RandomSymStructure
+
+    creator = RandomSymStructure(Composition(composition))
+    reset_seeds()
+    structure = False
+    while not structure:
+        structure = creator.create_structure(spacegroup)
+    return structure
+
+
+# -----------------------------------------------------------------------------
+
+# Structure creation
+
+
+@benchmark("creators.RandomSymStructure.create_structure[Al4O6]", number=10)
+def bench_random_sym_structure():
+    from pymatgen.core import Composition
+    from simmate.toolkit.creators.structure.random_symmetry import RandomSymStructure
+
+    creator = RandomSymStructure(Composition("Al4O6"))
+    return creator.create_structure
+
+
+@benchmark("creators.RSLSmartVolume.new_lattice[Al4O6]", number=1000)
+def bench_new_lattice():
+    from pymatgen.core import Composition
+    from simmate.toolkit.creators.lattice.all import RSLSmartVolume
+
+    creator = RSLSmartVolume(Composition("Al4O6"))
+    return creator.new_lattice
+
+
+@benchmark("creators.RandomWySites.new_sites[Al4O6]", number=1000)
+def bench_new_sites():
+    from pymatgen.core import Composition
+    from simmate.toolkit.creators.sites.random_wyckoff import RandomWySites
+
+    creator = RandomWySites(Composition("Al4O6"))
+    return creator.new_sites
+
+
+# -----------------------------------------------------------------------------
+
+# Wyckoff combinations
+
+
+@benchmark("symmetry.findValidWyckoffCombos[Mg4Si4O12]", repeat=3)
+def bench_wyckoff_combos():
+    from simmate.toolkit.symmetry.wyckoff import findValidWyckoffCombos
+
+    return lambda: [findValidWyckoffCombos([4, 4, 12], sg) for sg in range(1, 231)]
+
+
+# -----------------------------------------------------------------------------
+
+# Validators
+
+
+@benchmark("validators.SiteDistanceMatrix.check_structure[Mg32O32]", number=100)
+def bench_site_distance_small():
+    from simmate.toolkit.validators.structure import SiteDistanceMatrix
+
+    structure = get_rocksalt(2)
+    validator = SiteDistanceMatrix(structure.composition)
+    return lambda: validator.check_structure(structure)
+
+
+@benchmark("validators.SiteDistanceMatrix.check_structure[Mg256O256]", number=5)
+def bench_site_distance_large():
+    from simmate.toolkit.validators.structure import SiteDistanceMatrix
+
+    structure = get_rocksalt(4)
+    validator = SiteDistanceMatrix(structure.composition)
+    return lambda: validator.check_structure(structure)
+
+
+@benchmark("validators.FingerprintIndex.any_within[10000x100]", number=100)
+def bench_fingerprint_index():
+    from simmate.toolkit.validators.fingerprint.index import FingerprintIndex
+
+    reset_seeds()
+    index = FingerprintIndex(numpy.random.random((10000, 100)))
+    fingerprint = numpy.random.random(100)
+    return lambda: index.any_within(fingerprint, 1e-3)
+
+
+@benchmark("validators.PartialCrystalNNFingerprint.check_structure[Al4O6]")
+def bench_pcrystalnn():
+    from simmate.toolkit.validators.fingerprint.pcrystalnn import (
+        PartialCrystalNNFingerprint,
+    )
+
+    structures = [get_random_structure() for _ in range(5)]
+    validator = PartialCrystalNNFingerprint(
+        structures[0].composition,
+        structure_pool=structures[1:],
+        add_unique_to_pool=False,
+    )
+    return lambda: validator.check_structure(structures[0])
+
+
+# -----------------------------------------------------------------------------
+
+# Lattice
+
+
+@benchmark("core.Lattice.lengths_angles", number=10000)
+def bench_lattice():
+    from simmate.toolkit.core.lattice import Lattice
+
+    matrix = [[4.2, 0, 0], [0.3, 5.1, 0], [0.2, 0.4, 6.3]]
+
+    def run():
+        lattice = Lattice(matrix)
+        return lattice.lengths, lattice.angles
+
+    # call once so that any numba functions are compiled before timing
+    run()
+    return run
+
+
+# -----------------------------------------------------------------------------
+
+# File I/O
+
+
+@benchmark("vasp.Poscar.to_file_from_file[Mg256O256]", number=10)
+def bench_poscar():
+    from simmate.calculators.vasp.inputs.poscar import Poscar
+
+    structure = get_rocksalt(4)
+
+    def run():
+        Poscar.to_file(structure, "POSCAR")
+        return Poscar.from_file("POSCAR")
+
+    return run
+
+
+@benchmark("vasp.Incar.to_file_from_file", number=100)
+def bench_incar():
+    from simmate.calculators.vasp.inputs.incar import Incar
+
+    incar = Incar(
+        ALGO="Fast",
+        EDIFF=1e-6,
+        ENCUT=520,
+        IBRION=2,
+        ISIF=3,
+        ISMEAR=0,
+        ISPIN=2,
+        LCHARG=False,
+        LORBIT=11,
+        LREAL="Auto",
+        LWAVE=False,
+        NELM=100,
+        NSW=99,
+        PREC="Accurate",
+        SIGMA=0.05,
+    )
+
+    def run():
+        incar.to_file("INCAR")
+        return Incar.from_file("INCAR")
+
+    return run
+
+
+# -----------------------------------------------------------------------------
+
+# Transformations
+
+
+@benchmark("transformations.CoordinatePerturbation[Al4O6]", number=100)
+def bench_coordinate_perturbation():
+    from simmate.toolkit.transformations.all import CoordinatePerturbation
+
+    structure = get_random_structure()
+    transformation = CoordinatePerturbation()
+    return lambda: transformation.apply_transformation(structure)
+
+
+@benchmark("transformations.AtomicPermutation[Al4O6]", number=10)
+def bench_atomic_permutation():
+    from simmate.toolkit.transformations.all import AtomicPermutation
+
+    structure = get_random_structure()
+    transformation = AtomicPermutation()
+    return lambda: transformation.apply_transformation(structure)
+
+
+@benchmark("transformations.LatticeStrain[Al4O6]", number=100)
+def bench_lattice_strain():
+    from simmate.toolkit.transformations.all import LatticeStrain
+
+    structure = get_random_structure()
+    transformation = LatticeStrain(fixed_volume=structure.volume)
+    return lambda: transformation.apply_transformation(structure)
+
+
+# -----------------------------------------------------------------------------
+
+
+def run_benchmark(name):
+    """
+    Runs a single benchmark and gives back a dictionary of its results.
+    """
+    setup_function, number, repeat = BENCHMARKS[name]
+
+    directory_original = os.getcwd()
+    directory = tempfile.TemporaryDirectory()
+    os.chdir(directory.name)
+    try:
+        reset_seeds()
+        function = setup_function()
+        times = []
+        for _ in range(repeat):
+            # every timing does the exact same work
+            reset_seeds()
+            start = time()
+            for _ in range(number):
+                function()
+            times.append((time() - start) / number)
+    except ModuleNotFoundError as error:
+        return dict(status="skipped", reason=str(error))
+    except Exception as error:
+        return dict(status="error", reason=f"{type(error).__name__}: {error}")
+    finally:
+        os.chdir(directory_original)
+        directory.cleanup()
+
+    return dict(
+        status="ok",
+        number=number,
+        repeat=repeat,
+        median=statistics.median(times),
+        mean=statistics.mean(times),
+        min=min(times),
+        stdev=statistics.stdev(times) if len(times) > 1 else 0.0,
+        times=times,
+    )
+
+
+def get_metadata():
+    """
+    Information about where the benchmarks were run. This is saved alongside
+    the results so that you know what you are comparing.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        commit = None
+
+    return dict(
+        date=datetime.now().isoformat(),
+        commit=commit or None,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        processor=platform.processor(),
+        cpu_count=os.cpu_count(),
+        numpy=numpy.__version__,
+        seed=SEED,
+    )
+
+
+def run_suite(output, name_filter=None):
+    names = [name for name in BENCHMARKS if not name_filter or name_filter in name]
+
+    results = {}
+    for name in names:
+        print(f"{name} ... ", end="", flush=True)
+        results[name] = run_benchmark(name)
+        if results[name]["status"] == "ok":
+            print(f"{format_time(results[name]['median'])}")
+        else:
+            print(f"{results[name]['status']} ({results[name]['reason']})")
+
+    with open(output, "w") as file:
+        json.dump(dict(metadata=get_metadata(), results=results), file, indent=4)
+    print(f"Results saved to {output}")
+
+
+def compare_results(old_filename, new_filename, threshold=0.1):
+    """
+    Compares the median times of two runs and prints a table of the changes.
+    Returns the names of benchmarks that are slower by more than the threshold
+    (as a fraction, so 0.1 means 10% slower).
+    """
+    with open(old_filename) as file:
+        old = json.load(file)
+    with open(new_filename) as file:
+        new = json.load(file)
+
+    print(f"old: {old['metadata']['commit']} ({old['metadata']['date']})")
+    print(f"new: {new['metadata']['commit']} ({new['metadata']['date']})")
+    print()
+    print(f"{'benchmark':<62} {'old':>10} {'new':>10} {'ratio':>7}  status")
+
+    regressions = []
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        old_result = old["results"].get(name, dict(status="missing"))
+        new_result = new["results"].get(name, dict(status="missing"))
+
+        if old_result["status"] != "ok" or new_result["status"] != "ok":
+            print(
+                f"{name:<62} {old_result['status']:>10} "
+                f"{new_result['status']:>10} {'':>7}  -"
+            )
+            continue
+
+        ratio = new_result["median"] / old_result["median"]
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        print(
+            f"{name:<62} {format_time(old_result['median']):>10} "
+            f"{format_time(new_result['median']):>10} {ratio:>7.2f}  {status}"
+        )
+
+    print()
+    print(f"{len(regressions)} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+def format_time(seconds):
+    for unit, factor in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= factor:
+            return f"{seconds / factor:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the toolkit.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run benchmarks")
+    run_parser.add_argument("--output", default="benchmark_results.json")
+    run_parser.add_argument(
+        "--filter", default=None, help="only run benchmarks with this in their name"
+    )
+
+    subparsers.add_parser("list", help="list all benchmarks")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="fraction slower that counts as a regression (default 0.1)",
+    )
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "run":
+        run_suite(arguments.output, arguments.filter)
+    elif arguments.command == "list":
+        for name in BENCHMARKS:
+            print(name)
+    elif arguments.command == "compare":
+        regressions = compare_results(arguments.old, arguments.new, arguments.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
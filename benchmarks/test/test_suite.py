@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sys
+
+import pytest
+
+# the benchmarks folder is not a package, so we import the suite by its path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import suite  # noqa: E402
+
+
+@pytest.fixture
+def extra_benchmarks():
+    # benchmarks that only exist for these tests
+
+    @suite.benchmark("test.missing_dependency")
+    def bench_missing_dependency():
+        import a_module_that_does_not_exist  # noqa: F401
+
+    @suite.benchmark("test.error")
+    def bench_error():
+        def run():
+            raise ValueError("broken")
+
+        return run
+
+    @suite.benchmark("test.random", number=3, repeat=2)
+    def bench_random():
+        values = []
+
+        def run():
+            values.append(suite.numpy.random.random())
+
+        bench_random.values = values
+        return run
+
+    @suite.benchmark("test.files")
+    def bench_files():
+        def run():
+            with open("output.txt", "w") as file:
+                file.write("benchmark")
+            bench_files.directory = os.getcwd()
+
+        return run
+
+    yield dict(random=bench_random, files=bench_files)
+    for name in ["test.missing_dependency", "test.error", "test.random", "test.files"]:
+        suite.BENCHMARKS.pop(name)
+
+
+def test_run_benchmark(extra_benchmarks):
+
+    assert suite.run_benchmark("test.missing_dependency")["status"] == "skipped"
+
+    result = suite.run_benchmark("test.error")
+    assert result == dict(status="error", reason="ValueError: broken")
+
+    result = suite.run_benchmark("test.random")
+    assert result["status"] == "ok"
+    assert len(result["times"]) == 2
+    assert result["min"] <= result["median"]
+    # seeds are reset before each timing, so every timing does the same work
+    values = extra_benchmarks["random"].values
+    assert values[:3] == values[3:]
+
+
+def test_run_benchmark_files(extra_benchmarks):
+
+    # benchmarks write files in a temporary directory that is then removed
+    directory = os.getcwd()
+    assert suite.run_benchmark("test.files")["status"] == "ok"
+    assert os.getcwd() == directory
+    bench_directory = extra_benchmarks["files"].directory
+    assert bench_directory != directory
+    assert not os.path.exists(bench_directory)
+
+
+def test_run_suite(tmp_path):
+
+    output = tmp_path / "results.json"
+    suite.run_suite(output, name_filter="RSLSmartVolume")
+
+    with open(output) as file:
+        data = json.load(file)
+    assert list(data["results"]) == ["creators.RSLSmartVolume.new_lattice[Al4O6]"]
+    assert (
+        data["results"]["creators.RSLSmartVolume.new_lattice[Al4O6]"]["status"] == "ok"
+    )
+    assert data["metadata"]["seed"] == suite.SEED
+
+
+def test_compare_results(tmp_path):
+    def write_results(filename, medians):
+        results = {
+            name: dict(status="ok", median=median)
+            if median
+            else dict(status="error", reason="")
+            for name, median in medians.items()
+        }
+        metadata = dict(commit="abc", date="today")
+        with open(tmp_path / filename, "w") as file:
+            json.dump(dict(metadata=metadata, results=results), file)
+        return tmp_path / filename
+
+    old = write_results("old.json", dict(a=1.0, b=1.0, c=1.0, d=1.0, e=1.0))
+    new = write_results("new.json", dict(a=1.05, b=1.5, c=0.5, d=None, f=1.0))
+
+    # only b is slower by more than 10%
+    assert suite.compare_results(old, new) == ["b"]
+    assert suite.compare_results(old, new, threshold=0.01) == ["a", "b"]
+    assert suite.compare_results(old, new, threshold=1) == []
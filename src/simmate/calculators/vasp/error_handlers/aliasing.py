@@ -2,7 +2,7 @@
 
 import os
 
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import ErrorHandler, get_log_scanner
 from simmate.calculators.vasp.inputs.incar import Incar
 
 
@@ -41,18 +41,17 @@ class Aliasing(ErrorHandler):
         # establish the full path to the output file
         filename = os.path.join(directory, "vasp.out")
 
-        # check to see that the file is there first
-        if os.path.exists(filename):
-
-            # read the file content and then close it
-            with open(filename) as file:
-                file_text = file.read()
-
-            # Check if each error is present
-            for error, message in self.possible_error_messages.items():
-                # if the error is NOT present, find() returns a -1
-                if file_text.find(message) != -1:
-                    errors_found.append(error)
+        # See which messages are in the file. The scanner only reads what was
+        # added to the file since the last check. If the file doesn't exist, no
+        # messages will be found.
+        messages_found = get_log_scanner(filename).find(
+            list(self.possible_error_messages.values())
+        )
+
+        # Check if each error is present
+        for error, message in self.possible_error_messages.items():
+            if message in messages_found:
+                errors_found.append(error)
 
         # If the file doesn't exist, we are not seeing any error yetm which is
         # also an empty list. Otherwise return the list of errors we found
@@ -4,7 +4,7 @@ import os
 
 from pymatgen.core.structure import Structure
 
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import ErrorHandler, get_parsed_file
 from simmate.calculators.vasp.inputs.incar import Incar
 from simmate.calculators.vasp.outputs.oszicar import Oszicar
 
@@ -26,7 +26,7 @@ class LargeSigmaErrorHandler(ErrorHandler):
 
         # load the INCAR file to view the current settings
         incar_filename = os.path.join(directory, "INCAR")
-        incar = Incar.from_file(incar_filename)
+        incar = get_parsed_file(incar_filename, Incar.from_file)
 
         # this error is only relevent if we have ISMEAR > 0. So we return that
         # there is no error otherwise.
@@ -47,7 +47,7 @@ class LargeSigmaErrorHandler(ErrorHandler):
 
             # also load the structure so we know how many sites there are
             poscar_filename = os.path.join(directory, "POSCAR")
-            structure = Structure.from_file(poscar_filename)
+            structure = get_parsed_file(poscar_filename, Structure.from_file)
             nsites = structure.num_sites
 
             # iterate through all the lines and look for the entropy value.
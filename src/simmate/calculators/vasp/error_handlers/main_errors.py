@@ -7,7 +7,11 @@ import shutil
 from pymatgen.io.vasp.outputs import Outcar
 from pymatgen.core.structure import Structure
 
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import (
+    ErrorHandler,
+    get_log_scanner,
+    get_parsed_file,
+)
 from simmate.calculators.vasp.inputs.incar import Incar
 from simmate.calculators.vasp.outputs.oszicar import Oszicar
 
@@ -94,10 +98,10 @@ class MainVaspErrors(ErrorHandler):
         # supports. In that case, we can give a list of the ones we want to look
         # for as well as a list of the ones we want to ignore.
         # If errors_to_catch is left as None, we look for all of them
-        self.errors_to_catch = errors_to_catch or list(self.error_messages.keys())
+        self.errors_to_catch = errors_to_catch or list(self.all_error_messages.keys())
         # Then remove any that were listed in errors_to_ignore
-        for error in errors_to_ignore:
-            self.errors_to_catch.pop(error)
+        for error in errors_to_ignore or []:
+            self.errors_to_catch.remove(error)
 
     def check(self, dir):
         """
@@ -113,33 +117,38 @@ class MainVaspErrors(ErrorHandler):
         # establish the full path to the output file
         filename = os.path.join(dir, "vasp.out")
 
-        # check to see that the file is there first
-        if os.path.exists(filename):
-
-            # read the file content and then close it
-            with open(filename) as file:
-                file_text = file.read()
-
-            # Check if each error is present
-            for error, message in self.error_messages.items():
-                # if the error is NOT present, find() returns a -1
-                if file_text.find(message) != -1:
-
-                    # SPECIAL CASE: For brmix, we sometimes want to ignore this
-                    if error == "brmix":
-                        # load the INCAR file to view the current settings
-                        incar_filename = os.path.join(dir, "INCAR")
-                        incar = Incar.from_file(incar_filename)
-
-                        # if NELECT is in the INCAR, that means we are running
-                        # a charged calculation (e.g. defects). If this is the
-                        # case, then we want to ingore a change in electron
-                        # density (brmix) and move on to checking the next error.
-                        if "NELECT" in incar:
-                            continue
-
-                    # add to our list of errors found
-                    errors_found.append(error)
+        # Grab all of the messages we are looking for and see which of them are in
+        # the file. The scanner only reads what was added to the file since the
+        # last check. If the file doesn't exist, no messages will be found.
+        messages = [
+            message
+            for error in self.errors_to_catch
+            for message in self.all_error_messages[error]
+        ]
+        messages_found = get_log_scanner(filename).find(messages)
+
+        # Check if each error is present
+        for error in self.errors_to_catch:
+            if not any(
+                message in messages_found for message in self.all_error_messages[error]
+            ):
+                continue
+
+            # SPECIAL CASE: For brmix, we sometimes want to ignore this
+            if error == "brmix":
+                # load the INCAR file to view the current settings
+                incar_filename = os.path.join(dir, "INCAR")
+                incar = get_parsed_file(incar_filename, Incar.from_file)
+
+                # if NELECT is in the INCAR, that means we are running
+                # a charged calculation (e.g. defects). If this is the
+                # case, then we want to ingore a change in electron
+                # density (brmix) and move on to checking the next error.
+                if incar is not None and "NELECT" in incar:
+                    continue
+
+            # add to our list of errors found
+            errors_found.append(error)
 
         # If the file doesn't exist, we are not seeing any error yetm which is
         # also an empty list. Otherwise return the list of errors we found
@@ -5,7 +5,7 @@ import os
 from pymatgen.io.vasp.outputs import Vasprun
 from pymatgen.io.vasp.inputs import Kpoints
 
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import ErrorHandler, get_parsed_file
 from simmate.calculators.vasp.inputs.incar import Incar
 
 
@@ -33,16 +33,13 @@ class MeshSymmetryErrorHandler(ErrorHandler):
 
         # load the INCAR file to view the current settings
         incar_filename = os.path.join(directory, "INCAR")
-        incar = Incar.from_file(incar_filename)
+        incar = get_parsed_file(incar_filename, Incar.from_file)
 
         # check if there is a KPOINTS file and if so, read it and check the
         # kpoint style being using.
         kpoints_filename = os.path.join(directory, "KPOINTS")
-        if os.path.exists(kpoints_filename):
-            kpoints = Kpoints.from_file(kpoints_filename)
-            kpoints_style = kpoints.style
-        else:
-            kpoints_style = None
+        kpoints = get_parsed_file(kpoints_filename, Kpoints.from_file)
+        kpoints_style = kpoints.style if kpoints else None
 
         # We can say there is no error if one of the following is true:
         #   (1) symmetry is turned off
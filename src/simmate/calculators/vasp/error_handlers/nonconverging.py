@@ -4,7 +4,7 @@ import os
 
 from simmate.calculators.vasp.inputs.incar import Incar
 from simmate.calculators.vasp.outputs.oszicar import Oszicar
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import ErrorHandler, get_parsed_file
 
 
 class NonConvergingErrorHandler(ErrorHandler):
@@ -33,12 +33,13 @@ class NonConvergingErrorHandler(ErrorHandler):
         # we also need the INCAR for this error handler
         incar_filename = os.path.join(directory, "INCAR")
 
-        # check to see that the files are there first
-        if os.path.exists(oszicar_filename) and os.path.exists(incar_filename):
+        # load each file's data. These are shared with other handlers and
+        # only parsed again when the file changes.
+        oszicar = get_parsed_file(oszicar_filename, Oszicar)
+        incar = get_parsed_file(incar_filename, Incar.from_file)
 
-            # then load each file's data
-            oszicar = Oszicar(oszicar_filename)
-            incar = Incar.from_file(incar_filename)
+        # check to see that the files are there first
+        if oszicar is not None and incar is not None:
 
             # check what the current NELM is. If it's not set, that means it's using
             # the default which is 60. This is the max SCF steps allowed.
@@ -6,7 +6,7 @@ import numpy
 
 from simmate.calculators.vasp.inputs.incar import Incar
 from simmate.calculators.vasp.outputs.oszicar import Oszicar
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import ErrorHandler, get_parsed_file
 
 
 class PositiveEnergyErrorHandler(ErrorHandler):
@@ -29,11 +29,12 @@ class PositiveEnergyErrorHandler(ErrorHandler):
         # that will tell us energies -- and therefore the fastest to read.
         filename = os.path.join(directory, "OSZICAR")
 
-        # check to see that the file is there first
-        if os.path.exists(filename):
+        # load the file's data. This is shared with other handlers and only
+        # parsed again when the file changes.
+        oszicar = get_parsed_file(filename, Oszicar)
 
-            # then load the file's data
-            oszicar = Oszicar(filename)
+        # check to see that the file is there first
+        if oszicar is not None:
 
             # before we check the final energy, we first need to make sure at
             # least one ionic step is present. If not, there isn't an error yet
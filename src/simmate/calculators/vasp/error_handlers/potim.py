@@ -4,7 +4,7 @@ import os
 
 from pymatgen.core.structure import Structure
 
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import ErrorHandler, get_parsed_file
 from simmate.calculators.vasp.inputs.incar import Incar
 from simmate.calculators.vasp.outputs.oszicar import Oszicar
 
@@ -28,15 +28,16 @@ class PotimErrorHandler(ErrorHandler):
         # that will tell us energies -- and therefore the fastest to read.
         oszicar_filename = os.path.join(directory, "OSZICAR")
 
-        # check to see that the file is there first
-        if os.path.exists(oszicar_filename):
+        # load the file's data. This is shared with other handlers and only
+        # parsed again when the file changes.
+        oszicar = get_parsed_file(oszicar_filename, Oszicar)
 
-            # then load the file's data
-            oszicar = Oszicar(oszicar_filename)
+        # check to see that the file is there first
+        if oszicar is not None:
 
             # also load the structure so we know how many sites there are
             poscar_filename = os.path.join(directory, "POSCAR")
-            structure = Structure.from_file(poscar_filename)
+            structure = get_parsed_file(poscar_filename, Structure.from_file)
             nsites = structure.num_sites
 
             # iterate through all of the ionic steps and look at the changes
@@ -71,7 +71,28 @@ def delete_cloud():
     default=60,
     help="how long to wait before checking again when the queue is found to be empty",
 )
-def start_worker(nitems_max, timeout, close_on_empty_queue, waittime_on_empty_queue):
+@click.option(
+    "--nslots",
+    "-s",
+    default=1,
+    type=int,
+    help="the number of jobs to run at the same time",
+)
+@click.option(
+    "--tag",
+    "-g",
+    "tags",
+    help="only run jobs whose tags are all in this list. To list multiple do... -g tag1 -g tag2",
+    multiple=True,
+)
+def start_worker(
+    nitems_max,
+    timeout,
+    close_on_empty_queue,
+    waittime_on_empty_queue,
+    nslots,
+    tags,
+):
     """
     This starts a Simmate Worker which will query the database for jobs to run.
 
@@ -84,6 +105,8 @@ def start_worker(nitems_max, timeout, close_on_empty_queue, waittime_on_empty_qu
         timeout=timeout,
         close_on_empty_queue=close_on_empty_queue,
         waittime_on_empty_queue=waittime_on_empty_queue,
+        nslots=nslots,
+        tags=list(tags),
     )
     worker.start()
 
@@ -1,7 +1,25 @@
 # -*- coding: utf-8 -*-
 
+from django.db import connection
+
 from simmate.database.base_data_types import DatabaseTable, table_column
 
+# When using Postgres, workflows NOTIFY this channel every time they save the
+# results of a calculation. Anything waiting on new results (such as a
+# SearchEngine) can LISTEN to it instead of constantly querying the database.
+# https://www.postgresql.org/docs/current/sql-notify.html
+CALCULATION_CHANNEL = "simmate_calculations"
+
+
+def notify_calculations_saved():
+    """
+    Signals to anyone listening that calculation results were just saved. This
+    does nothing if the database isn't Postgres.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"NOTIFY {CALCULATION_CHANNEL};")
+
 
 class Calculation(DatabaseTable):
 
@@ -56,6 +56,7 @@ class IonicStep(Structure, Thermodynamics, Forces):
         lattice_stress,
         relaxation,  # gives the related object for the foreign key
         as_dict=False,
+        defer_symmetry=False,
     ):
         # because this is a combination of tables, I need to build the data for
         # each and then feed all the results into this class
@@ -72,7 +73,11 @@ class IonicStep(Structure, Thermodynamics, Forces):
             lattice_stress,
             as_dict=True,
         )
-        structure_data = Structure.from_pymatgen(structure, as_dict=True)
+        structure_data = Structure.from_pymatgen(
+            structure,
+            as_dict=True,
+            defer_symmetry=defer_symmetry,
+        )
 
         # Now feed all of this dictionarying into one larger one.
         all_data = dict(
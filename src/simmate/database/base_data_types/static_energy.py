@@ -39,6 +39,7 @@ class StaticEnergy(Structure, Thermodynamics, Forces, Calculation):
         site_forces=None,
         lattice_stress=None,
         as_dict=False,
+        defer_symmetry=False,
         **kwargs,
     ):
         # because this is a combination of tables, I need to build the data for
@@ -49,7 +50,13 @@ class StaticEnergy(Structure, Thermodynamics, Forces, Calculation):
 
         # first grab the full dictionaries for each parent model
         structure_data = (
-            Structure.from_pymatgen(structure, as_dict=True) if structure else {}
+            Structure.from_pymatgen(
+                structure,
+                as_dict=True,
+                defer_symmetry=defer_symmetry,
+            )
+            if structure
+            else {}
         )
 
         # This data is optional (bc the calculation might not be complete yet!)
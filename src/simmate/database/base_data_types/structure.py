@@ -1,6 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.db import transaction
+
 from scipy.constants import Avogadro
+from tqdm import tqdm
 
 from pymatgen.core.structure import Structure as Structure_PMG
 
@@ -138,7 +148,14 @@ class Structure(DatabaseTable):
     # Each structure can have many Calculation(s)
 
     # symmetry info
-    spacegroup = table_column.ForeignKey(Spacegroup, on_delete=table_column.PROTECT)
+    # This can be empty if symmetry analysis was deferred when the structure was
+    # saved (see bulk_save). Use backfill_spacegroups to fill these in later.
+    spacegroup = table_column.ForeignKey(
+        Spacegroup,
+        on_delete=table_column.PROTECT,
+        blank=True,
+        null=True,
+    )
 
     # The AFLOW prototype that this structure maps to.
     # TODO: this will be a relationship in the future
@@ -150,7 +167,7 @@ class Structure(DatabaseTable):
     """ Model Methods """
 
     @classmethod
-    def from_pymatgen(cls, structure, as_dict=False, **kwargs):
+    def from_pymatgen(cls, structure, as_dict=False, defer_symmetry=False, **kwargs):
 
         # --------------------------------------
         # FIND A BETTER SPOT FOR THIS CODE. See _from_dynamic method below for more.
@@ -191,7 +208,11 @@ class Structure(DatabaseTable):
             * Avogadro
             * 1e-27
             * 1e3,
-            spacegroup_id=structure.get_space_group_info(0.1)[1],  # OPTIMIZE
+            # OPTIMIZE: symmetry analysis is slow, so it can be skipped here
+            # and done later with backfill_spacegroups
+            spacegroup_id=None
+            if defer_symmetry
+            else structure.get_space_group_info(0.1)[1],
             formula_full=structure.composition.formula,
             formula_reduced=structure.composition.reduced_formula,
             formula_anonymous=structure.composition.anonymized_formula,
@@ -202,6 +223,238 @@ class Structure(DatabaseTable):
         # return the dictionary
         return structure_dict if as_dict else cls(**structure_dict)
 
+    @classmethod
+    def from_pymatgen_many(
+        cls,
+        entries,
+        nprocs=None,
+        defer_symmetry=False,
+        chunksize=100,
+    ):
+        """
+        This is the same as calling from_pymatgen on every entry, but the
+        query-helper columns (density, formulas, symmetry, etc.) are found for
+        all entries in parallel using a pool of nprocs processes (all cores
+        by default). None of the objects are saved to the database -- use
+        bulk_save for that.
+
+        Each entry is either a pymatgen structure or a dictionary of inputs for
+        this table's from_pymatgen method (e.g. dict(id=..., structure=...)).
+
+        If defer_symmetry is True, the spacegroup column is left empty so that
+        the slow symmetry analysis can be done later with backfill_spacegroups.
+        """
+
+        # we don't need the overhead of a pool for a single process
+        if nprocs == 1:
+            structure_dicts = [
+                _from_pymatgen_as_dict(cls, entry, defer_symmetry) for entry in entries
+            ]
+        else:
+            with _get_process_pool(nprocs) as executor:
+                structure_dicts = list(
+                    executor.map(
+                        partial(
+                            _from_pymatgen_as_dict,
+                            cls,
+                            defer_symmetry=defer_symmetry,
+                        ),
+                        entries,
+                        chunksize=chunksize,
+                    )
+                )
+
+        return [cls(**structure_dict) for structure_dict in structure_dicts]
+
+    @classmethod
+    def bulk_save(
+        cls,
+        entries,
+        batch_size=1000,
+        nprocs=None,
+        defer_symmetry=False,
+        ignore_conflicts=False,
+        progressbar=True,
+    ):
+        """
+        Converts entries to database objects (see from_pymatgen_many) and saves
+        them to the database with bulk_create. Entries are handled batch_size at
+        a time, so this also works for very large iterables (e.g. millions of
+        structures streamed from a file) without holding them all in memory.
+
+        If ignore_conflicts is True, entries that are already in the database
+        (e.g. with the same id) are skipped instead of raising an error.
+
+        Returns the number of new rows saved. See bulk_save_batches for more
+        options, such as parsing raw entries and skipping ones that fail.
+        """
+        nsaved = 0
+        with tqdm(disable=not progressbar) as pbar:
+            for batch_summary in cls.bulk_save_batches(
+                entries,
+                batch_size=batch_size,
+                nprocs=nprocs,
+                defer_symmetry=defer_symmetry,
+                ignore_conflicts=ignore_conflicts,
+            ):
+                nsaved += batch_summary["nsaved"]
+                pbar.update(batch_summary["nentries"])
+        return nsaved
+
+    @classmethod
+    def bulk_save_batches(
+        cls,
+        entries,
+        batch_size=1000,
+        nprocs=None,
+        defer_symmetry=False,
+        ignore_conflicts=False,
+        parse_entry=None,
+        ignore_errors=False,
+    ):
+        """
+        This is the same as bulk_save, but it is a generator that gives back a
+        summary after each batch is saved. This lets you track progress, such
+        as to resume a long load later on. Each summary is a dictionary of...
+            nentries: the number of entries in the batch
+            nsaved: the number of new rows saved (which excludes any conflicts)
+            failed: a list of (index, error) for each entry that failed, where
+                the index is the entry's position within the batch
+
+        If parse_entry is given, it is called on each entry (within the process
+        pool) and should return inputs for from_pymatgen, or None if the entry
+        should be skipped. This is useful when entries are raw files or
+        downloaded data. It must be defined at the module level so that it can
+        be sent to other processes.
+
+        If ignore_errors is True, entries that fail are skipped and listed in
+        "failed" rather than raising an error.
+        """
+
+        convert_entry = partial(
+            _try_from_pymatgen_as_dict if ignore_errors else _from_pymatgen_as_dict,
+            cls,
+            defer_symmetry=defer_symmetry,
+            parse_entry=parse_entry,
+        )
+
+        # each process is given a few chunks from every batch. We don't need
+        # the overhead of a pool for a single process.
+        nprocs = nprocs or os.cpu_count()
+        chunksize = max(1, batch_size // (4 * nprocs))
+        executor = _get_process_pool(nprocs) if nprocs > 1 else None
+
+        # If we stop early (e.g. the generator is closed), we don't want to
+        # wait on the rest of a batch that is no longer needed.
+        try:
+            for batch in _iter_batches(entries, batch_size):
+                if executor:
+                    results = executor.map(convert_entry, batch, chunksize=chunksize)
+                else:
+                    results = map(convert_entry, batch)
+                if not ignore_errors:
+                    results = ((structure_dict, None) for structure_dict in results)
+
+                objects = []
+                failed = []
+                for index, (structure_dict, error) in enumerate(results):
+                    if error:
+                        failed.append((index, error))
+                    elif structure_dict is not None:
+                        objects.append(cls(**structure_dict))
+
+                yield dict(
+                    nentries=len(batch),
+                    nsaved=cls._bulk_create_new(objects, batch_size, ignore_conflicts),
+                    failed=failed,
+                )
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+    @classmethod
+    def _bulk_create_new(cls, objects, batch_size, ignore_conflicts):
+        # Saves the objects and returns how many new rows were added. When
+        # conflicts are ignored, bulk_create doesn't tell us which rows were
+        # skipped. So we only send objects whose unique fields (such as the id)
+        # aren't taken yet, and that way every object sent is a new row.
+        # Note: constraints over several columns (unique_together) aren't
+        # checked here, but none of our tables use them.
+        with transaction.atomic():
+            if ignore_conflicts:
+                for field in cls._meta.concrete_fields:
+                    if field.unique:
+                        objects = cls._filter_unique_taken(objects, field.attname)
+
+            cls.objects.bulk_create(
+                objects,
+                batch_size=batch_size,
+                ignore_conflicts=ignore_conflicts,
+            )
+        return len(objects)
+
+    @classmethod
+    def _filter_unique_taken(cls, objects, attname):
+        # Drops objects whose value for this unique column is already in the
+        # table (or repeated earlier in the list). Objects without a value,
+        # such as those waiting on an automatic id, are always kept.
+        values = {getattr(obj, attname) for obj in objects} - {None}
+        values_seen = set(
+            cls.objects.filter(**{f"{attname}__in": values}).values_list(
+                attname, flat=True
+            )
+        )
+        objects_new = []
+        for obj in objects:
+            value = getattr(obj, attname)
+            if value is not None:
+                if value in values_seen:
+                    continue
+                values_seen.add(value)
+            objects_new.append(obj)
+        return objects_new
+
+    @classmethod
+    def backfill_spacegroups(cls, batch_size=1000, nprocs=None, progressbar=True):
+        """
+        Runs symmetry analysis for all structures in this table that don't have
+        a spacegroup yet (e.g. those saved with defer_symmetry=True) and saves
+        the result. This is done in parallel using a pool of nprocs processes.
+        """
+
+        queryset = cls.objects.filter(spacegroup__isnull=True).order_by("pk")
+
+        # each process is given a few chunks from every batch
+        nprocs = nprocs or os.cpu_count()
+        chunksize = max(1, batch_size // (4 * nprocs))
+
+        with _get_process_pool(nprocs) as executor:
+            with tqdm(total=queryset.count(), disable=not progressbar) as pbar:
+                # We go through the table by primary key rather than with offsets
+                # because the rows we update drop out of the queryset.
+                last_pk = None
+                while True:
+                    batch_queryset = queryset
+                    if last_pk is not None:
+                        batch_queryset = batch_queryset.filter(pk__gt=last_pk)
+                    objects = list(
+                        batch_queryset.only("pk", "structure_string")[:batch_size]
+                    )
+                    if not objects:
+                        break
+
+                    spacegroups = executor.map(
+                        _get_spacegroup_number,
+                        [obj.structure_string for obj in objects],
+                        chunksize=chunksize,
+                    )
+                    for obj, spacegroup in zip(objects, spacegroups):
+                        obj.spacegroup_id = spacegroup
+                    cls.objects.bulk_update(objects, ["spacegroup"], batch_size)
+
+                    last_pk = objects[-1].pk
+                    pbar.update(len(objects))
+
     def to_pymatgen(self):
         # Converts the database object to pymatgen structure object
 
@@ -305,3 +558,59 @@ class Structure(DatabaseTable):
         # Any time you inherit from this class, you'll need to indicate which
         # django app it is associated with. For example...
         #   app_label = "third_parties"
+
+
+def _get_process_pool(nprocs):
+    # Processes are spawned rather than forked. A forked process would share
+    # this process's open database connections (and any running threads). Each
+    # new process instead sets up Django from scratch before running anything.
+    return ProcessPoolExecutor(
+        max_workers=nprocs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=importlib.import_module,
+        initargs=("simmate.configuration.django.setup_full",),
+    )
+
+
+def _from_pymatgen_as_dict(datatable, entry, defer_symmetry=False, parse_entry=None):
+    # This is a module-level function so that it can be sent to other processes.
+    # Entries are either a pymatgen structure or a dictionary of from_pymatgen
+    # inputs (which always includes "structure"). Raw entries are converted to
+    # one of these first with parse_entry.
+    if parse_entry:
+        entry = parse_entry(entry)
+        if entry is None:
+            return None
+    kwargs = entry if isinstance(entry, dict) else dict(structure=entry)
+    # Subclasses may override from_pymatgen without supporting defer_symmetry,
+    # so we only pass it when it is actually used.
+    if defer_symmetry:
+        kwargs = dict(kwargs, defer_symmetry=True)
+    return datatable.from_pymatgen(as_dict=True, **kwargs)
+
+
+def _try_from_pymatgen_as_dict(*args, **kwargs):
+    # The same as _from_pymatgen_as_dict, but any error is caught and returned
+    # so that one bad entry doesn't stop a large load. This gives back a tuple
+    # of (structure_dict, error) where one of the two is None.
+    try:
+        return _from_pymatgen_as_dict(*args, **kwargs), None
+    except Exception as error:
+        return None, repr(error)
+
+
+def _get_spacegroup_number(structure_string):
+    # see Structure.to_pymatgen for how strings are stored
+    storage_format = "CIF" if (structure_string[0] == "#") else "POSCAR"
+    structure = Structure_PMG.from_str(structure_string, fmt=storage_format)
+    return structure.get_space_group_info(0.1)[1]
+
+
+def _iter_batches(entries, batch_size):
+    # Splits an iterable into lists of batch_size without loading it all
+    iterator = iter(entries)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
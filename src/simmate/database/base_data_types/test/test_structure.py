@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from pymatgen.core import Lattice, Structure as Structure_PMG
+
+from simmate.database.base_data_types import Spacegroup
+from simmate.database.local_calculations.energy import MITStaticEnergy
+from simmate.database.local_calculations.relaxation import (
+    Quality04Relaxation,
+    Quality04IonicStep,
+)
+from simmate.database.third_parties.jarvis import JarvisStructure
+
+
+def _get_structures(n):
+    # rock salt structures of different sizes, which are all spacegroup 221
+    return [
+        Structure_PMG(
+            Lattice.cubic(3 + 0.1 * i),
+            ["Na", "Cl"],
+            [[0, 0, 0], [0.5, 0.5, 0.5]],
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def spacegroups(transactional_db):
+    Spacegroup.load_database_from_pymatgen()
+
+
+def test_from_pymatgen_many(spacegroups):
+
+    structures = _get_structures(3)
+    entries = [
+        dict(id=f"jvasp-{i}", structure=structure)
+        for i, structure in enumerate(structures)
+    ]
+
+    # running in parallel should give the same objects as running serially
+    for nprocs in [1, 2]:
+        objects = JarvisStructure.from_pymatgen_many(entries, nprocs=nprocs)
+        assert [obj.id for obj in objects] == ["jvasp-0", "jvasp-1", "jvasp-2"]
+        assert [obj.spacegroup_id for obj in objects] == [221] * 3
+        assert objects[1].volume == pytest.approx(3.1**3)
+        assert not JarvisStructure.objects.exists()
+
+    # symmetry analysis can be skipped
+    objects = JarvisStructure.from_pymatgen_many(entries, nprocs=1, defer_symmetry=True)
+    assert [obj.spacegroup_id for obj in objects] == [None] * 3
+
+    # plain structures work for subclasses that override from_pymatgen
+    objects = MITStaticEnergy.from_pymatgen_many(
+        structures, nprocs=1, defer_symmetry=True
+    )
+    assert [obj.spacegroup_id for obj in objects] == [None] * 3
+
+
+def test_bulk_save_and_backfill_spacegroups(spacegroups):
+
+    structures = _get_structures(5)
+
+    # save with deferred symmetry in small batches
+    entries = (
+        dict(id=f"jvasp-{i}", structure=structure)
+        for i, structure in enumerate(structures)
+    )
+    nsaved = JarvisStructure.bulk_save(
+        entries,
+        batch_size=2,
+        nprocs=2,
+        defer_symmetry=True,
+        progressbar=False,
+    )
+    assert nsaved == 5
+    assert JarvisStructure.objects.filter(spacegroup__isnull=True).count() == 5
+
+    # entries that are already saved are skipped when ignoring conflicts
+    entries = [dict(id="jvasp-0", structure=structures[0])]
+    with pytest.raises(Exception):
+        JarvisStructure.bulk_save(entries, nprocs=1, progressbar=False)
+    JarvisStructure.bulk_save(
+        entries,
+        nprocs=1,
+        ignore_conflicts=True,
+        progressbar=False,
+    )
+    assert JarvisStructure.objects.count() == 5
+
+    # now fill in the symmetry that was skipped
+    JarvisStructure.backfill_spacegroups(batch_size=2, nprocs=2, progressbar=False)
+    assert JarvisStructure.objects.filter(spacegroup_id=221).count() == 5
+
+
+def test_bulk_save_subclasses(spacegroups):
+
+    structures = _get_structures(3)
+
+    # StaticEnergy passes extra kwargs to the table, so defer_symmetry must
+    # be handled rather than treated as a column
+    MITStaticEnergy.bulk_save(
+        [
+            dict(structure=structure, energy=-1.0 * i, prefect_flow_run_id=str(i))
+            for i, structure in enumerate(structures)
+        ],
+        nprocs=2,
+        defer_symmetry=True,
+        progressbar=False,
+    )
+    assert MITStaticEnergy.objects.filter(spacegroup__isnull=True).count() == 3
+    MITStaticEnergy.backfill_spacegroups(nprocs=2, progressbar=False)
+    assert MITStaticEnergy.objects.filter(spacegroup_id=221).count() == 3
+
+    # IonicStep requires extra inputs and works with or without symmetry
+    relaxation = Quality04Relaxation.from_pymatgen(structures[0])
+    relaxation.save()
+    for defer_symmetry in [False, True]:
+        Quality04IonicStep.bulk_save(
+            [
+                dict(
+                    ionic_step_number=i,
+                    structure=structure,
+                    energy=-1.0 * i,
+                    site_forces=[[0, 0, 0], [0, 0, 0]],
+                    lattice_stress=[[0, 0, 0], [0, 0, 0], [0, 0, 0]],
+                    relaxation=relaxation,
+                )
+                for i, structure in enumerate(structures)
+            ],
+            nprocs=2,
+            defer_symmetry=defer_symmetry,
+            progressbar=False,
+        )
+    assert relaxation.structures.count() == 6
+    assert relaxation.structures.filter(spacegroup__isnull=True).count() == 3
+
+
+def test_bulk_save_ignore_conflicts_count(spacegroups):
+
+    # Tables with automatic ids can still conflict on other unique columns
+    # (here prefect_flow_run_id). These are skipped and not counted as saved.
+    structures = _get_structures(3)
+    nsaved = MITStaticEnergy.bulk_save(
+        [dict(structure=structures[0], prefect_flow_run_id="a")],
+        nprocs=1,
+        defer_symmetry=True,
+        progressbar=False,
+    )
+    assert nsaved == 1
+
+    run_ids = ["a", "b", "b", None, None]
+    nsaved = MITStaticEnergy.bulk_save(
+        [
+            dict(structure=structures[i % 3], prefect_flow_run_id=run_id)
+            for i, run_id in enumerate(run_ids)
+        ],
+        nprocs=1,
+        defer_symmetry=True,
+        ignore_conflicts=True,
+        progressbar=False,
+    )
+    assert nsaved == 3
+    assert MITStaticEnergy.objects.count() == 4
@@ -3,4 +3,5 @@
 from simmate.toolkit.structure_prediction.evolution.database import (
     EvolutionarySearch,
     StructureSource,
+    Fingerprint,
 )
@@ -24,6 +24,7 @@ class MaterialsProjectStructure(Structure, Thermodynamics):
         structure,
         energy,
         as_dict=False,
+        defer_symmetry=False,
     ):
         # because this is a combination of tables, I need to build the data for
         # each and then feed all the results into this class
@@ -34,7 +35,11 @@ class MaterialsProjectStructure(Structure, Thermodynamics):
             energy,
             as_dict=True,
         )
-        structure_data = Structure.from_pymatgen(structure, as_dict=True)
+        structure_data = Structure.from_pymatgen(
+            structure,
+            as_dict=True,
+            defer_symmetry=defer_symmetry,
+        )
 
         # Now feed all of this dictionarying into one larger one.
         all_data = dict(
@@ -13,9 +13,8 @@ convert to pymatgen.
 
 """
 
-from django.db import transaction
+from itertools import islice
 
-from tqdm import tqdm
 from pymatgen.io.ase import AseAtomsAdaptor
 from aflow import K as AflowKeywords
 from aflow.control import Query as AflowQuery
@@ -23,18 +22,46 @@ from aflow.control import Query as AflowQuery
 from simmate.configuration.django import setup_full  # sets up database
 
 from simmate.database.third_parties.aflow import AflowStructure
+from simmate.database.third_parties.webscraping.loader import load_entries
 from simmate.utilities import get_sanitized_structure
 
 # --------------------------------------------------------------------------------------
 
 
-@transaction.atomic
-def load_all_structures():
+def load_all_structures(
+    checkpoint_filename="aflow_checkpoint.json",
+    batch_size=500,
+    nprocs=None,
+):
+    """
+    Loads all structures from AFLOW into the database. Structures are
+    downloaded and sanitized across nprocs processes and saved batch_size at
+    a time.
+
+    Progress is recorded in checkpoint_filename. If this function stops partway
+    through, calling it again will continue where it left off.
+    """
+    return load_entries(
+        datatable=AflowStructure,
+        iter_entries=iter_entries,
+        parse_entry=parse_entry,
+        checkpoint_filename=checkpoint_filename,
+        batch_size=batch_size,
+        nprocs=nprocs,
+    )
+
+
+def iter_entries(start=0):
+    """
+    Yields all AFLOW entries (as aflow Entry objects), skipping the first
+    `start` entries. Results are requested from AFLOW a page at a time as we
+    iterate.
+    """
 
     # The way we build a query looks similar to the Django API, where we start
     # with a Query object (similar to Table.objects manager) and build filters
     # off of it.
-    data = (
+    query = (
         AflowQuery(
             # This is a list of the supported "catalogs" that AFLOW has -- which appear
             # to be separately stored databases. I just use all of them by default.
@@ -73,34 +100,34 @@ def load_all_structures():
         )
     )
 
-    # Let's sanitize all structures first. So iterate through each one in the list
-    # This also takes a while, so we use a progress bar (via tqdm)
-    for entry in tqdm(data):
+    return islice(query, start, None)
 
-        # grab the structure -- this is loaded as an ASE atoms object
-        structure_ase = entry.atoms()
 
-        # convert the structure to pymatgen
-        structure_pmg = AseAtomsAdaptor.get_structure(structure_ase)
+def parse_entry(entry):
+    """
+    Converts an AFLOW entry into the inputs for AflowStructure.from_pymatgen
+    """
 
-        # Run symmetry analysis and sanitization on the pymatgen structure
-        structure_sanitized = get_sanitized_structure(structure_pmg)
+    # grab the structure -- this is loaded as an ASE atoms object. Note this
+    # downloads the structure, which is why we do it here instead of in
+    # iter_entries (so that downloads are spread across processes).
+    structure_ase = entry.atoms()
 
-        # Compile all of our data into a dictionary
-        entry_dict = {
-            "structure": structure_sanitized,
-            "id": entry.auid.replace(":", "-"),
-            "final_energy": entry.enthalpy_cell,  # or is it energy_cell?
-            "final_energy_per_atom": entry.enthalpy_atom,
-            "formation_energy_per_atom": entry.enthalpy_formation_atom,
-            "band_gap": entry.Egap,
-        }
+    # convert the structure to pymatgen
+    structure_pmg = AseAtomsAdaptor.get_structure(structure_ase)
 
-        # now convert the entry to a database object
-        structure_db = AflowStructure.from_pymatgen(**entry_dict)
+    # Run symmetry analysis and sanitization on the pymatgen structure
+    structure_sanitized = get_sanitized_structure(structure_pmg)
 
-        # and save it to our database!
-        structure_db.save()
+    # Compile all of our data into a dictionary
+    return {
+        "structure": structure_sanitized,
+        "id": entry.auid.replace(":", "-"),
+        "final_energy": entry.enthalpy_cell,  # or is it energy_cell?
+        "final_energy_per_atom": entry.enthalpy_atom,
+        "formation_energy_per_atom": entry.enthalpy_formation_atom,
+        "band_gap": entry.Egap,
+    }
 
 
 # --------------------------------------------------------------------------------------
@@ -25,141 +25,115 @@ to account for these problematic cif files though.
 """
 
 import os
+from functools import partial
 
-from tqdm import tqdm
 from pymatgen.io.cif import CifParser
 
 from simmate.configuration.django import setup_full  # sets up database
 
 from simmate.database.third_parties.cod import CodStructure
+from simmate.database.third_parties.webscraping.loader import load_entries
 from simmate.utilities import get_sanitized_structure
 
 # --------------------------------------------------------------------------------------
 
 
-def load_all_structures(base_directory="cod/cif/"):
-
-    # For debuging and development, I keep track of all cif files that fail, and I
-    # also keep track of all possible data in the cif files.
-    all_keywords = []
-    failed_cifs = []
-
-    # We need to look at all the folders that have numbered-names (1,2,3..,9). and
-    # grab the folder inside that are also numbers. This continues until we find cif
-    # files that we can pull structures from. Note the name of the cif file is also
-    # the cod-id.
-    # We also use tqdm to monitor progress.
-    for folder_name1 in tqdm(os.listdir(base_directory)):
-
-        # skip if the folder name isn't a number
-        if not folder_name1.isnumeric():
-            continue
-
-        # otherwise go through the folders inside of this one
-        for folder_name2 in os.listdir(os.path.join(base_directory, folder_name1)):
-            # and then one more level until we hit the cifs!
-            for folder_name3 in os.listdir(
-                os.path.join(base_directory, folder_name1, folder_name2)
-            ):
-                # we now have all the foldernames we need. Let's record the full path
-                folder_path = os.path.join(
-                    base_directory, folder_name1, folder_name2, folder_name3
-                )
-
-                # now go through each cif file in this directory
-                for cif_filename in os.listdir(folder_path):
-
-                    # construct the full path to the file we are after
-                    cif_filepath = os.path.join(folder_path, cif_filename)
-
-                    try:
-
-                        # Load the structure and extra data from the cif file.
-                        # Note, some occupancies are not scaled to sum to 1. For
-                        # example, a disordered site may have [Ca:1, Sr:1] instead of
-                        # [Ca:0.5, Sr:0.5]. By setting our occupancy tolerance to
-                        # infinity, we allow this  let pymatgen scale the occupancies
-                        # so they sum to 1.
-                        cif = CifParser(
-                            cif_filepath,
-                            occupancy_tolerance=float("inf"),
-                        )
-                        data = cif.as_dict()
-
-                        # pull out the structure
-                        # note we use CifParser.get_structures instead of
-                        # Structure.from_file because we wanted the extra data too.
-                        # The COD has a lot of structures that aren't formatted properly
-                        # and various errors are thrown throughout the loading process.
-                        # for now, I just skip the ones that give issues.
-                        # !!! I should take a closer look at failed cifs in the future.
-                        try:
-                            structure = cif.get_structures()[0]
-                        except ValueError as error:
-                            # There is a common error where no structure is found, but
-                            # if this error ends up being something different, we should
-                            # make sure it's raised for visibility.
-                            if error.args != ("Invalid cif file with no structures!",):
-                                raise error
-                            # otherwise skip to the next cif file
-                            continue
-
-                        # Run symmetry analysis and sanitization on the structure
-                        structure_sanitized = get_sanitized_structure(structure)
-
-                        if (
-                            "Structure has implicit hydrogens defined, parsed structure"
-                            " unlikely to be suitable for use in calculations unless"
-                            " hydrogens added." in cif.warnings
-                        ):
-                            has_implicit_hydrogens = True
-                        else:
-                            has_implicit_hydrogens = False
-
-                        # Check that there aren't any new keywords. If any are new,
-                        # add them to our list.
-                        for key, value in data.items():
-                            for header in value.keys():
-                                if header not in all_keywords:
-                                    all_keywords.append(header)
-
-                        # Compile all of our data into a dictionary
-                        entry_dict = {
-                            # the split removes ".cif" from each file name and
-                            # the remaining number is the id
-                            "id": "cod-" + cif_filename.split(".")[0],
-                            "structure": structure_sanitized,
-                            "is_ordered": structure.is_ordered,
-                            "has_implicit_hydrogens": has_implicit_hydrogens,
-                            # OPTMIZE: right now I use the title of the paper,
-                            # but I would much rather use the DOI as it's shorter
-                            # and more useful. But a lot of cifs are missing the
-                            # _journal_paper_doi... This should be fixed.
-                            # "paper_title": data[key].get("_publ_section_title"),
-                        }
-
-                        # now convert the entry to a database object
-                        structure_db = CodStructure.from_pymatgen(**entry_dict)
-
-                        # and save it to our database!
-                        structure_db.save()
-
-                    except:  # there are a bunch of different Exceptions...
-                        failed_cifs.append(cif_filepath)
-                        print("FAILED: " + str(len(failed_cifs)))
-                        continue  # skip to the next structure
-
-    # when all structures are done, let's write the list of headers and the list
-    # of failed calculations to a file for storing.
-    # OPTIMIZE: it may be worth storing these in the database too.
-    with open("failed_cifs.txt", "w") as file:
-        file.write(str(failed_cifs))
-    with open("all_keywords.txt", "w") as file:
-        file.write(str(all_keywords))
-
+def load_all_structures(
+    base_directory="cod/cif/",
+    checkpoint_filename="cod_checkpoint.json",
+    batch_size=1000,
+    nprocs=None,
+):
+    """
+    Loads all cif files in the COD download into the database. Cif files are
+    parsed across nprocs processes and saved batch_size at a time.
+
+    Progress and failed cif files are recorded in checkpoint_filename. If this
+    function stops partway through, calling it again will continue where it
+    left off.
+    """
+    return load_entries(
+        datatable=CodStructure,
+        iter_entries=partial(iter_cif_filepaths, base_directory),
+        parse_entry=parse_cif_file,
+        checkpoint_filename=checkpoint_filename,
+        batch_size=batch_size,
+        nprocs=nprocs,
+    )
+
+
+def iter_cif_filepaths(base_directory="cod/cif/", start=0):
+    """
+    Yields the path to every cif file in the COD download, skipping the first
+    `start` files. Files are always given in the same (sorted) order.
+    """
+    # All the folders have numbered-names (1,2,3..,9), and we go through the
+    # folders inside of these until we find cif files. We sort folders as we
+    # walk through them so that the order never changes between runs.
+    ncifs = 0
+    for folder_path, folder_names, filenames in os.walk(base_directory):
+        folder_names.sort()
+        for cif_filename in sorted(filenames):
+            if not cif_filename.endswith(".cif"):
+                continue
+            ncifs += 1
+            if ncifs > start:
+                yield os.path.join(folder_path, cif_filename)
+
+
+def parse_cif_file(cif_filepath):
+    """
+    Loads a cif file from the COD and returns the inputs for
+    CodStructure.from_pymatgen. If the file has no structures, None is returned.
+    """
+
+    # Load the structure and extra data from the cif file.
+    # Note, some occupancies are not scaled to sum to 1. For example, a
+    # disordered site may have [Ca:1, Sr:1] instead of [Ca:0.5, Sr:0.5]. By
+    # setting our occupancy tolerance to infinity, we allow this  let pymatgen
+    # scale the occupancies so they sum to 1.
+    cif = CifParser(
+        cif_filepath,
+        occupancy_tolerance=float("inf"),
+    )
+
+    # pull out the structure
+    # note we use CifParser.get_structures instead of Structure.from_file
+    # because we want the warnings too. The COD has a lot of structures that
+    # aren't formatted properly and various errors are thrown throughout the
+    # loading process. These are recorded by the loader as failed cifs.
+    # !!! I should take a closer look at failed cifs in the future.
+    try:
+        structure = cif.get_structures()[0]
+    except ValueError as error:
+        # There is a common error where no structure is found, but if this
+        # error ends up being something different, we should make sure it's
+        # raised for visibility.
+        if error.args != ("Invalid cif file with no structures!",):
+            raise error
+        # otherwise skip this cif file
+        return None
+
+    # Run symmetry analysis and sanitization on the structure
+    structure_sanitized = get_sanitized_structure(structure)
+
+    has_implicit_hydrogens = (
+        "Structure has implicit hydrogens defined, parsed structure unlikely to"
+        " be suitable for use in calculations unless hydrogens added." in cif.warnings
+    )
+
+    # Compile all of our data into a dictionary
     return {
-        "failed_cifs": failed_cifs,
-        "all_keywords": all_keywords,
+        # the split removes ".cif" from each file name and the remaining number
+        # is the id
+        "id": "cod-" + os.path.basename(cif_filepath).split(".")[0],
+        "structure": structure_sanitized,
+        "is_ordered": structure.is_ordered,
+        "has_implicit_hydrogens": has_implicit_hydrogens,
+        # OPTMIZE: right now I use the title of the paper, but I would much
+        # rather use the DOI as it's shorter and more useful. But a lot of cifs
+        # are missing the _journal_paper_doi... This should be fixed.
+        # "paper_title": data[key].get("_publ_section_title"),
     }
 
 
@@ -17,9 +17,9 @@ at least saves us from manually finding the files.
 
 """
 
-from django.db import transaction
+from functools import partial
+from itertools import islice
 
-from tqdm import tqdm
 from pymatgen.core.structure import Structure
 
 from jarvis.db.figshare import data as jarvis_helper
@@ -27,59 +27,76 @@ from jarvis.db.figshare import data as jarvis_helper
 from simmate.configuration.django import setup_full  # sets up database
 
 from simmate.database.third_parties.jarvis import JarvisStructure
+from simmate.database.third_parties.webscraping.loader import load_entries
 from simmate.utilities import get_sanitized_structure
 
 # --------------------------------------------------------------------------------------
 
 
-@transaction.atomic
-def load_all_structures(filename="jarvis.json"):
-
-    # !!! Make sure you download the file, unzip it, and have it in your working
-    # directory before loading this. Simply pick the most update file from here:
-    # https://figshare.com/articles/dataset/jdft_3d-7-7-2018_json/6815699
-
+def load_all_structures(
+    dataset="dft_3d",
+    checkpoint_filename="jarvis_checkpoint.json",
+    batch_size=1000,
+    nprocs=None,
+):
+    """
+    Loads all structures from a JARVIS dataset into the database. Structures
+    are sanitized across nprocs processes and saved batch_size at a time.
+
+    Progress is recorded in checkpoint_filename. If this function stops partway
+    through, calling it again will continue where it left off.
+    """
+    return load_entries(
+        datatable=JarvisStructure,
+        iter_entries=partial(iter_entries, dataset),
+        parse_entry=parse_entry,
+        checkpoint_filename=checkpoint_filename,
+        batch_size=batch_size,
+        nprocs=nprocs,
+    )
+
+
+def iter_entries(dataset="dft_3d", start=0):
+    """
+    Yields all entries (as dictionaries) in a JARVIS dataset, skipping the first
+    `start` entries.
+    """
     # Load all of the 3D data from JARVIS. This gives us a list of dictionaries
+    # and also handles downloading the data file the first time it is called.
     # TODO: In the future, we can include other datasets like their 2D dataset.
-    data = jarvis_helper("dft_3d")
-
-    # Now iterate through all the data -- which is a list of dictionaries.
-    # We convert the data into a pymatgen object and sanitize it before saving
-    # to the Simmate database
-    for entry in tqdm(data):
-
-        # The structure is in the atoms field as a dictionary. We pull this data
-        # out and convert it to a pymatgen Structure object
-        structure = Structure(
-            lattice=entry["atoms"]["lattice_mat"],
-            species=entry["atoms"]["elements"],
-            coords=entry["atoms"]["coords"],
-            coords_are_cartesian=entry["atoms"]["cartesian"],
-        )
-
-        # Run symmetry analysis and sanitization on the pymatgen structure
-        structure_sanitized = get_sanitized_structure(structure)
-
-        # Compile all of our data into a dictionary. If a value doesn't exist
-        # for a given entry, JARVIS just uses "na" instead. We need to replace
-        # these with None.
-        entry_dict = {
-            "structure": structure_sanitized,
-            "id": entry["jid"].lower(),
-            # the *1000 converts to meV
-            "energy_above_hull": entry["ehull"] * 1000
-            if entry["ehull"] != "na"
-            else None,
-            "formation_energy_per_atom": entry["formation_energy_peratom"]
-            if entry["formation_energy_peratom"] != "na"
-            else None,
-        }
-
-        # now convert the entry to a database object
-        structure_db = JarvisStructure.from_pymatgen(**entry_dict)
-
-        # and save it to our database!
-        structure_db.save()
+    data = jarvis_helper(dataset)
+    return islice(data, start, None)
+
+
+def parse_entry(entry):
+    """
+    Converts a JARVIS entry into the inputs for JarvisStructure.from_pymatgen
+    """
+
+    # The structure is in the atoms field as a dictionary. We pull this data
+    # out and convert it to a pymatgen Structure object
+    structure = Structure(
+        lattice=entry["atoms"]["lattice_mat"],
+        species=entry["atoms"]["elements"],
+        coords=entry["atoms"]["coords"],
+        coords_are_cartesian=entry["atoms"]["cartesian"],
+    )
+
+    # Run symmetry analysis and sanitization on the pymatgen structure
+    structure_sanitized = get_sanitized_structure(structure)
+
+    # Compile all of our data into a dictionary. If a value doesn't exist
+    # for a given entry, JARVIS just uses "na" instead. We need to replace
+    # these with None.
+    return {
+        "structure": structure_sanitized,
+        "id": entry["jid"].lower(),
+        # the *1000 converts to meV
+        "energy_above_hull": entry["ehull"] * 1000 if entry["ehull"] != "na" else None,
+        "formation_energy_per_atom": entry["formation_energy_peratom"]
+        if entry["formation_energy_peratom"] != "na"
+        else None,
+    }
 
 
 # --------------------------------------------------------------------------------------
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+
+This file holds the pipeline that all of our third-party loaders share. Each
+loader (COD, JARVIS, AFLOW, OQMD, Materials Project) only needs to provide...
+    (1) an entry iterator that streams raw entries (files, dictionaries, etc.)
+    (2) a parsing function that converts one raw entry into from_pymatgen inputs
+
+Everything else is handled here. Raw entries are read in batches, parsed and
+sanitized across a pool of processes, and then saved with a single bulk_create
+per batch. After each batch is committed, we record our progress in a
+checkpoint file. If a load crashes (or is stopped) partway through, calling
+it again skips every entry that was already saved instead of restarting.
+
+Because of this, entry iterators must always give entries in the same order.
+To restart a load from scratch, simply delete the checkpoint file.
+
+"""
+
+import os
+import json
+import tempfile
+
+from tqdm import tqdm
+
+# --------------------------------------------------------------------------------------
+
+
+def load_entries(
+    datatable,
+    iter_entries,
+    parse_entry,
+    checkpoint_filename,
+    batch_size=1000,
+    nprocs=None,
+    total=None,
+    progressbar=True,
+):
+    """
+    Loads entries from a third-party database into the given datatable.
+
+    iter_entries is a function that takes the number of entries to skip (start)
+    and returns an iterable of raw entries. parse_entry takes one raw entry and
+    returns a dictionary of inputs for datatable.from_pymatgen (or None if the
+    entry should be skipped). parse_entry needs to be defined at the module
+    level so that it can be sent to other processes.
+
+    The parsing and saving is done by datatable.bulk_save_batches, and this
+    function records progress in the checkpoint file after each batch.
+
+    Entries that fail to parse are skipped and listed in the checkpoint file.
+    For entries that are file paths, the path is recorded. Otherwise, we record
+    the entry's position in iter_entries.
+
+    Entries that are already in the database (i.e. with the same id) are left
+    as they are and are not counted as saved.
+
+    Returns the final checkpoint, which is a dictionary of the number of
+    entries processed and saved, along with the list of failed entries.
+    """
+
+    checkpoint = _read_checkpoint(checkpoint_filename)
+    start = checkpoint["nprocessed"]
+
+    # We keep each batch of raw entries so that failures can be reported
+    # with the entry itself (e.g. a file path) rather than just its index.
+    batch = []
+
+    def record_entries():
+        for entry in iter_entries(start):
+            batch.append(entry)
+            yield entry
+
+    with tqdm(total=total, initial=start, disable=not progressbar) as pbar:
+        for batch_summary in datatable.bulk_save_batches(
+            record_entries(),
+            batch_size=batch_size,
+            nprocs=nprocs,
+            ignore_conflicts=True,
+            parse_entry=parse_entry,
+            ignore_errors=True,
+        ):
+            # Entries are only marked as processed once their batch is saved.
+            # If we crash in between, the batch is loaded again on restart,
+            # which is safe because conflicts are ignored.
+            for index, error in batch_summary["failed"]:
+                entry = batch[index]
+                if not isinstance(entry, str):
+                    entry = checkpoint["nprocessed"] + index
+                checkpoint["failed"].append([entry, error])
+            checkpoint["nprocessed"] += batch_summary["nentries"]
+            checkpoint["nsaved"] += batch_summary["nsaved"]
+            _write_checkpoint(checkpoint_filename, checkpoint)
+
+            del batch[: batch_summary["nentries"]]
+            pbar.update(batch_summary["nentries"])
+
+    return checkpoint
+
+
+def _read_checkpoint(filename):
+    if not os.path.exists(filename):
+        return dict(nprocessed=0, nsaved=0, failed=[])
+    with open(filename) as file:
+        return json.load(file)
+
+
+def _write_checkpoint(filename, checkpoint):
+    # We write to a temporary file and then move it into place, so that a
+    # crash while writing never leaves us with a broken checkpoint
+    directory = os.path.dirname(os.path.abspath(filename))
+    with tempfile.NamedTemporaryFile(
+        "w",
+        dir=directory,
+        suffix=".tmp",
+        delete=False,
+    ) as file:
+        json.dump(checkpoint, file)
+    os.replace(file.name, filename)
+
+
+# --------------------------------------------------------------------------------------
@@ -13,17 +13,19 @@ structure and convert to a LLL reduced cell.
 
 """
 
-from django.db import transaction
+from functools import partial
+from itertools import islice
 
-from tqdm import tqdm
 from pymatgen.ext.matproj import MPRester
 
 from simmate.configuration.django import setup_full  # sets up database
 
 from simmate.database.third_parties.materials_project import MaterialsProjectStructure
+from simmate.database.third_parties.webscraping.loader import load_entries
+
+# --------------------------------------------------------------------------------------
 
 
-@transaction.atomic
 def load_all_structures(
     # criteria={"task_id": {"$exists": True}},
     # !!! for testing
@@ -31,12 +33,33 @@ def load_all_structures(
         "task_id": {"$exists": True, "$in": ["mp-" + str(n) for n in range(1, 1000)]},
     },
     api_key="2Tg7uUvaTAPHJQXl",  # TODO remove in production - maybe to a config file
+    checkpoint_filename="materials_project_checkpoint.json",
+    batch_size=1000,
+    nprocs=None,
 ):
-
-    # We save a lot of structures to the database here, but we don't want to make an
-    # new database call each time we save. That could overload our server and cause
-    # it to crash. Instead, the "@transaction.atomic" let's us save all structures in
-    # just one call to the database.
+    """
+    Loads all structures that match the criteria from the Materials Project into
+    the database. Structures are converted across nprocs processes and saved
+    batch_size at a time.
+
+    Progress is recorded in checkpoint_filename. If this function stops partway
+    through, calling it again will continue where it left off.
+    """
+    return load_entries(
+        datatable=MaterialsProjectStructure,
+        iter_entries=partial(iter_entries, criteria, api_key),
+        parse_entry=parse_entry,
+        checkpoint_filename=checkpoint_filename,
+        batch_size=batch_size,
+        nprocs=nprocs,
+    )
+
+
+def iter_entries(criteria, api_key, start=0):
+    """
+    Gives all Materials Project entries (as dictionaries) that match the
+    criteria, skipping the first `start` entries.
+    """
 
     # Filtering criteria for which structures to look at in the Materials Project
     # Catagories such as 'elements' that we can filter off of are listed here:
@@ -72,23 +95,23 @@ def load_all_structures(
     # memory (RAM >10GB) and a stable internet connection.
     data = mpr.query(criteria, properties)
 
-    # Let's iterate through each structure and save it to the database
-    # This also takes a while, so we use a progress bar
-    # BUG: We init and update tqdm separately beacuse it conflicts with MPRester's bar
-    progress_bar = tqdm(total=len(data), position=0)
-    for entry in data:
+    return islice(data, start, None)
+
+
+def parse_entry(entry):
+    """
+    Converts a Materials Project entry into the inputs for
+    MaterialsProjectStructure.from_pymatgen
+    """
 
-        # update the progress bar
-        progress_bar.update(1)
+    # TODO:
+    # bs = mpr.get_bandstructure_by_material_id("mp-323")
 
-        # TODO:
-        # bs = mpr.get_bandstructure_by_material_id("mp-323")
+    return {
+        "id": entry["material_id"],
+        "structure": entry["structure"],
+        "energy": entry["final_energy"],
+    }
 
-        structure_db = MaterialsProjectStructure.from_pymatgen(
-            id=entry["material_id"],
-            structure=entry["structure"],
-            energy=entry["final_energy"],
-        )
 
-        # and save it to our database!
-        structure_db.save()
+# --------------------------------------------------------------------------------------
@@ -13,109 +13,117 @@ For other options such as the REST API, check out http://oqmd.org/static/docs/re
 
 """
 
-from django.db import transaction
-
-from tqdm import tqdm
 from pymatgen.core.structure import Structure
 import qmpy_rester
 
 from simmate.configuration.django import setup_full  # sets up database
 
 from simmate.database.third_parties.oqmd import OqmdStructure
+from simmate.database.third_parties.webscraping.loader import load_entries
 from simmate.utilities import get_sanitized_structure
 
 # --------------------------------------------------------------------------------------
 
 
-@transaction.atomic
-def load_all_structures():
+def load_all_structures(
+    checkpoint_filename="oqmd_checkpoint.json",
+    batch_size=1000,
+    nprocs=None,
+):
+    """
+    Loads all structures from the OQMD into the database. Structures are
+    sanitized across nprocs processes and saved batch_size at a time.
+
+    Progress is recorded in checkpoint_filename. If this function stops partway
+    through, calling it again will continue where it left off.
+    """
+    return load_entries(
+        datatable=OqmdStructure,
+        iter_entries=iter_entries,
+        parse_entry=parse_entry,
+        checkpoint_filename=checkpoint_filename,
+        batch_size=batch_size,
+        nprocs=nprocs,
+    )
+
+
+def iter_entries(start=0):
+    """
+    Yields all OQMD entries (as dictionaries), skipping the first `start`
+    entries. Entries are downloaded a page at a time as we iterate, so the
+    full dataset is never held in memory.
+    """
 
     # The documentation indicates that we handle a query via a context manager
     # for qmpy_rester. Each query is returned as a page of data, where we need
     # to iterate through all of the pages. To do this, we constantly make a query
     # and check the "next" field, which tells us if its the last page or not.
 
-    # as we download all the data, we store it in a main list
-    data = []
+    # results per page is set based on OQMD recommendations and is constant (2000)
+    # !!! for testing, try a smaller number like 100
+    results_per_page = 100
 
-    # starting from the first page, assume we aren't on the last page until told
-    # otherwise. And loop until we know its the last page.
-    current_page = 0
+    # starting from the first entry we want, assume we aren't on the last page
+    # until told otherwise. And loop until we know its the last page.
+    offset = start
     is_last_page = False
     while not is_last_page:
 
-        # results per page is set based on OQMD recommendations and is constant (2000)
-        # !!! for testing, try a smaller number like 100
-        results_per_page = 100
-
         with qmpy_rester.QMPYRester() as query:
 
             # make the query
             result = query.get_oqmd_phases(
                 verbose=False,
                 limit=results_per_page,
-                offset=current_page * results_per_page,
+                offset=offset,
                 #
                 # Note delta_e is the formation energy and then stability is the
                 # energy above hull.
                 fields="entry_id,unit_cell,sites,delta_e,stability,band_gap",
                 element_set="Al,C",  # !!! for testing
             )
-            # grab the data for the next slice of structures
-            query_slice = result["data"]
-            # And check to see if this is the last page. The logic here is if
-            # there is data for "next", then it isn't the last page
-            is_last_page = not bool(result["links"]["next"])
-
-            # store the slice of entrys in our main list
-            for entry in query_slice:
-                data.append(entry)
-
-            # on the very first page, let's also check the total number of pages
-            if current_page == 0:
-                total_pages = result["meta"]["data_available"] // results_per_page
-
-            # move on to the next page
-            print(f"Successfully downloaded page {current_page} of {total_pages}")
-            current_page += 1
-
-    # Now iterate through all the data -- which is a list of dictionaries.
-    # We convert the data into a pymatgen object and sanitize it before saving
-    # to the Simmate database
-    for entry in tqdm(data):
-
-        # Parse the data into a pymatgen object
-        # Also before converting into a pymatgen object, we need to parse the sites,
-        # which are given as a list of "Element @ X Y Z" (for example "Na @ 0.5 0.5 0.5")
-        # Changing this format is why we have this complex lists below
-        structure = Structure(
-            lattice=entry["unit_cell"],
-            species=[site.split(" @ ")[0] for site in entry["sites"]],
-            coords=[
-                [float(n) for n in site.split(" @ ")[1].split()]
-                for site in entry["sites"]
-            ],
-            coords_are_cartesian=False,
-        )
-
-        # Run symmetry analysis and sanitization on the pymatgen structure
-        structure_sanitized = get_sanitized_structure(structure)
-
-        # Compile all of our data into a dictionary
-        entry_dict = {
-            "structure": structure_sanitized,
-            "id": "oqmd-" + str(entry["entry_id"]),
-            # the *1000 converts to meV
-            "energy_above_hull": entry["stability"] * 1000,
-            "final_energy": entry["delta_e"],
-            "band_gap": entry["band_gap"],
-        }
-
-        # now convert the entry to a database object
-        structure_db = OqmdStructure.from_pymatgen(**entry_dict)
-
-        # and save it to our database!
-        structure_db.save()
+
+        # And check to see if this is the last page. The logic here is if
+        # there is data for "next", then it isn't the last page
+        is_last_page = not bool(result["links"]["next"])
+
+        # give back the entries for this slice of structures
+        yield from result["data"]
+
+        # move on to the next page
+        offset += results_per_page
+
+
+def parse_entry(entry):
+    """
+    Converts an OQMD entry into the inputs for OqmdStructure.from_pymatgen
+    """
+
+    # Parse the data into a pymatgen object
+    # Also before converting into a pymatgen object, we need to parse the sites,
+    # which are given as a list of "Element @ X Y Z" (for example "Na @ 0.5 0.5 0.5")
+    # Changing this format is why we have this complex lists below
+    structure = Structure(
+        lattice=entry["unit_cell"],
+        species=[site.split(" @ ")[0] for site in entry["sites"]],
+        coords=[
+            [float(n) for n in site.split(" @ ")[1].split()] for site in entry["sites"]
+        ],
+        coords_are_cartesian=False,
+    )
+
+    # Run symmetry analysis and sanitization on the pymatgen structure
+    structure_sanitized = get_sanitized_structure(structure)
+
+    # Compile all of our data into a dictionary
+    return {
+        "structure": structure_sanitized,
+        "id": "oqmd-" + str(entry["entry_id"]),
+        # the *1000 converts to meV
+        "energy_above_hull": entry["stability"] * 1000,
+        "final_energy": entry["delta_e"],
+        "band_gap": entry["band_gap"],
+    }
 
 
 # --------------------------------------------------------------------------------------
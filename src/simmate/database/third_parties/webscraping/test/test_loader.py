@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import json
+from functools import partial
+
+import pytest
+from pymatgen.core import Lattice, Structure
+
+from simmate.database.base_data_types import Spacegroup
+from simmate.database.third_parties.jarvis import JarvisStructure
+from simmate.database.third_parties.webscraping.loader import load_entries
+
+
+class LoaderCrash(Exception):
+    pass
+
+
+def iter_toy_entries(start=0, crash_at=None):
+    # Gives 10 raw entries, which are just numbers. We can also pretend the
+    # load crashes (e.g. a lost connection) when reaching a given entry.
+    for number in range(start, 10):
+        if number == crash_at:
+            raise LoaderCrash()
+        yield number
+
+
+def parse_toy_entry(number):
+    if number == 3:
+        raise ValueError("entry 3 is broken")
+    if number == 7:
+        return None  # entries can also be skipped on purpose
+    structure = Structure(
+        Lattice.cubic(3 + 0.1 * number),
+        ["Na", "Cl"],
+        [[0, 0, 0], [0.5, 0.5, 0.5]],
+    )
+    return dict(id=f"jvasp-{number}", structure=structure)
+
+
+@pytest.mark.parametrize("nprocs", [1, 2])
+def test_load_entries(nprocs, transactional_db, tmp_path):
+
+    Spacegroup.load_database_from_pymatgen()
+    checkpoint_filename = str(tmp_path / "checkpoint.json")
+
+    # this entry is already in the database, so it shouldn't count as saved
+    JarvisStructure.from_pymatgen(**parse_toy_entry(8)).save()
+
+    # The first load crashes when reaching entry 5. The first two batches
+    # (entries 0-3) were saved, but the third (4-5) was never finished.
+    with pytest.raises(LoaderCrash):
+        load_entries(
+            datatable=JarvisStructure,
+            iter_entries=partial(iter_toy_entries, crash_at=5),
+            parse_entry=parse_toy_entry,
+            checkpoint_filename=checkpoint_filename,
+            batch_size=2,
+            nprocs=nprocs,
+            progressbar=False,
+        )
+    with open(checkpoint_filename) as file:
+        checkpoint = json.load(file)
+    assert checkpoint["nprocessed"] == 4
+    assert checkpoint["nsaved"] == 3
+    assert checkpoint["failed"] == [[3, "ValueError('entry 3 is broken')"]]
+    assert JarvisStructure.objects.count() == 4
+
+    # Calling the load again continues from entry 4 rather than restarting
+    checkpoint = load_entries(
+        datatable=JarvisStructure,
+        iter_entries=iter_toy_entries,
+        parse_entry=parse_toy_entry,
+        checkpoint_filename=checkpoint_filename,
+        batch_size=2,
+        nprocs=nprocs,
+        progressbar=False,
+    )
+    assert checkpoint["nprocessed"] == 10
+    assert checkpoint["nsaved"] == 7  # 0-9 except 3, 7, and 8
+    assert len(checkpoint["failed"]) == 1
+    assert JarvisStructure.objects.count() == 8
+    assert not JarvisStructure.objects.filter(id__in=["jvasp-3", "jvasp-7"]).exists()
+
+    # once finished, calling the load again does nothing
+    checkpoint = load_entries(
+        datatable=JarvisStructure,
+        iter_entries=iter_toy_entries,
+        parse_entry=parse_toy_entry,
+        checkpoint_filename=checkpoint_filename,
+        progressbar=False,
+    )
+    assert checkpoint["nprocessed"] == 10
+    assert checkpoint["nsaved"] == 7
@@ -2,6 +2,7 @@
 
 ##############################################################################
 
+import numpy
 from numpy.random import choice
 
 from pymatgen.core.lattice import Lattice
@@ -128,6 +129,11 @@ class RSLFixedVolume(RandomSymLattice):
     # composition (total atoms and their type)
     # spacegroup (conventional vs primitive size)
 
+    # how many lattices in a row can fail before we give up (rather than trying
+    # forever). This is about where the old recursive version would hit
+    # python's recursion limit.
+    max_failed_attempts = 1000
+
     def __init__(self, volume, **kwargs):
         # run the same parent init
         super().__init__(**kwargs)
@@ -137,28 +143,32 @@ class RSLFixedVolume(RandomSymLattice):
         self.volume = volume
 
     def new_lattice(self, spacegroup=None):
-        # run the same parent new_lattice, which returns a lattice
-        lattice = super().new_lattice(spacegroup)
-
-        # now scale the lattice to the specified volume
-        lattice = lattice.scale(self.volume)
-
-        # in scaling, we might have broken the conditions of min/max_vectors
-        # I check this and if it fails, I scrap the lattice and try making a new one via recursion
-        check = True  # assume valid until proven otherwise
-        for vector in [lattice.a, lattice.b, lattice.c]:
-            if vector < self.vector_generator.min_value:
-                check = False
-                break
-            elif vector > self.vector_generator.max_value:
-                check = False
-                break
-        if not check:
-            # this is a recursion call that will be hit repeatedly until a valid lattice is found
-            #!!! this will throw a recursion error if the volume and min/max_vectors are unreasonable
-            lattice = self.new_lattice(spacegroup)
 
-        return lattice
+        # in scaling, we might break the conditions of min/max_vectors. If that
+        # happens, we scrap the lattice and try making a new one until a valid
+        # lattice is found
+        for _ in range(self.max_failed_attempts):
+            # run the same parent new_lattice, which returns a lattice
+            lattice = super().new_lattice(spacegroup)
+
+            # now scale the lattice to the specified volume
+            lattice = lattice.scale(self.volume)
+
+            if all(
+                self.vector_generator.min_value
+                <= vector
+                <= self.vector_generator.max_value
+                for vector in lattice.abc
+            ):
+                return lattice
+
+        # if the volume and min/max_vectors are unreasonable, we might never
+        # find a valid lattice
+        raise Exception(
+            f"Unable to find a valid lattice for spacegroup {spacegroup} "
+            f"after {self.max_failed_attempts} attempts. Check that the volume "
+            "is reasonable for the min/max vector lengths."
+        )
 
 
 ##############################################################################
@@ -168,6 +178,15 @@ from simmate.utilities import estimate_volume, estimate_radii
 
 #!!! EASY SPEED/MEMORY IMPROVEMENTS CAN BE MADE HERE (ON INIT)
 class RSLSmartVolume:
+
+    # how many lattices to make at a time for a spacegroup. Leftover lattices
+    # are saved for the next call to new_lattice.
+    batch_size = 64
+
+    # how many batches in a row can fail to give a valid lattice before we
+    # give up (rather than trying forever)
+    max_failed_batches = 100
+
     def __init__(
         self,
         composition,
@@ -228,6 +247,9 @@ class RSLSmartVolume:
         # Unlike the vector_generators, we can use the same generator here for all spacegroups
         self.angle_generator = angle_generation_method(**angle_gen_options)
 
+        # lattices that have been made but not used yet. keys are spacegroup
+        self._lattice_buffers = {}
+
     def new_lattice(self, spacegroup=None):
 
         # if a spacegroup is not specified, grab a random one from our options
@@ -236,65 +258,127 @@ class RSLSmartVolume:
             # randomly select a symmetry system
             spacegroup = choice(self.spacegroup_options)
 
-        # For our target spacegroup, grab the target volume and vector_generator
-        volume = self.volumes[spacegroup]
-        vector_generator = self.vector_generators[spacegroup]
-
-        # run the same parent new_lattice, which returns a lattice
-        # if a spacegroup is not specified, grab a random one from our options
-        # no check is done to see if the spacegroup specified is compatible with the vector_generator built
-        if not spacegroup:
-            # randomly select a symmetry system
-            spacegroup = choice(self.spacegroup_options)
+        # Lattices are made in batches (see new_lattice_matrices) and then handed
+        # out one at a time from a buffer for each spacegroup.
+        buffer = self._lattice_buffers.setdefault(spacegroup, [])
+        if not buffer:
+            buffer.extend(self.new_lattice_matrices(spacegroup, self.batch_size))
+        return Lattice(buffer.pop())
 
-        # generate an (a,b,c) vector to pull lattice vectors from
-        a, b, c = vector_generator.new_vector()
+    def __getstate__(self):
+        # Buffered lattices are left out when pickling (e.g. when this is sent
+        # to other processes) so that each copy makes its own lattices.
+        state = self.__dict__.copy()
+        state["_lattice_buffers"] = {}
+        return state
 
-        # generate an (alpha,beta,gamma) vector to pull lattice angles from
-        alpha, beta, gamma = self.angle_generator.new_vector()
+    def new_lattice_matrices(self, spacegroup, nlattices):
 
-        # Now generate the lattice using the spacegroup indicidated
-        if spacegroup <= 2:  # triclinic
-            # SPECIAL CASE b/c pymatgen does not have this function
-            # but because (a != b != c) and (alpha != beta != gamma)
-            # take the inputs of vectors=(a,b,c) and angles=(alpha,beta,gamma) and create a pymatgen lattice object
-            lattice = Lattice.from_parameters(a, b, c, alpha, beta, gamma)
-        elif spacegroup <= 15:  # monoclinic
-            lattice = Lattice.monoclinic(a, b, c, beta)
-        elif spacegroup <= 74:  # orthorhombic
-            lattice = Lattice.orthorhombic(a, b, c)
-        elif spacegroup <= 142:  # tetragonal
-            lattice = Lattice.tetragonal(a, c)
-        elif spacegroup <= 167:  # trigonal
-            lattice = Lattice.hexagonal(a, c)
-            # Note: I have all lattices in range(143,168) to be hexagonal
-            # the spacegroups 146,148,155,160,161,166,167 can optionally be rhombohedral though
-            # lattice = Lattice.rhombohedral(a,alpha)
-        elif spacegroup <= 194:  # hexagonal
-            lattice = Lattice.hexagonal(a, c)
-        elif spacegroup <= 230:
-            lattice = Lattice.cubic(a)
+        # Makes a 3D array of nlattices lattice matrices for the spacegroup. All
+        # lattices are scaled to the spacegroup's volume and have vectors within
+        # the min/max values of the spacegroup's vector_generator.
 
-        #!!! This section makes the code take more than 3x longer to run. Should
-        #!!! I allow a more flexible volume? More flexible volume could also slow structure creation (bc smaller volumes are allowed)
-        # now scale the lattice to the specified volume
-        lattice = lattice.scale(volume)
-        # in scaling, we might have broken the conditions of min/max_vectors
-        # I check this and if it fails, I scrap the lattice and try making a new one via recursion
-        check = True  # assume valid until proven otherwise
-        for vector in [lattice.a, lattice.b, lattice.c]:
-            if vector < vector_generator.min_value:
-                check = False
-                break
-            elif vector > vector_generator.max_value:
-                check = False
-                break
-        if not check:
-            # this is a recursion call that will be hit repeatedly until a valid lattice is found
-            #!!! this will throw a recursion error if the volume and min/max_vectors are unreasonable
-            #!!! I need to rewrite this function where it's a while loop instead of a recursion call
-            lattice = self.new_lattice(spacegroup)
+        # For our target spacegroup, grab the target volume and vector_generator
+        volume = self.volumes[spacegroup]
+        vector_generator = self.vector_generators[spacegroup]
 
-        # we need to know which spacegroup was used in addition to the result lattice
-        # maybe I can add an option to 'returnlatticeonly=True' if I don't want this as a dict
-        return lattice
+        matrices = []
+        nfound = 0
+        nfailed = 0
+        while nfound < nlattices:
+            nbatch = max(nlattices, self.batch_size)
+
+            # generate (a,b,c) and (alpha,beta,gamma) vectors to pull lattice
+            # vectors and angles from. Then make the lattices using the spacegroup
+            # indicated.
+            abc = vector_generator.new_vectors(nbatch)
+            angles = self.angle_generator.new_vectors(nbatch)
+            abc, angles = get_symmetric_parameters(spacegroup, abc, angles)
+            batch = get_lattice_matrices(abc, angles)
+
+            # now scale the lattices to the specified volume. Like pymatgen's
+            # Lattice.scale, this scales all vectors by the same factor.
+            volumes = numpy.abs(numpy.linalg.det(batch))
+            batch *= ((volume / volumes) ** (1 / 3))[:, None, None]
+
+            # in scaling, we might have broken the conditions of min/max_vectors
+            # so we only keep lattices where all vectors are still valid
+            lengths = numpy.linalg.norm(batch, axis=2)
+            batch = batch[
+                (
+                    (lengths >= vector_generator.min_value)
+                    & (lengths <= vector_generator.max_value)
+                ).all(axis=1)
+            ]
+            matrices.append(batch)
+            nfound += len(batch)
+
+            # if the volume and min/max_vectors are unreasonable, we might
+            # never find a valid lattice
+            nfailed = 0 if len(batch) else nfailed + 1
+            if nfailed >= self.max_failed_batches:
+                raise Exception(
+                    f"Unable to find a valid lattice for spacegroup {spacegroup} "
+                    f"after {nfailed * nbatch} attempts. Check that the volume "
+                    "is reasonable for the min/max vector lengths."
+                )
+
+        return numpy.concatenate(matrices)[:nlattices]
+
+
+def get_symmetric_parameters(spacegroup, abc, angles):
+
+    # Applies the constraints of the spacegroup's crystal system to many
+    # (a,b,c) and (alpha,beta,gamma) vectors at once. This follows the
+    # same rules as RandomSymLattice.new_lattice.
+    abc = numpy.array(abc, dtype=float)
+    angles = numpy.array(angles, dtype=float)
+
+    if spacegroup <= 2:  # triclinic
+        pass
+    elif spacegroup <= 15:  # monoclinic
+        angles[:, [0, 2]] = 90
+    elif spacegroup <= 74:  # orthorhombic
+        angles[:] = 90
+    elif spacegroup <= 142:  # tetragonal
+        abc[:, 1] = abc[:, 0]
+        angles[:] = 90
+    elif spacegroup <= 194:  # trigonal and hexagonal
+        # Note: I have all lattices in range(143,168) to be hexagonal
+        # the spacegroups 146,148,155,160,161,166,167 can optionally be rhombohedral though
+        abc[:, 1] = abc[:, 0]
+        angles[:] = [90, 90, 120]
+    elif spacegroup <= 230:  # cubic
+        abc[:, 1] = abc[:, 0]
+        abc[:, 2] = abc[:, 0]
+        angles[:] = 90
+
+    return abc, angles
+
+
+def get_lattice_matrices(abc, angles):
+
+    # This is the same as pymatgen's Lattice.from_parameters but for many
+    # (a,b,c) and (alpha,beta,gamma) vectors at once. Angles are in degrees.
+    angles_r = numpy.radians(angles)
+    cos_angles = numpy.cos(angles_r)
+    sin_angles = numpy.sin(angles_r)
+    # make right angles exact so that we don't get tiny non-zero values
+    cos_angles[angles == 90] = 0
+    sin_angles[angles == 90] = 1
+    cos_alpha, cos_beta, cos_gamma = cos_angles.T
+    sin_alpha, sin_beta, _ = sin_angles.T
+
+    val = (cos_alpha * cos_beta - cos_gamma) / (sin_alpha * sin_beta)
+    val = numpy.clip(val, -1, 1)  # rounding errors may cause values slightly > 1
+    gamma_star = numpy.arccos(val)
+
+    a, b, c = abc.T
+    matrices = numpy.zeros((len(abc), 3, 3))
+    matrices[:, 0, 0] = a * sin_beta
+    matrices[:, 0, 2] = a * cos_beta
+    matrices[:, 1, 0] = -b * sin_alpha * numpy.cos(gamma_star)
+    matrices[:, 1, 1] = b * sin_alpha * numpy.sin(gamma_star)
+    matrices[:, 1, 2] = b * cos_alpha
+    matrices[:, 2, 2] = c
+    return matrices
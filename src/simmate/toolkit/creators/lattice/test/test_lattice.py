@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+from pymatgen.core import Composition, Lattice
+
+from simmate.toolkit.creators.lattice.all import (
+    RSLFixedVolume,
+    RSLSmartVolume,
+    get_lattice_matrices,
+    get_symmetric_parameters,
+)
+
+
+def test_rsl_fixed_volume():
+
+    creator = RSLFixedVolume(
+        volume=27,
+        vector_gen_options=dict(min_value=2, max_value=4),
+    )
+    for spacegroup in [1, 14, 62, 139, 166, 194, 225]:
+        lattice = creator.new_lattice(spacegroup)
+        assert lattice.volume == pytest.approx(27)
+        assert all(2 <= vector <= 4 for vector in lattice.abc)
+
+
+def test_rsl_fixed_volume_impossible():
+
+    # no lattice with vectors of 2-3 can have this volume
+    creator = RSLFixedVolume(
+        volume=1000,
+        vector_gen_options=dict(min_value=2, max_value=3),
+    )
+    creator.max_failed_attempts = 10
+    with pytest.raises(Exception, match="Unable to find a valid lattice"):
+        creator.new_lattice(225)
+
+
+def _get_lattice_reference(spacegroup, abc, angles):
+    # the pymatgen constructors that RandomSymLattice.new_lattice uses
+    a, b, c = abc
+    alpha, beta, gamma = angles
+    if spacegroup <= 2:
+        return Lattice.from_parameters(a, b, c, alpha, beta, gamma)
+    elif spacegroup <= 15:
+        return Lattice.monoclinic(a, b, c, beta)
+    elif spacegroup <= 74:
+        return Lattice.orthorhombic(a, b, c)
+    elif spacegroup <= 142:
+        return Lattice.tetragonal(a, c)
+    elif spacegroup <= 194:
+        return Lattice.hexagonal(a, c)
+    else:
+        return Lattice.cubic(a)
+
+
+@pytest.mark.parametrize("spacegroup", [1, 14, 62, 139, 166, 194, 225])
+def test_get_lattice_matrices(spacegroup):
+
+    random = numpy.random.default_rng(seed=9)
+    abc = random.uniform(2, 6, size=(20, 3))
+    angles = random.uniform(60, 120, size=(20, 3))
+
+    matrices = get_lattice_matrices(*get_symmetric_parameters(spacegroup, abc, angles))
+    for matrix, abc_single, angles_single in zip(matrices, abc, angles):
+        expected = _get_lattice_reference(spacegroup, abc_single, angles_single)
+        assert matrix == pytest.approx(expected.matrix, abs=1e-10)
+
+
+def test_rsl_smart_volume():
+
+    creator = RSLSmartVolume(composition=Composition("Fe2O3"))
+    for spacegroup in [1, 14, 62, 139, 166, 194, 225]:
+        vector_generator = creator.vector_generators[spacegroup]
+        matrices = creator.new_lattice_matrices(spacegroup, 100)
+        assert matrices.shape == (100, 3, 3)
+
+        # every lattice has the spacegroup's volume and valid vectors
+        volumes = numpy.abs(numpy.linalg.det(matrices))
+        assert volumes == pytest.approx(creator.volumes[spacegroup])
+        lengths = numpy.linalg.norm(matrices, axis=2)
+        assert (lengths >= vector_generator.min_value).all()
+        assert (lengths <= vector_generator.max_value).all()
+
+        # and the lattices follow the spacegroup's crystal system
+        lattice = creator.new_lattice(spacegroup)
+        expected = _get_lattice_reference(spacegroup, lattice.abc, lattice.angles)
+        assert lattice.matrix == pytest.approx(expected.matrix, abs=1e-10)
+        assert lattice.volume == pytest.approx(creator.volumes[spacegroup])
+
+
+def test_rsl_smart_volume_impossible():
+
+    # no lattice with the spacegroup's max vector length can have this volume
+    creator = RSLSmartVolume(
+        composition=Composition("Fe2O3"),
+        spacegroup_include=[225],
+    )
+    max_value = creator.vector_generators[225].max_value
+    creator.volumes[225] = (2 * max_value) ** 3
+    creator.max_failed_batches = 3
+    with pytest.raises(Exception, match="Unable to find a valid lattice"):
+        creator.new_lattice(225)
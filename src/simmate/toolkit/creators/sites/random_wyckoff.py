@@ -1,13 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import numpy
 from numpy.random import randint, choice
 
-from tqdm import tqdm
-
 from simmate.toolkit.symmetry.wyckoff import (
     loadAsymmetricUnitData,
-    loadWyckoffData,
-    findValidWyckoffCombos,
+    loadWyckoffAffineData,
+    loadValidWyckoffCombos,
 )
 from simmate.toolkit.creators.vector import UniformlyDistributedVectors
 
@@ -43,11 +42,11 @@ class RandomWySites:
         self.wy_groupcombos = {}
         # some spacegroups will be incompatible with the given composition -- keep a list of these
         self.spacegroups_invalid = []
-        #!!! NOTE: This code takes a long time to run in some cases, so I want to do it up front
-        # because this takes time, I print a warning and then use tqdm to track progress
-        message = "Generating Wyckoff combinations for every spacegroup: "
-        for spacegroup in tqdm(self.spacegroup_options, desc=message):
-            sg_combo_data = findValidWyckoffCombos(stoichiometry, spacegroup)
+        # NOTE: This can take a long time the first time a stoichiometry is used,
+        # so combinations are found in parallel and then saved to a cache file
+        # that is reused by every creator after that.
+        all_combo_data = loadValidWyckoffCombos(stoichiometry, self.spacegroup_options)
+        for spacegroup, sg_combo_data in all_combo_data.items():
             # If the spacegroup + stoich combination has no valid combinations, the generator will not work
             if not sg_combo_data["ValidCombinations"]:
                 self.spacegroups_invalid.append(spacegroup)
@@ -91,9 +90,10 @@ class RandomWySites:
             # add this generator to the results
             self.coords_generators.update({spacegroup: coords_generator})
 
-        # below, I'll need to repeatedly reference wy_data
-        #!!! I want to find a better way of loading wy_data - maybe load only data for spacegroup_options?
-        self.wy_data = loadWyckoffData().values
+        # below, I'll need to repeatedly place x,y,z values into wyckoff site
+        # coordinates. Rather than eval() the coordinates each time, we load the
+        # affine transformation for every wy_site up front.
+        self.wy_matrices, self.wy_translations = loadWyckoffAffineData()
 
     def new_sites(self, spacegroup=None):
 
@@ -122,47 +122,53 @@ class RandomWySites:
         random_index = randint(0, len(wy_groupcombos))
         wy_group_combo = wy_groupcombos[random_index]
 
+        # for each site we need to place, grab the element and wy_group that it
+        # was assigned to. len(stoich) == len(wy_group_combo) because indexes are
+        # matched up (i.e. stoich[1] was assigned wy_group_combo[1]) so we can use
+        # the index of wy_groups to grab the element
+        site_elements = []
+        site_groups = []
+        for element, wy_groups in zip(self.composition.elements, wy_group_combo):
+            for wy_group in wy_groups:
+                site_elements.append(element)
+                site_groups.append(wy_group)
+
+        # now we need to generate the coordinates for every wy_site
+        # for that, we need three things:
+        # (1) a random wy_site from each assigned wy_group. wy_group label is a key
+        #     to the wy_groupinfo dictionary and the output is a list of indexes
+        #     that correspond to indicies in the loadWyckoffData() output
+        # (2) random coords that exist inside the asymmetric unit
+        # (3) the affine transformation of the wy_site that places these coords
+        #     (i.e. (x,y,z) or (0,y,0)) -- this replaces an eval() of the coords
+        # We do all of this for every site at once with numpy.
+        wy_sites = numpy.array(
+            [choice(wy_groupinfo[wy_group]) for wy_group in site_groups], dtype=int
+        )
+        vectors = coords_generator.new_vectors(len(wy_sites))
+        all_coords = (
+            numpy.einsum("nij,nj->ni", self.wy_matrices[wy_sites], vectors)
+            + self.wy_translations[wy_sites]
+        )
+
         # make an empty list to store all the fractional coordinates
         coords_list = []  # regular list.append is faster than numpy.append
-        # as well as an empty list for the species
-        species_list = []
-
-        # now we need to iterate through each element in stoich, see which wy_group(s) it was assigned to
-        for i, wy_groups in enumerate(wy_group_combo):
-            # wy_groups represents the combination of wy_group's for a single element
-            # len(stoich) == len(wy_group_combo) because indexes are matched up (i.e. stoich[1] was assigned wy_group_combo[1])
-            # so we can use the index of wy_groups to grab the element
-            element = self.composition.elements[i]
-            # wy_groups can be a list of wy_group entries
-            for wy_group in wy_groups:
-                # now we need to generate the coordinates for this wy_site
-                # for that, we need three things:
-                # (1) a random wy_site from the assigned wy_group
-                # (2) the base wy_site coords corresponding to that wy_site (i.e. (x,y,z) or (0,y,0))
-                # (3) random coords that exist inside the asymmetric unit, used to eval() the coords with
-                # (4) ensure that the result coordinates have not been used already
-                # wy_group label is a key to the wy_groupinfo dictionary
-                # the wy_sites output is a list of indexes (as numpy array) that correspond to indicies in the loadWyckoffData() output
-                wy_sites = wy_groupinfo[wy_group]
-                check = False
-                while not check:
-                    # randomly choose one of these wy_site indexes
-                    # I have this inside the while-loop because if a special wy_site (i.e. (0,0,0)) is picked when it's already in coords_used, we will get stuck in the while loop
-                    wy_site_i = choice(wy_sites)
-                    # use the choice to grab the wy_site
-                    wy_site = self.wy_data[wy_site_i]
-                    # grab the first entry (as all others are symmetrically equivalent) for coord template
-                    wy_coords = wy_site[5]  # index 5 is 'Coordinates'
-                    # generate random x,y,z values that are inside the asymmetric unit
-                    x, y, z = coords_generator.new_vector()
-                    # place these x,y,z values into the coords where necessary
-                    # not sure why I need to use None,dict(x=x,y=y,z=z) inside eval. Eval() can't use the locals for some reason.
-                    final_coords = eval(wy_coords, None, dict(x=x, y=y, z=z))
-                    # see if the result is already a coordinate used
-                    check = final_coords not in coords_list
-                # append the coords and species to our output lists
-                coords_list.append(final_coords)
-                species_list.append(element)
+        for wy_group, final_coords in zip(site_groups, all_coords.tolist()):
+            final_coords = tuple(final_coords)
+            # we need to ensure that the result coordinates have not been used
+            # already. This only happens for special wy_site (i.e. (0,0,0)), so
+            # we try a new wy_site from the group until we find one.
+            while final_coords in coords_list:
+                wy_site_i = choice(wy_groupinfo[wy_group])
+                final_coords = tuple(
+                    (
+                        self.wy_matrices[wy_site_i] @ coords_generator.new_vector()
+                        + self.wy_translations[wy_site_i]
+                    ).tolist()
+                )
+            coords_list.append(final_coords)
+        # as well as the species
+        species_list = site_elements
 
         # maybe make these into pymatgen Site objects? I don't see any advantage to Site object,
         # because we will later need PeriodicSite objects and there's no direct conversion method
@@ -189,7 +195,7 @@ def asymmetric_unit_boundries(spacegroup, asym_data=loadAsymmetricUnitData()):
     # or maybe only run them for the spacegroups that need them?
     asym_bounds = asym_bounds.replace("2y", "(2*y)")  # convert
     asym_bounds = asym_bounds.replace("2x", "(2*x)")  # convert
-    asym_bounds = asym_bounds.replace("-4x", "(-4*y)")  # convert
+    asym_bounds = asym_bounds.replace("-4x", "(-4*x)")  # convert
     asym_bounds = asym_bounds.split(";")  # convert str into a list
 
     return asym_bounds
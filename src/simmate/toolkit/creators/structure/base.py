@@ -2,6 +2,15 @@
 
 from abc import ABC, abstractmethod
 
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty
+
+import numpy
+from tqdm import tqdm
+
 from dask.distributed import get_client
 
 
@@ -88,6 +97,137 @@ class StructureCreator(ABC):
         # we now have a list of structures of size n and can return them
         return results
 
+    # create_structures splits the work into (at most) this many tasks, which
+    # each have their own random number generator. This can't depend on nprocs,
+    # as otherwise the same seed would give different structures for different
+    # nprocs.
+    max_create_tasks = 256
+
+    # how many attempts in a row can fail for a spacegroup in create_structures
+    # before we give up (rather than trying forever)
+    max_failed_attempts = 1000
+
+    def create_structures(
+        self,
+        n,
+        spacegroup=None,
+        nprocs=None,
+        seed=None,
+        progressbar=True,
+    ):
+        """
+        Creates n structures in parallel using a pool of nprocs processes (all
+        cores by default). Unlike create_many_structures, this does not require
+        a Dask cluster.
+
+        This is a generator, so structures are given back as soon as they are
+        made -- for example:
+
+            for structure in creator.create_structures(5000, nprocs=32, seed=1):
+                ...
+
+        The n structures are split into tasks that each have their own random
+        number generator. These are independent streams that are made from the
+        seed, so the same seed will always give the same structures -- no matter
+        the nprocs used (though the order they are given back in may change).
+        If no seed is given, a random one is used. If you stop iterating early,
+        tasks that haven't started yet are cancelled.
+
+        Failed attempts (when create_structure returns False) are retried and
+        are counted for each spacegroup. Once finished, you can see how often
+        each spacegroup failed with get_failure_rates(). If a spacegroup fails
+        max_failed_attempts times in a row, an error is raised.
+        """
+
+        ntasks = min(self.max_create_tasks, n)
+
+        # split the structures as evenly as possible between the tasks
+        nstructures = [n // ntasks + (i < n % ntasks) for i in range(ntasks)]
+        seed_sequences = numpy.random.SeedSequence(seed).spawn(ntasks)
+
+        self.spacegroup_stats = {}
+        failures_in_a_row = {}
+
+        with multiprocessing.Manager() as manager:
+            queue = manager.Queue()
+            # tasks check this between structures so that running tasks can
+            # stop early too
+            stop_event = manager.Event()
+            executor = ProcessPoolExecutor(max_workers=nprocs or os.cpu_count())
+            try:
+                futures = [
+                    executor.submit(
+                        _create_structures_stream,
+                        self,
+                        spacegroup,
+                        seed_sequence,
+                        nstructures_task,
+                        queue,
+                        stop_event,
+                    )
+                    for seed_sequence, nstructures_task in zip(
+                        seed_sequences, nstructures
+                    )
+                ]
+
+                with tqdm(total=n, disable=not progressbar) as pbar:
+                    nfound = 0
+                    while nfound < n:
+                        try:
+                            spacegroup_used, structure = queue.get(timeout=1)
+                        except Empty:
+                            # if a process failed, raise its error instead of
+                            # waiting forever on its results
+                            for future in futures:
+                                if future.done() and future.exception():
+                                    raise future.exception()
+                            continue
+
+                        stats = self.spacegroup_stats.setdefault(
+                            spacegroup_used, dict(successes=0, failures=0)
+                        )
+                        if not structure:
+                            stats["failures"] += 1
+                            failures_in_a_row[spacegroup_used] = (
+                                failures_in_a_row.get(spacegroup_used, 0) + 1
+                            )
+                            if (
+                                failures_in_a_row[spacegroup_used]
+                                >= self.max_failed_attempts
+                            ):
+                                raise Exception(
+                                    "Unable to create a structure for spacegroup "
+                                    f"{spacegroup_used} after "
+                                    f"{self.max_failed_attempts} attempts in a row."
+                                )
+                            continue
+                        stats["successes"] += 1
+                        failures_in_a_row[spacegroup_used] = 0
+                        nfound += 1
+                        pbar.update(1)
+                        yield structure
+            finally:
+                # If we stopped early (or hit an error), we don't want to wait
+                # on the remaining tasks. Those that haven't started are
+                # cancelled, and those already running stop after their current
+                # structure.
+                stop_event.set()
+                executor.shutdown(cancel_futures=True)
+
+    def get_failure_rates(self):
+        """
+        Gives the fraction of attempts that failed for each spacegroup in the
+        last call to create_structures, as {spacegroup: failure_rate}. If the
+        creator picks spacegroups on its own, these are all under None.
+        """
+        return {
+            spacegroup: stats["failures"] / (stats["successes"] + stats["failures"])
+            for spacegroup, stats in sorted(
+                getattr(self, "spacegroup_stats", {}).items(),
+                key=lambda item: (item[0] is None, item[0]),
+            )
+        }
+
     def update_data(self):
         """
         TO-DO
@@ -96,3 +236,27 @@ class StructureCreator(ABC):
         I can run machine learning code here before updating too.
         """
         pass
+
+
+def _create_structures_stream(
+    creator, spacegroup, seed_sequence, nstructures, queue, stop_event
+):
+
+    # Makes nstructures for a single task and sends each attempt back through
+    # the queue as (spacegroup, structure). Creators use numpy's and python's
+    # global random number generators, so we seed both for this task.
+    numpy.random.seed(seed_sequence.generate_state(4))
+    random.seed(int(seed_sequence.generate_state(1)[0]))
+
+    nfound = 0
+    while nfound < nstructures and not stop_event.is_set():
+        # If a spacegroup is not specified, we pick one here (rather than
+        # letting the creator pick) so that failures can be tracked by spacegroup
+        spacegroup_used = spacegroup
+        if not spacegroup_used and getattr(creator, "spacegroup_options", None):
+            spacegroup_used = int(numpy.random.choice(creator.spacegroup_options))
+
+        structure = creator.create_structure(spacegroup_used)
+        queue.put((spacegroup_used, structure if structure else None))
+        if structure:
+            nfound += 1
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import random
+import time
+
+import numpy
+import pytest
+from pymatgen.core import Lattice, Structure
+
+from simmate.toolkit.creators.structure.base import StructureCreator
+
+
+class ToyCreator(StructureCreator):
+    # makes a one-site cubic structure using both numpy's and python's random
+    # number generators, and fails some of the time
+
+    spacegroup_options = [1, 221]
+
+    def __init__(self, delay=0):
+        self.delay = delay
+
+    def create_structure(self, spacegroup=None):
+        time.sleep(self.delay)
+        if random.random() < 0.2:
+            return False
+        return Structure(
+            Lattice.cubic(3 + numpy.random.random()),
+            ["Na"],
+            [numpy.random.random(3)],
+        )
+
+
+def _get_fingerprints(structures):
+    # a sortable summary of each structure, since they may come back in any order
+    return sorted(
+        (round(structure.lattice.a, 8), *structure.frac_coords[0].round(8))
+        for structure in structures
+    )
+
+
+def test_create_structures_reproducible():
+
+    creator = ToyCreator()
+    # use a small number of tasks so that they are shared between processes
+    creator.max_create_tasks = 4
+
+    results = [
+        _get_fingerprints(
+            creator.create_structures(10, nprocs=nprocs, seed=5, progressbar=False)
+        )
+        for nprocs in [1, 2, 3]
+    ]
+    assert len(results[0]) == 10
+    assert len(set(results[0])) == 10
+    assert results[0] == results[1] == results[2]
+
+    # a different seed gives different structures
+    other = _get_fingerprints(
+        creator.create_structures(10, nprocs=2, seed=6, progressbar=False)
+    )
+    assert other != results[0]
+
+    # every attempt is counted by spacegroup
+    failure_rates = creator.get_failure_rates()
+    assert set(failure_rates.keys()) <= {1, 221}
+    assert all(0 <= rate < 1 for rate in failure_rates.values())
+
+
+def test_create_structures_stop_early():
+
+    # Making all structures would take 1000 * 0.05 / 2 = 25 seconds. When we
+    # stop after the first one, the tasks already running should stop too.
+    creator = ToyCreator(delay=0.05)
+    creator.max_create_tasks = 2
+    structures = creator.create_structures(1000, nprocs=2, progressbar=False)
+
+    start = time.time()
+    next(structures)
+    structures.close()
+    assert time.time() - start < 10
+
+
+class AlwaysFailsCreator(ToyCreator):
+    def create_structure(self, spacegroup=None):
+        return False
+
+
+def test_create_structures_max_failed_attempts():
+
+    creator = AlwaysFailsCreator()
+    creator.max_failed_attempts = 10
+    with pytest.raises(Exception, match="Unable to create a structure"):
+        list(creator.create_structures(5, nprocs=1, progressbar=False))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import ast
+from functools import reduce
+
+import numpy
+
+
+class ConditionsMask:
+    """
+    Checks a list of conditions on many (x,y,z) vectors at once. The conditions
+    are strings that use x,y,z for vector positions, such as
+    ['x>=y', 'x<z*2', '0 <= y <= min(x, 1/2 - x)'].
+
+    Rather than calling eval() on each condition for every vector, each condition
+    is compiled once into an expression that works on numpy arrays. To do this,
+    chained comparisons (a <= z <= b) and and/or/not are rewritten to their
+    elementwise versions (&, |, ~), and min/max are evaluated elementwise.
+
+    To use, call this object with a 2D array of vectors and it will return a
+    1D boolean array of which vectors meet all conditions.
+    """
+
+    def __init__(self, conditions: list = []):
+        self.conditions = conditions
+        self._codes = [self._compile(condition) for condition in conditions]
+
+    def __call__(self, vectors: numpy.ndarray) -> numpy.ndarray:
+        vectors = numpy.asarray(vectors)
+        namespace = dict(
+            x=vectors[:, 0],
+            y=vectors[:, 1],
+            z=vectors[:, 2],
+            min=_elementwise_min,
+            max=_elementwise_max,
+        )
+        is_valid = numpy.ones(len(vectors), dtype=bool)
+        for code in self._codes:
+            # conditions without x,y,z give a single bool, so we broadcast it
+            is_valid &= numpy.broadcast_to(eval(code, {}, namespace), is_valid.shape)
+            # no need to check the remaining conditions if everything failed
+            if not is_valid.any():
+                break
+        return is_valid
+
+    # compiled code can't be pickled (e.g. when sending a creator to another
+    # process), so we only pickle the conditions and compile them again
+    def __getstate__(self):
+        return dict(conditions=self.conditions)
+
+    def __setstate__(self, state):
+        self.__init__(state["conditions"])
+
+    @staticmethod
+    def _compile(condition: str):
+        # we also allow the symbols used by the International Tables
+        condition = condition.replace("≤", "<=").replace("≥", ">=").strip()
+        tree = ast.parse(condition, mode="eval")
+        tree = ast.fix_missing_locations(_ElementwiseTransformer().visit(tree))
+        return compile(tree, "<condition>", "eval")
+
+
+class _ElementwiseTransformer(ast.NodeTransformer):
+
+    # Converts python's boolean logic to numpy's elementwise logic. For example,
+    # "0 <= x <= y and not z > 1" becomes "((0 <= x) & (x <= y)) & ~(z > 1)"
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        comparisons = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            comparisons.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+            left = right
+        return self._combine(comparisons, ast.BitAnd())
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        return self._combine(node.values, op)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+        return node
+
+    @staticmethod
+    def _combine(values, op):
+        return reduce(
+            lambda left, right: ast.BinOp(left=left, op=op, right=right), values
+        )
+
+
+def _elementwise_min(*values):
+    return reduce(numpy.minimum, values)
+
+
+def _elementwise_max(*values):
+    return reduce(numpy.maximum, values)
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import numpy
 from numpy.random import normal as numpy_random_normal
 
+from simmate.toolkit.creators.vector.conditions import ConditionsMask
+
 
 class NormallyDistributedVectors:
 
@@ -9,6 +12,10 @@ class NormallyDistributedVectors:
     # distribution. The random values will between min_value and max_value, and also
     # extra conditions can be added. For example, ['x>=y', 'x<z*2', 'y<z+1']
 
+    # how many vectors to make at a time. Leftover vectors are saved for the
+    # next call to new_vector.
+    batch_size = 256
+
     def __init__(
         self, min_value=0, max_value=1, extra_conditions=[], center=None, standdev=None
     ):
@@ -20,6 +27,10 @@ class NormallyDistributedVectors:
         self.max_value = max_value
         self.extra_conditions = extra_conditions
 
+        # compile the extra conditions so that we can check many vectors at once
+        self._conditions_mask = ConditionsMask(extra_conditions)
+        self._vectors = []
+
         # Set the center of the normal (Guassian) distribution
         # If a value is provided we use it. Otherwise we set it to the middle
         # of the min/max values
@@ -31,36 +42,44 @@ class NormallyDistributedVectors:
 
     def new_vector(self):
 
-        # We want to attempt to make a vector until it meets all of the conditions
-        # that we set above. We therefore have a while loop. To start the whileloop,
-        # we need this conditon set to false
-        is_valid_vector = False
-        while not is_valid_vector:
-
-            # generate random 3x1 matrix where values are normally distributed
-            vector = numpy_random_normal(loc=self.center, scale=self.standdev, size=3)
-
-            # check if all values are between min/max values specified
-            is_valid_vector = (vector.min() >= self.min_value) and (
-                vector.max() <= self.max_value
+        # Vectors are made in batches (see new_vectors) and then handed out one
+        # at a time from this buffer.
+        if not self._vectors:
+            self._vectors = list(self.new_vectors(self.batch_size))
+        return self._vectors.pop()
+
+    def __getstate__(self):
+        # Buffered vectors are left out when pickling (e.g. when this is sent
+        # to other processes) so that each copy draws its own vectors.
+        state = self.__dict__.copy()
+        state["_vectors"] = []
+        return state
+
+    def new_vectors(self, nvectors):
+
+        # Makes a 2D array of nvectors that meet all of the conditions. We
+        # generate random vectors in batches and check all conditions on the
+        # batch at once, keeping the vectors that pass. We repeat this until
+        # we have enough vectors.
+        vectors = []
+        nfound = 0
+        while nfound < nvectors:
+
+            # generate random Nx3 matrix where values are normally distributed
+            batch = numpy_random_normal(
+                loc=self.center,
+                scale=self.standdev,
+                size=(max(nvectors, self.batch_size), 3),
             )
-            # if the check is False, use 'continue' to restart the while loop
-            if not is_valid_vector:
-                continue
-
-            # check that all extra conditions are met and assume it is valid
-            # until proven otherwise.
-            for condition in self.extra_conditions:
-                x, y, z = vector
-                is_valid_vector = eval(condition, None, dict(x=x, y=y, z=z))
-                # If this condition isn't met (check=False), then we can exit
-                # the loop and try with a new vector
-                if not is_valid_vector:
-                    break
-
-            # If the for-loop above 'breaks' at any point, check will be False
-            # and the while-loop will restart. If the for-loop goes through all
-            # extra_conditions and never breaks, check will be True and the
-            # while-loop will finish
-
-        return vector
+
+            # only keep vectors where all values are between min/max values
+            # specified and all extra conditions are met
+            batch = batch[
+                (batch.min(axis=1) >= self.min_value)
+                & (batch.max(axis=1) <= self.max_value)
+            ]
+            batch = batch[self._conditions_mask(batch)]
+            vectors.append(batch)
+            nfound += len(batch)
+
+        return numpy.concatenate(vectors)[:nvectors]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import pickle
+
+import numpy
+import pytest
+
+from simmate.toolkit.creators.sites.random_wyckoff import asymmetric_unit_boundries
+from simmate.toolkit.creators.vector.conditions import ConditionsMask
+
+# every unique condition used for the asymmetric units of the 230 spacegroups
+ASYMMETRIC_UNIT_CONDITIONS = sorted(
+    {
+        condition
+        for spacegroup in range(1, 231)
+        for condition in asymmetric_unit_boundries(spacegroup)
+    }
+)
+
+
+def _get_test_vectors():
+    # Random vectors (including some outside of the unit cell) along with
+    # vectors that sit exactly on common boundaries such as x = y = 1/2.
+    random_vectors = numpy.random.default_rng(0).uniform(-0.25, 1.25, (2000, 3))
+    boundaries = [0, 1 / 8, 1 / 4, 1 / 3, 1 / 2, 2 / 3, 3 / 4, 1]
+    grid_vectors = numpy.array(list(itertools.product(boundaries, repeat=3)))
+    return numpy.concatenate([random_vectors, grid_vectors])
+
+
+@pytest.mark.parametrize("condition", ASYMMETRIC_UNIT_CONDITIONS)
+def test_conditions_mask(condition):
+
+    vectors = _get_test_vectors()
+    mask = ConditionsMask([condition])(vectors)
+
+    # compare to checking one vector at a time with eval()
+    expected = [
+        bool(eval(condition.strip(), {}, dict(x=x, y=y, z=z)))
+        for x, y, z in vectors.tolist()
+    ]
+    assert mask.tolist() == expected
+
+
+def test_conditions_mask_combined():
+
+    conditions = asymmetric_unit_boundries(227)
+    vectors = _get_test_vectors()
+    mask = ConditionsMask(conditions)(vectors)
+
+    expected = [
+        all(
+            eval(condition.strip(), {}, dict(x=x, y=y, z=z)) for condition in conditions
+        )
+        for x, y, z in vectors.tolist()
+    ]
+    assert mask.tolist() == expected
+
+    # pickling recompiles the conditions
+    mask_copy = pickle.loads(pickle.dumps(ConditionsMask(conditions)))
+    assert mask_copy(vectors).tolist() == expected
+
+
+def test_conditions_mask_special_cases():
+    vectors = numpy.array([[0.1, 0.2, 0.3], [0.5, 0.2, 0.9]])
+
+    # no conditions means every vector passes
+    assert ConditionsMask([])(vectors).tolist() == [True, True]
+    # conditions without x,y,z apply to all vectors
+    assert ConditionsMask(["1 < 2"])(vectors).tolist() == [True, True]
+    assert ConditionsMask(["1 > 2"])(vectors).tolist() == [False, False]
+    # boolean logic and the symbols from the International Tables
+    assert ConditionsMask(["x < 0.2 or not z < 0.5"])(vectors).tolist() == [
+        True,
+        True,
+    ]
+    assert ConditionsMask(["0 ≤ x ≤ y", "z ≥ 0"])(vectors).tolist() == [
+        True,
+        False,
+    ]
@@ -1,13 +1,20 @@
 # -*- coding: utf-8 -*-
 
+import numpy
 from numpy.random import random as numpy_random
 
+from simmate.toolkit.creators.vector.conditions import ConditionsMask
+
 
 class UniformlyDistributedVectors:
     # This class creates random coordinates (x,y,z) that follow a uniform distribution.
     # The random values will between min_value and max_value, and also
     # extra conditions can be added. For example, ['x>=y', 'x<z*2', 'y<z+1'].
 
+    # how many vectors to make at a time. Leftover vectors are saved for the
+    # next call to new_vector.
+    batch_size = 256
+
     def __init__(self, min_value=0, max_value=1, extra_conditions=[]):
 
         # Extra conditions should be a list of strings that use x,y,z for vector
@@ -17,35 +24,45 @@ class UniformlyDistributedVectors:
         self.max_value = max_value
         self.extra_conditions = extra_conditions
 
+        # compile the extra conditions so that we can check many vectors at once
+        self._conditions_mask = ConditionsMask(extra_conditions)
+        self._vectors = []
+
     def new_vector(self):
 
-        # We want to attempt to make a vector until it meets all of the conditions
-        # that we set above. We therefore have a while loop. To start the whileloop,
-        # we need this conditon set to false
-        is_valid_vector = False
-        while not is_valid_vector:
+        # Vectors are made in batches (see new_vectors) and then handed out one
+        # at a time from this buffer.
+        if not self._vectors:
+            self._vectors = list(self.new_vectors(self.batch_size))
+        return self._vectors.pop()
+
+    def __getstate__(self):
+        # Buffered vectors are left out when pickling (e.g. when this is sent
+        # to other processes) so that each copy draws its own vectors.
+        state = self.__dict__.copy()
+        state["_vectors"] = []
+        return state
 
-            # generate random 3x1 matrix where values are uniformly [0,1)
-            vector = numpy_random(3)
+    def new_vectors(self, nvectors):
 
-            # This vector is from 0 to 1 right now, so we shift the vector
+        # Makes a 2D array of nvectors that meet all of the conditions. We
+        # generate random vectors in batches and check all conditions on the
+        # batch at once, keeping the vectors that pass. We repeat this until
+        # we have enough vectors.
+        vectors = []
+        nfound = 0
+        while nfound < nvectors:
+
+            # generate random Nx3 matrix where values are uniformly [0,1)
+            batch = numpy_random((max(nvectors, self.batch_size), 3))
+
+            # This batch is from 0 to 1 right now, so we shift the vectors
             # within the min/max boundries and scale it within this range.
-            vector = vector * (self.max_value - self.min_value) + self.min_value
-
-            # check that all extra conditions are met and assume it is valid
-            # until proven otherwise.
-            is_valid_vector = True
-            for condition in self.extra_conditions:
-                x, y, z = vector
-                is_valid_vector = eval(condition, None, dict(x=x, y=y, z=z))
-                # If this condition isn't met (check=False), then we can exit
-                # the loop and try with a new vector
-                if not is_valid_vector:
-                    break
-
-            # If the for-loop above 'breaks' at any point, check will be False
-            # and the while-loop will restart. If the for-loop goes through all
-            # extra_conditions and never breaks, check will be True and the
-            # while-loop will finish
-
-        return vector
+            batch = batch * (self.max_value - self.min_value) + self.min_value
+
+            # only keep the vectors where all extra conditions are met
+            batch = batch[self._conditions_mask(batch)]
+            vectors.append(batch)
+            nfound += len(batch)
+
+        return numpy.concatenate(vectors)[:nvectors]
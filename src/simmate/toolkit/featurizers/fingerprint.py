@@ -50,7 +50,12 @@
 
 #!!! THIS SHOULD BE MOVED TO MATMINER!! Speak with their devs on github
 
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+from tqdm import tqdm
 
 from matminer.featurizers.base import BaseFeaturizer
 from matminer.featurizers.site import (
@@ -147,28 +152,82 @@ class PartialsSiteStatsFingerprint(BaseFeaturizer):
         if self.elements_ is None:
             raise Exception("You must run 'fit' first!")
 
-        output = []
-        for e in self.elements_:
-            pssf_stats = self.compute_pssf(
-                s, e
-            )  # Assemble the PSSF for the given element
-            output.append(pssf_stats)
+        # Featurize every site once and then assemble the PSSF for each element
+        vals_by_element = self._featurize_sites(s)
+        output = [self._compute_stats(s, vals_by_element[e]) for e in self.elements_]
 
         return np.hstack(output)
 
+    def featurize_structures(self, entries, nprocs=None, chunksize=None, pbar=True):
+        """
+        Get the PSSF of many structures, where structures are split between
+        several processes. This is separate from matminer's featurize_many,
+        which is still available with its own options and return format.
+        Args:
+            entries: list of Pymatgen Structure objects.
+            nprocs (int): number of processes to use. Default is all cores.
+            chunksize (int): number of structures sent to a process at a time.
+                By default, each process is given ~4 chunks.
+            pbar (bool): whether to show a progress bar
+        Returns:
+            pssf: 2D array where each row is the PSSF of a structure
+        """
+
+        if self.elements_ is None:
+            raise Exception("You must run 'fit' first!")
+
+        entries = list(entries)
+        nprocs = min(nprocs or os.cpu_count(), len(entries))
+        if not chunksize:
+            chunksize = max(1, math.ceil(len(entries) / (nprocs * 4)))
+
+        # for a single process, we skip the overhead of starting a pool
+        if nprocs <= 1:
+            output = map(self.featurize, entries)
+            return self._stack(tqdm(output, total=len(entries), disable=not pbar))
+
+        # each structure is independent, so we just send them out in chunks
+        with ProcessPoolExecutor(max_workers=nprocs) as executor:
+            output = executor.map(self.featurize, entries, chunksize=chunksize)
+            return self._stack(tqdm(output, total=len(entries), disable=not pbar))
+
+    @staticmethod
+    def _stack(fingerprints):
+        fingerprints = list(fingerprints)
+        if not fingerprints:
+            return np.empty((0, 0))
+        return np.array(fingerprints, dtype=np.float64)
+
     def compute_pssf(
         self, s, e
     ):  #!! THIS IS FOR A SET ANALYSIS - CHANGE TO SINGLE ELEMENT
-        # Get each feature for each site
-        vals = [[] for t in self._site_labels]
+        return self._compute_stats(s, self._featurize_sites(s, elements=[e])[e])
+
+    def _featurize_sites(self, s, elements=None):
+        # Get each feature for each site in a single pass over the structure.
+        # This gives {element: vals}, where vals has a list for each feature.
+        # Note, neighbor info is NOT shared between sites: matminer's site
+        # featurizers (e.g. CrystalNN) find the neighbors of each site
+        # themselves and give no way to pass in precomputed ones. What we avoid
+        # is featurizing any site more than once.
+        if elements is None:
+            elements = self.elements_
+        nlabels = len(self._site_labels)
+        vals_by_element = {e: [[] for _ in range(nlabels)] for e in elements}
         for i, site in enumerate(s.sites):
-            if site.specie.symbol == e:
-                opvalstmp = self.site_featurizer.featurize(s, i)
-                for j, opval in enumerate(opvalstmp):
-                    if opval is None:
-                        vals[j].append(0.0)
-                    else:
-                        vals[j].append(opval)
+            # sites of elements that aren't in the fingerprint are skipped
+            vals = vals_by_element.get(site.specie.symbol)
+            if vals is None:
+                continue
+            opvalstmp = self.site_featurizer.featurize(s, i)
+            for j, opval in enumerate(opvalstmp):
+                if opval is None:
+                    vals[j].append(0.0)
+                else:
+                    vals[j].append(opval)
+        return vals_by_element
+
+    def _compute_stats(self, s, vals):
 
         # If the user does not request statistics, return the site features now
         if self.stats is None:
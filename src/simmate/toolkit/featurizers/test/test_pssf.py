@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+from pymatgen.core import Lattice, Structure
+
+pytest.importorskip("matminer")
+
+from matminer.featurizers.site import CrystalNNFingerprint
+
+from simmate.toolkit.featurizers.fingerprint import PartialsSiteStatsFingerprint
+
+
+def _get_structures():
+    return [
+        Structure(
+            Lattice.cubic(a),
+            ["Na", "Cl"],
+            [[0, 0, 0], [0.5, 0.5, 0.5]],
+        )
+        for a in [3.0, 3.5]
+    ] + [
+        Structure(
+            Lattice.cubic(5.6),
+            ["Na"] * 4 + ["Cl"] * 4,
+            [
+                [0, 0, 0],
+                [0.5, 0.5, 0],
+                [0.5, 0, 0.5],
+                [0, 0.5, 0.5],
+                [0.5, 0, 0],
+                [0, 0.5, 0],
+                [0, 0, 0.5],
+                [0.5, 0.5, 0.5],
+            ],
+        )
+    ]
+
+
+@pytest.mark.parametrize("nprocs", [1, 2])
+def test_featurize_structures(nprocs):
+
+    featurizer = PartialsSiteStatsFingerprint(
+        CrystalNNFingerprint.from_preset("ops", distance_cutoffs=None, x_diff_weight=3),
+        stats=["mean", "std_dev", "minimum", "maximum"],
+    )
+    structures = _get_structures()
+    featurizer.fit(structures)
+
+    # the batch version gives the same as featurizing one at a time
+    fingerprints = featurizer.featurize_structures(
+        structures, nprocs=nprocs, chunksize=1, pbar=False
+    )
+    expected = numpy.array([featurizer.featurize(s) for s in structures])
+    assert fingerprints.dtype == numpy.float64
+    assert fingerprints.shape == expected.shape
+    numpy.testing.assert_allclose(fingerprints, expected)
+
+    # and matminer's own featurize_many is still available
+    assert len(featurizer.featurize_many(structures, pbar=False)) == 3
+
+
+def test_featurize_structures_needs_fit():
+    featurizer = PartialsSiteStatsFingerprint(CrystalNNFingerprint.from_preset("ops"))
+    with pytest.raises(Exception, match="fit"):
+        featurizer.featurize_structures(_get_structures())
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+import importlib
+import multiprocessing
+import os
+import pickle
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+
+class CandidateBuffer:
+    """
+    Keeps a number of new candidate structures ready for each source by making
+    them in background processes. This way, a SearchEngine doesn't have to wait
+    for slow creators or failed transformations when it submits new individuals.
+
+    Each candidate also comes with its fingerprint, so only the (fast) check
+    against the fingerprint database is left for the SearchEngine to do.
+
+    For transformations, parents are selected when a candidate is queued --
+    not when it's taken from the buffer. A small buffer therefore keeps the
+    parents in line with the current population.
+    """
+
+    def __init__(
+        self,
+        featurizer,
+        sources: list,
+        size: int = 2,
+        nprocs: int = None,
+        seed: int = None,
+    ):
+        self.featurizer = featurizer
+        self.size = size
+
+        # Each source (and the featurizer) is sent to the processes only once,
+        # when they start up. Candidates are then requested by the source's
+        # index, so we don't pickle the full source for every candidate.
+        self.sources = list(sources)
+        self._source_indices = {
+            id(source): index for index, source in enumerate(self.sources)
+        }
+
+        # Processes are spawned rather than forked. A forked process would share
+        # this process's open database connections (and any running threads).
+        # Spawned processes set up Django from scratch, and then each seeds
+        # itself with its own stream made from the seed -- otherwise they could
+        # all make the same candidates (see StructureCreator.create_structures
+        # for more).
+        nprocs = nprocs or os.cpu_count()
+        mp_context = multiprocessing.get_context("spawn")
+        seed_queue = mp_context.Queue()
+        for seed_sequence in numpy.random.SeedSequence(seed).spawn(nprocs):
+            seed_queue.put(seed_sequence)
+        self.executor = ProcessPoolExecutor(
+            max_workers=nprocs,
+            mp_context=mp_context,
+            initializer=_init_process,
+            # these are pickled here so that each process loads them only after
+            # setting up django
+            initargs=(seed_queue, pickle.dumps((self.sources, featurizer))),
+        )
+        # queued candidates are stored as {source index: deque of futures}
+        self.queues = {}
+
+    def get(self, source, select_parents=None):
+        """
+        Returns a new candidate as (parent_ids, structure, fingerprint). If the
+        source failed to make a structure, then the structure and fingerprint
+        are None.
+
+        For transformations, select_parents should be a function that accepts
+        the number of parents and returns (parent_ids, parent_structures).
+        """
+
+        if id(source) not in self._source_indices:
+            raise ValueError(
+                f"{source.__class__.__name__} was not given to this CandidateBuffer"
+            )
+        source_index = self._source_indices[id(source)]
+        queue = self.queues.setdefault(source_index, deque())
+
+        # make sure the buffer is full before waiting on the next candidate, and
+        # then replace the one we take
+        self._fill(queue, source_index, select_parents)
+        future = queue.popleft()
+        self._fill(queue, source_index, select_parents)
+
+        try:
+            return future.result()
+        except Exception as error:
+            print(f"{source.__class__.__name__} failed with: {error}")
+            return None, None, None
+
+    def _fill(self, queue, source_index, select_parents):
+        while len(queue) < self.size:
+            if select_parents:
+                ninput = self.sources[source_index].ninput
+                parent_ids, parent_structures = select_parents(ninput)
+            else:
+                parent_ids, parent_structures = None, None
+            future = self.executor.submit(
+                _make_candidate,
+                source_index,
+                parent_ids,
+                parent_structures,
+            )
+            queue.append(future)
+
+    def shutdown(self):
+        """
+        Cancels all queued candidates and closes the background processes.
+        """
+        for queue in self.queues.values():
+            for future in queue:
+                future.cancel()
+        self.queues = {}
+        self.executor.shutdown(wait=True)
+
+
+# The sources and featurizer of a background process. These are set once by
+# _init_process when the process starts.
+_process_sources = []
+_process_featurizer = None
+
+
+def _init_process(seed_queue, sources_and_featurizer):
+    global _process_sources, _process_featurizer
+
+    # sources may need the database, so we set up django first
+    importlib.import_module("simmate.configuration.django.setup_full")
+
+    # Creators use numpy's and python's global random number generators, so
+    # we seed both using the next stream in the queue.
+    seed_sequence = seed_queue.get()
+    numpy.random.seed(seed_sequence.generate_state(4))
+    random.seed(int(seed_sequence.generate_state(1)[0]))
+
+    _process_sources, _process_featurizer = pickle.loads(sources_and_featurizer)
+
+
+def _make_candidate(source_index, parent_ids, parent_structures):
+    # This is ran in a background process, so it is defined at the module level
+    # to make sure it can be pickled.
+    source = _process_sources[source_index]
+    if parent_structures is not None:
+        structure = source.apply_transformation(parent_structures)
+    else:
+        structure = source.create_structure()
+
+    if not structure:
+        return parent_ids, None, None
+
+    fingerprint = _process_featurizer.featurize(structure)
+    return parent_ids, structure, fingerprint
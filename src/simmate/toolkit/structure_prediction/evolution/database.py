@@ -212,19 +212,16 @@ class EvolutionarySearch(DatabaseTable):
             for _, s in structures_dataframe.iterrows()
         ]
 
-        from tqdm import tqdm
-
-        structures_dataframe["fingerprint"] = [
-            numpy.array(featurizer.featurize(s.structure))
-            for _, s in tqdm(structures_dataframe.iterrows())
-        ]
+        # featurize all structures at once (split across all of our cores)
+        fingerprints = featurizer.featurize_structures(
+            structures_dataframe["structure"]
+        )
 
         fingerprint_known = numpy.array(featurizer.featurize(structure_known))
 
-        structures_dataframe["fingerprint_distance"] = [
-            numpy.linalg.norm(fingerprint_known - s.fingerprint)
-            for _, s in tqdm(structures_dataframe.iterrows())
-        ]
+        structures_dataframe["fingerprint_distance"] = numpy.linalg.norm(
+            fingerprints - fingerprint_known, axis=1
+        )
 
         # There's only one plot here, no subplot. So we make the scatter
         # object and just pass it directly to a Figure object
@@ -279,10 +276,25 @@ class StructureSource(DatabaseTable):
     )
 
     def update_flow_run_ids(self):
+        # this is the same as updating many sources, but with only this one
+        self.update_many_flow_run_ids([self])
+
+        # in case we need the list of ids, we return it too
+        return self.prefect_flow_run_ids
+
+    @classmethod
+    def update_many_flow_run_ids(cls, sources):
+        """
+        Updates the prefect_flow_run_ids of many sources at once. This only
+        sends a single query to Prefect no matter how many sources (and flow runs)
+        there are, and only saves the sources that have changed.
+        """
 
         # Using our list of current run ids, we query prefect to see which of
         # these still are running or in the queue.
-        # OPTIMIZE: This may be a really bad way to query Prefect...
+        all_ids = [id for source in sources for id in source.prefect_flow_run_ids]
+        if not all_ids:
+            return
         query = {
             "query": {
                 with_args(
@@ -290,7 +302,7 @@ class StructureSource(DatabaseTable):
                     {
                         "where": {
                             "state": {"_in": ["Running", "Scheduled"]},
-                            "id": {"_in": self.prefect_flow_run_ids},
+                            "id": {"_in": all_ids},
                         },
                     },
                 ): ["id"]
@@ -298,15 +310,19 @@ class StructureSource(DatabaseTable):
         }
         client = Client()
         result = client.graphql(query)
-        # graphql gives a weird format, so I reparse it into just a list of ids
-        result = [run["id"] for run in result["data"]["flow_run"]]
-
-        # we now have our new list of IDs! Let's update it to the database
-        self.prefect_flow_run_ids = result
-        self.save()
-
-        # in case we need the list of ids, we return it too
-        return result
+        # graphql gives a weird format, so I reparse it into just a set of ids
+        ids_active = {run["id"] for run in result["data"]["flow_run"]}
+
+        # now split the active ids back up between each source and save the
+        # ones that changed to the database
+        sources_changed = []
+        for source in sources:
+            ids = [id for id in source.prefect_flow_run_ids if id in ids_active]
+            if ids != source.prefect_flow_run_ids:
+                source.prefect_flow_run_ids = ids
+                sources_changed.append(source)
+        if sources_changed:
+            cls.objects.bulk_update(sources_changed, ["prefect_flow_run_ids"])
 
     @property
     def nprefect_flow_runs(self):
@@ -314,3 +330,32 @@ class StructureSource(DatabaseTable):
         runs = self.update_flow_run_ids()
         # now the currently running ones is just the length of ids!
         return len(runs)
+
+
+class Fingerprint(DatabaseTable):
+    """
+    Stores the fingerprint of a structure so that it only ever needs to be
+    calculated once. This is used by fingerprint validators (such as
+    PartialCrystalNNFingerprint) so that restarting a search doesn't require
+    featurizing every past structure again.
+
+    Fingerprints are linked to a structure through the name of its table and its
+    id. Because the same structure gives a different fingerprint depending on
+    the featurizer settings, we also store a hash of those settings.
+    """
+
+    class Meta:
+        app_label = "local_calculations"
+        unique_together = ["database_table", "database_id", "featurizer_hash"]
+
+    # the table and id of the structure (e.g. "local_calculations.Quality04Relaxation")
+    database_table = table_column.CharField(max_length=200)
+    database_id = table_column.IntegerField()
+
+    # a sha256 hash of the featurizer settings used
+    featurizer_hash = table_column.CharField(max_length=64)
+
+    # the fingerprint as the raw bytes of a 1D float64 numpy array
+    fingerprint = table_column.BinaryField()
+
+    created_at = table_column.DateTimeField(auto_now_add=True)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+
+
+class RankedPopulation:
+    """
+    Keeps the best individuals of a search in memory, ranked by their fitness
+    (where lower is better). Selectors can then pick parents by rank without
+    querying the database or parsing any structures.
+
+    Only the top `size` individuals are kept. Individuals are added as their
+    calculations complete, and structures are only loaded for those that
+    actually make it into the ranking.
+    """
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        # These three lists are always kept in order of rank
+        self.fitnesses = []
+        self.ids = []
+        self.structures = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def would_rank(self, fitness: float) -> bool:
+        """
+        Whether an individual with this fitness would be kept in the ranking.
+        """
+        return len(self) < self.size or fitness < self.fitnesses[-1]
+
+    def add(self, id: int, fitness: float, structure):
+        """
+        Adds an individual to the ranking, dropping the worst one if we are
+        over the size limit.
+        """
+        if not self.would_rank(fitness):
+            return
+
+        # bisect_right keeps ties in the order they were added
+        rank = bisect.bisect_right(self.fitnesses, fitness)
+        self.fitnesses.insert(rank, fitness)
+        self.ids.insert(rank, id)
+        self.structures.insert(rank, structure)
+
+        if len(self) > self.size:
+            self.fitnesses.pop()
+            self.ids.pop()
+            self.structures.pop()
@@ -1,10 +1,9 @@
 # -*- coding: utf-8 -*-
 
-import time
-
 from pymatgen.core import Composition
 
 from simmate.configuration.django import setup_full  # sets database connection
+from simmate.database.base_data_types.calculation import CALCULATION_CHANNEL
 from simmate.database.local_calculations.evolution import (
     EvolutionarySearch as SearchDatatable,
     StructureSource as SourceDatatable,
@@ -15,9 +14,16 @@ import simmate.toolkit.transformations.all as transform_module
 from simmate.toolkit.validators.fingerprint.pcrystalnn import (
     PartialCrystalNNFingerprint,
 )
+from simmate.toolkit.structure_prediction.evolution.candidate_buffer import (
+    CandidateBuffer,
+)
+from simmate.toolkit.structure_prediction.evolution.population import (
+    RankedPopulation,
+)
 
 from typing import List, Union, Tuple
 from simmate.workflow_engine.workflow import Workflow
+from simmate.workflow_engine.execution.future import CompletionListener
 
 # TODO:
 #
@@ -133,6 +139,8 @@ class SearchEngine:
         ],
         selector: str = "TruncatedSelection",
         labels: List[str] = [],
+        candidate_buffer_size: int = 0,
+        nprocs_candidates: int = None,
     ):
 
         """
@@ -173,6 +181,14 @@ class SearchEngine:
         selector : str (optional)
             The defualt method to use for choosing the parent individual(s). The
             default is TruncatedSelection.
+        candidate_buffer_size : int (optional)
+            The number of new structures to keep ready for each source. These are
+            made in background processes while the search runs, so slow sources
+            don't hold up submissions. The default is 0, which makes each
+            structure only when it's needed.
+        nprocs_candidates : int (optional)
+            The number of background processes used to make structures when
+            candidate_buffer_size is above 0. The default is all cores.
         """
 
         # No mutations/transforms are done until this many calcs complete
@@ -199,6 +215,10 @@ class SearchEngine:
         self.max_structures = max_structures
         self.nsteadystate = nsteadystate
         self.nfirst_generation = nfirst_generation
+        self.candidate_buffer_size = candidate_buffer_size
+        self.nprocs_candidates = nprocs_candidates
+        # This is only created once the search is ran. See run().
+        self.candidate_buffer = None
 
         # Initialize the selector
         if selector == "TruncatedSelection":
@@ -354,7 +374,7 @@ class SearchEngine:
         # Initialize the fingerprint database
         # For this we need to grab all previously calculated structures of this
         # compositon too pass in too.
-        print("Generating fingerprints for past structures...")
+        print("Loading fingerprints for past structures...")
         # BUG: should we only do structures that were successfully calculated?
         # If not, there's a chance a structure fails because of something like a
         # crashed slurm job, but it's never submitted again...
@@ -366,15 +386,59 @@ class SearchEngine:
         )
         print("Done.")
 
+        # Rather than counting and sorting all individuals every time we check
+        # on the search, we keep track of the population in memory and only
+        # query the individuals that completed since our last check.
+        # See _update_population for more.
+        self.ncompleted = 0
+        self.best_individual = None
+        self.nnew_since_best = 0
+        # We also keep the best individuals (and their structures) ranked in
+        # memory so that selecting parents doesn't need any queries.
+        # NOTE: I assume we'll never need more than the best 200 structures, which
+        # may not be true in special cases.
+        self.population = RankedPopulation(size=200)
+        self._completed_ids = set()
+        self._update_population()
+
     def run(self, sleep_step=10):
 
         # See if the singleshot sources have been ran yet. For restarted calculations
         # this will likely not be needed (unless a new source was added)
         self._check_singleshot_sources()
 
+        # Workflows signal when they save new results, so rather than sleeping
+        # a set amount of time between checks, we wake up as soon as an
+        # individual completes. The sleep_step is then only a maximum wait
+        # (and is the only option for databases other than Postgres).
+        listener = CompletionListener(channel=CALCULATION_CHANNEL)
+
+        # start making structures in the background if requested
+        if self.candidate_buffer_size:
+            self.candidate_buffer = CandidateBuffer(
+                featurizer=self.fingerprint_validator.featurizer,
+                sources=self.steadystate_sources,
+                size=self.candidate_buffer_size,
+                nprocs=self.nprocs_candidates,
+            )
+
+        try:
+            self._run_loop(listener, sleep_step)
+        finally:
+            listener.close()
+            if self.candidate_buffer:
+                self.candidate_buffer.shutdown()
+                self.candidate_buffer = None
+        print("Stopping the search (remaining calcs will be left to finish).")
+
+    def _run_loop(self, listener, sleep_step):
+
         # this loop will go until I hit 'break' below
         while True:
 
+            # grab any individuals that completed since our last check
+            self._update_population()
+
             # TODO: maybe write summary files to csv...? This may be a mute
             # point because I expect we can follow along in the web UI in the future
             # To that end, I can add a "URL" property
@@ -395,13 +459,93 @@ class SearchEngine:
             # TODO: Go through the triggered actions
             # self._check_triggered_actions()
 
-            # To save our database load, sleep until we run checks again.
-            # OPTIMIZE: ask Prefect if their is an equivalent to Dask's gather/wait
-            # functions, so we know exactly when a workflow completes
-            # https://docs.dask.org/en/stable/futures.html#waiting-on-futures
-            print(f"Sleeping for {sleep_step} seconds before running checks again.")
-            time.sleep(sleep_step)
-        print("Stopping the search (remaining calcs will be left to finish).")
+            # To save our database load, wait until a new individual completes
+            # (or until sleep_step passes) before we run checks again.
+            print(
+                "Waiting for new results (or up to "
+                f"{sleep_step} seconds) before running checks again."
+            )
+            listener.wait(sleep_step)
+
+    def _update_population(self):
+        """
+        Updates our in-memory stats on the population (ncompleted,
+        best_individual, nnew_since_best, and the ranked population) using only
+        the individuals that completed since the last update.
+        """
+
+        # We find new individuals by their id rather than by a timestamp.
+        # Timestamps come from whichever machine saved the result, so results
+        # that commit late (or come from a worker with a skewed clock) could be
+        # missed for good. Grabbing all completed ids is a cheap query, and we
+        # then only load the individuals we haven't seen yet.
+        completed_ids = self.search_datatable.individuals_completed.values_list(
+            "id", flat=True
+        )
+        new_ids = sorted(set(completed_ids) - self._completed_ids)
+
+        # new ids are queried in chunks to stay under the limit some databases
+        # (e.g. SQLite) put on the number of query parameters
+        new_individuals = []
+        for i in range(0, len(new_ids), 500):
+            new_individuals.extend(
+                self.search_datatable.individuals_completed.filter(
+                    id__in=new_ids[i : i + 500]
+                ).only("id", "energy_per_atom", "created_at")
+            )
+        new_individuals.sort(key=lambda individual: individual.created_at)
+
+        best_changed = False
+        individuals_added = []
+        for individual in new_individuals:
+            self._completed_ids.add(individual.id)
+            self.ncompleted += 1
+            individuals_added.append(individual)
+
+            if (
+                not self.best_individual
+                or individual.energy_per_atom < self.best_individual.energy_per_atom
+            ):
+                self.best_individual = individual
+                best_changed = True
+            elif (
+                individual.energy_per_atom > self.best_individual.energy_per_atom
+                and individual.created_at >= self.best_individual.created_at
+            ):
+                self.nnew_since_best += 1
+
+        # Individuals can complete out of order, so when there's a new best we
+        # count the ones that came after it from scratch. This is rare, so we
+        # don't mind the extra query.
+        if best_changed:
+            self.nnew_since_best = self.search_datatable.individuals.filter(
+                # check energies to ensure we only count completed calculations
+                energy_per_atom__gt=self.best_individual.energy_per_atom,
+                created_at__gte=self.best_individual.created_at,
+            ).count()
+
+        # Add the new individuals to our ranked population. Structures are only
+        # loaded (in a single query) for those that make it into the ranking.
+        individuals_added.sort(key=lambda individual: individual.energy_per_atom)
+        individuals_ranked = []
+        for individual in individuals_added:
+            # as these are sorted, none of the remaining individuals will rank
+            if not self.population.would_rank(individual.energy_per_atom):
+                break
+            individuals_ranked.append(individual)
+        if individuals_ranked:
+            structures = self.individuals_datatable.objects.filter(
+                id__in=[individual.id for individual in individuals_ranked]
+            ).only("structure_string")
+            structures = {
+                structure.id: structure.to_pymatgen() for structure in structures
+            }
+            for individual in individuals_ranked:
+                self.population.add(
+                    id=individual.id,
+                    fitness=individual.energy_per_atom,
+                    structure=structures[individual.id],
+                )
 
     def _check_stop_condition(self):
 
@@ -411,7 +555,7 @@ class SearchEngine:
         # Nothing is done to stop those that are still running or to count
         # structures that failed to be calculated
         # {f"{self.fitness_field}__isnull"=False} # when I allow other fitness fxns
-        if self.search_datatable.individuals_completed.count() > self.max_structures:
+        if self.ncompleted > self.max_structures:
             print(
                 f"Maximum number of completed calculations hit (n={self.max_structures}."
             )
@@ -421,21 +565,14 @@ class SearchEngine:
         # any becoming the new "best") is greater than limit_best_survival, then
         # we can stop the search.
 
-        # grab the best individual for reference
-        best = self.search_datatable.best_individual
-
         # We need this if-statement in case no structures have completed yet.
-        if not best:
+        if not self.best_individual:
             return False
 
-        # count the number of new individuals added AFTER the best one. If it is
+        # check the number of new individuals added AFTER the best one. If it is
         # more than limit_best_survival, we stop the search.
-        num_new_structures_since_best = self.search_datatable.individuals.filter(
-            # check energies to ensure we only count completed calculations
-            energy_per_atom__gt=best.energy_per_atom,
-            created_at__gte=best.created_at,
-        ).count()
-        if num_new_structures_since_best > self.limit_best_survival:
+        # This count is kept up to date by _update_population.
+        if self.nnew_since_best > self.limit_best_survival:
             print(
                 f"Best individual has not changed after {self.limit_best_survival}"
                 " new individuals added."
@@ -449,6 +586,10 @@ class SearchEngine:
 
     def _check_steadystate_workflows(self):
 
+        # Grab which workflows are still running for all sources at once. This
+        # is one query to Prefect rather than one per source.
+        SourceDatatable.update_many_flow_run_ids(self.steadystate_sources_db)
+
         # we iterate through each steady-state source and check to see how many
         # jobs are still running for it. If it's less than the target steady-state,
         # then we need to submit more!
@@ -461,7 +602,8 @@ class SearchEngine:
             # create that many new individuals! max(x,0) ensure we don't get a
             # negative value. A value of 0 means we are at steady-state and can
             # just skip this loop.
-            for n in range(max(int(njobs_target - source_db.nprefect_flow_runs), 0)):
+            njobs_running = len(source_db.prefect_flow_run_ids)
+            for n in range(max(int(njobs_target - njobs_running), 0)):
 
                 # now we need to make a new individual and submit it!
                 parent_ids, structure = self._make_new_structure(source)
@@ -520,9 +662,7 @@ class SearchEngine:
         # transformations require that we have completed structures in the
         # database. We want to wait until there's a set amount before
         # we start mutating the best. We check that here.
-        if is_transformation and (
-            self.search_datatable.individuals_completed.count() < self.nfirst_generation
-        ):
+        if is_transformation and self.ncompleted < self.nfirst_generation:
             print(
                 "Search isn't ready for transformations yet."
                 f" Skipping {source.__class__.__name__}"
@@ -538,6 +678,20 @@ class SearchEngine:
         while not new_structure and attempt <= max_attempts:
             # add an attempt
             attempt += 1
+
+            # If we have a buffer, the structure (and its fingerprint) was
+            # already made in the background, so we just need to check it.
+            if self.candidate_buffer:
+                parent_ids, new_structure, fingerprint = self.candidate_buffer.get(
+                    source,
+                    select_parents=self._select_parents if is_transformation else None,
+                )
+                if new_structure is not None:
+                    if not self.fingerprint_validator.check_fingerprint(fingerprint):
+                        print("Generated structure is not unique. Trying again.")
+                        new_structure = None
+                continue
+
             if is_transformation:
                 # grab parent structures using the selection method
                 parent_ids, parent_structures = self._select_parents(
@@ -575,32 +729,15 @@ class SearchEngine:
 
     def _select_parents(self, nselect):
 
-        # our selectors just require a dataframe where we specify the fitness
-        # column. So we query our individuals database to give this as an input.
-        individuals_df = self.search_datatable.individuals_completed.order_by(
-            "energy_per_atom"
-        )[:200].to_dataframe()
-        # NOTE: I assume we'll never need more than the best 200 structures, which
-        # may not be true in special cases.
-
-        # From these individuals, select our parent structures
-        parents_df = self.selector.select(nselect, individuals_df, "energy_per_atom")
-
-        # grab the id column of the parents and convert it to a list
-        parent_ids = parents_df.id.values.tolist()
-
-        # now lets grab these structures from our database and convert them
-        # to a list of pymatgen structures.
-        # We have to make separate queries for this instead of doing "id__in=parent_ids".
-        # This is because (1) order may be important and (2) we may have duplicate
-        # entries. For example, a hereditary mutation can request parent ids of [123,123]
-        # in which case we want to give the same input structure twice!
-        parent_structures = [
-            self.individuals_datatable.objects.only("structure_string")
-            .get(id=parent_id)
-            .to_pymatgen()
-            for parent_id in parent_ids
-        ]
+        # Our population is already ranked by fitness, so the selector only needs
+        # to choose ranks. The ids and (already loaded) structures are then pulled
+        # from the population. Note, a hereditary mutation can request the same
+        # parent twice (e.g. ranks of [3, 3]) in which case we want to give the
+        # same input structure twice!
+        ranks = self.selector.select_ranks(nselect, len(self.population))
+        parent_ids = [self.population.ids[rank] for rank in ranks]
+        # We give copies of the structures in case a transformation modifies them.
+        parent_structures = [self.population.structures[rank].copy() for rank in ranks]
 
         # When there's only one structure selected we return the structure and
         # id independents -- not within a list
@@ -15,6 +15,8 @@
 # other selection methods throw issues with lower=better and even more issues
 # when we have negative values
 
+import random
+
 
 class Selector:
     def __init__(
@@ -65,3 +67,22 @@ class TruncatedSelection:
 
         # return the list of indexes to be selected
         return df_parents
+
+    def select_ranks(self, nselect, nindividuals):
+        """
+        The same as select(), but for a population that is already sorted by
+        fitness (such as a RankedPopulation). Only the number of individuals is
+        needed, and the ranks (i.e. indexes) of the selected parents are returned.
+        """
+
+        # truncate the population just like we do in select()
+        ntruncate = int(nindividuals * self.percentile)
+        if ntruncate < self.ntruncate_min:
+            ntruncate = self.ntruncate_min
+        ntruncate = min(ntruncate, nindividuals)
+
+        # randomly select the correct number of parents from the top ranks
+        if self.allow_duplicate:
+            return random.choices(range(ntruncate), k=nselect)
+        else:
+            return random.sample(range(ntruncate), k=nselect)
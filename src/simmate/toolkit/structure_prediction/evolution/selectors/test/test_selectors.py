@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import numpy
+import pandas
+import pytest
+
+from simmate.toolkit.structure_prediction.evolution.selectors.all import (
+    TruncatedSelection,
+)
+
+
+@pytest.mark.parametrize("nindividuals", [3, 10, 100, 1000])
+def test_select_ranks(nindividuals):
+
+    # seeded so that every top rank is reliably picked at least once
+    random.seed(0)
+    numpy.random.seed(0)
+
+    selector = TruncatedSelection(percentile=0.05, ntruncate_min=5)
+    ranks = selector.select_ranks(nselect=500, nindividuals=nindividuals)
+
+    # selection is limited to the same top ranks that select() would use
+    ntruncate = min(max(int(nindividuals * 0.05), 5), nindividuals)
+    assert len(ranks) == 500
+    assert set(ranks) == set(range(ntruncate))
+
+    individuals = pandas.DataFrame(
+        {"id": range(nindividuals), "energy": range(nindividuals)}
+    )
+    selected = selector.select(
+        nselect=500,
+        individuals=individuals.sample(frac=1),
+        fitness_column="energy",
+    )
+    assert set(selected["id"]) == set(ranks)
+
+
+def test_select_ranks_no_duplicates():
+
+    selector = TruncatedSelection(ntruncate_min=5, allow_duplicate=False)
+    ranks = selector.select_ranks(nselect=5, nindividuals=50)
+    assert sorted(ranks) == list(range(5))
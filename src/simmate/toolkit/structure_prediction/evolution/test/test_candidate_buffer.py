@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import pytest
+
+from pymatgen.core import Composition
+
+from simmate.toolkit.creators.lattice.all import RSLSmartVolume
+from simmate.toolkit.creators.vector.uniform_distribution import (
+    UniformlyDistributedVectors,
+)
+from simmate.toolkit.structure_prediction.evolution.candidate_buffer import (
+    CandidateBuffer,
+)
+
+
+class ToySource:
+    # stands in for a creator that draws from a buffered generator
+    def __init__(self):
+        self.generator = UniformlyDistributedVectors()
+        # fill the generator's buffer in this process before it is sent out
+        self.generator.new_vector()
+
+    def create_structure(self):
+        return tuple(self.generator.new_vector())
+
+
+class ToyFeaturizer:
+    def featurize(self, structure):
+        return sum(structure)
+
+
+def test_pickle_drops_buffers():
+    generator = UniformlyDistributedVectors()
+    generator.new_vector()
+    assert generator._vectors
+    assert pickle.loads(pickle.dumps(generator))._vectors == []
+
+    lattice_generator = RSLSmartVolume(composition=Composition("Fe2O3"))
+    lattice_generator._lattice_buffers = {1: [None]}
+    assert pickle.loads(pickle.dumps(lattice_generator))._lattice_buffers == {}
+
+
+def test_candidate_buffer_distinct():
+    source = ToySource()
+    buffer = CandidateBuffer(
+        featurizer=ToyFeaturizer(),
+        sources=[source],
+        size=4,
+        nprocs=2,
+        seed=5,
+    )
+    try:
+        candidates = [buffer.get(source) for _ in range(8)]
+    finally:
+        buffer.shutdown()
+
+    structures = [structure for _, structure, _ in candidates]
+    assert None not in structures
+    assert len(set(structures)) == len(structures)
+
+
+class CountsPickles:
+    # counts how many times a source is sent to another process
+    npickles = 0
+
+    def __reduce__(self):
+        CountsPickles.npickles += 1
+        return CountsPickles, ()
+
+    def create_structure(self):
+        return (0.0,)
+
+
+def test_candidate_buffer_sends_sources_once():
+    source = CountsPickles()
+    buffer = CandidateBuffer(
+        featurizer=ToyFeaturizer(),
+        sources=[source],
+        size=2,
+        nprocs=2,
+    )
+    try:
+        for _ in range(5):
+            assert buffer.get(source)[1] == (0.0,)
+        # only sources given to the buffer are accepted
+        with pytest.raises(ValueError):
+            buffer.get(ToySource())
+    finally:
+        buffer.shutdown()
+
+    # it was pickled once, no matter how many candidates or processes
+    assert CountsPickles.npickles == 1
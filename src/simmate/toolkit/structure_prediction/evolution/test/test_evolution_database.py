@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from simmate.toolkit.structure_prediction.evolution import database
+from simmate.database.local_calculations.evolution import (
+    EvolutionarySearch,
+    StructureSource,
+)
+
+
+class FakeClient:
+    # stands in for prefect's Client and records each query that is sent
+    queries = []
+    active_ids = []
+
+    def graphql(self, query):
+        self.queries.append(query)
+        return {"data": {"flow_run": [{"id": id} for id in self.active_ids]}}
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    FakeClient.queries = []
+    FakeClient.active_ids = []
+    monkeypatch.setattr(database, "Client", FakeClient)
+    return FakeClient
+
+
+@pytest.mark.django_db
+def test_update_many_flow_run_ids(fake_client):
+
+    search = EvolutionarySearch.objects.create(
+        composition="Ca2 N1",
+        individuals_datatable_str="MITRelaxation",
+        workflows=[],
+        max_structures=100,
+        limit_best_survival=10,
+    )
+    sources = [
+        StructureSource.objects.create(
+            name=f"source-{i}",
+            is_steadystate=True,
+            is_singleshot=False,
+            search=search,
+            prefect_flow_run_ids=ids,
+        )
+        for i, ids in enumerate([["a", "b"], ["c"], ["d", "e"], []])
+    ]
+
+    # change the database copies of the other sources behind their backs, so
+    # that we can tell if they are (wrongly) saved
+    StructureSource.objects.exclude(id=sources[0].id).update(
+        prefect_flow_run_ids=["untouched"]
+    )
+
+    fake_client.active_ids = ["a", "c", "d", "e"]
+    StructureSource.update_many_flow_run_ids(sources)
+
+    # a single query is sent with all of the ids
+    assert len(fake_client.queries) == 1
+    assert "a" in str(fake_client.queries[0])
+    assert "e" in str(fake_client.queries[0])
+
+    assert [source.prefect_flow_run_ids for source in sources] == [
+        ["a"],
+        ["c"],
+        ["d", "e"],
+        [],
+    ]
+
+    # only the first source changed, so it's the only one that was saved
+    assert [
+        source.prefect_flow_run_ids
+        for source in StructureSource.objects.order_by("id").all()
+    ] == [["a"], ["untouched"], ["untouched"], ["untouched"]]
+
+
+@pytest.mark.django_db
+def test_update_flow_run_ids_without_ids(fake_client):
+
+    search = EvolutionarySearch.objects.create(
+        composition="Ca2 N1",
+        individuals_datatable_str="MITRelaxation",
+        workflows=[],
+        max_structures=100,
+        limit_best_survival=10,
+    )
+    source = StructureSource.objects.create(
+        name="source",
+        is_steadystate=True,
+        is_singleshot=False,
+        search=search,
+    )
+
+    # with no runs to check, we shouldn't query prefect at all
+    assert source.update_flow_run_ids() == []
+    assert source.nprefect_flow_runs == 0
+    assert fake_client.queries == []
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from simmate.toolkit.structure_prediction.evolution.population import (
+    RankedPopulation,
+)
+
+
+def test_ranked_population():
+
+    population = RankedPopulation(size=3)
+    assert len(population) == 0
+    assert population.would_rank(100)
+
+    population.add(id=1, fitness=-1.0, structure="s1")
+    population.add(id=2, fitness=-3.0, structure="s2")
+    population.add(id=3, fitness=-2.0, structure="s3")
+
+    # individuals are kept in order of fitness, lowest first
+    assert population.ids == [2, 3, 1]
+    assert population.fitnesses == [-3.0, -2.0, -1.0]
+    assert population.structures == ["s2", "s3", "s1"]
+
+    # now that we are full, only better individuals make it in
+    assert not population.would_rank(-1.0)
+    assert not population.would_rank(0.0)
+    assert population.would_rank(-1.5)
+
+    population.add(id=4, fitness=0.0, structure="s4")
+    assert population.ids == [2, 3, 1]
+
+    # adding a better one pushes out the worst
+    population.add(id=5, fitness=-2.5, structure="s5")
+    assert len(population) == 3
+    assert population.ids == [2, 5, 3]
+    assert population.structures == ["s2", "s5", "s3"]
+
+
+def test_ranked_population_ties():
+
+    population = RankedPopulation(size=4)
+    population.add(id=1, fitness=-1.0, structure=None)
+    population.add(id=2, fitness=-2.0, structure=None)
+    population.add(id=3, fitness=-1.0, structure=None)
+    population.add(id=4, fitness=-2.0, structure=None)
+
+    # ties stay in the order they were added
+    assert population.ids == [2, 4, 1, 3]
+
+    # and a tie with the worst individual doesn't replace it
+    population.add(id=5, fitness=-1.0, structure=None)
+    assert population.ids == [2, 4, 1, 3]
+
+
+def test_ranked_population_matches_sort():
+
+    fitnesses = [random.uniform(-10, 0) for _ in range(100)]
+    population = RankedPopulation(size=20)
+    for id, fitness in enumerate(fitnesses):
+        population.add(id=id, fitness=fitness, structure=id)
+
+    expected = sorted(range(100), key=lambda id: fitnesses[id])[:20]
+    assert population.ids == expected
+    assert population.structures == expected
+    assert population.fitnesses == sorted(fitnesses)[:20]
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from django.utils import timezone
+from pymatgen.core import Lattice, Structure
+
+pytest.importorskip("matminer")
+
+from simmate.database.base_data_types import Spacegroup
+from simmate.database.local_calculations.energy import MITStaticEnergy
+from simmate.database.local_calculations.evolution import EvolutionarySearch
+from simmate.toolkit.structure_prediction.evolution.population import (
+    RankedPopulation,
+)
+from simmate.toolkit.structure_prediction.evolution.search_engine import (
+    SearchEngine,
+)
+
+
+@pytest.fixture
+def search(transactional_db):
+    Spacegroup.load_database_from_pymatgen()
+    return EvolutionarySearch.objects.create(
+        composition="Na1 Cl1",
+        individuals_datatable_str="MITStaticEnergy",
+        workflows=[],
+        max_structures=100,
+        limit_best_survival=10,
+    )
+
+
+def _add_individual(energy):
+    # NaCl has two sites, so the energy_per_atom is half of this energy
+    individual = MITStaticEnergy.from_pymatgen(
+        Structure(Lattice.cubic(3), ["Na", "Cl"], [[0, 0, 0], [0.5, 0.5, 0.5]]),
+        energy=energy,
+    )
+    individual.save()
+    return individual
+
+
+def _get_engine(search):
+    # We only need the population tracking here, so we skip the (slow) setup of
+    # sources and validators in SearchEngine.__init__
+    engine = SearchEngine.__new__(SearchEngine)
+    engine.search_datatable = search
+    engine.individuals_datatable = MITStaticEnergy
+    engine.max_structures = search.max_structures
+    engine.limit_best_survival = search.limit_best_survival
+    engine.ncompleted = 0
+    engine.best_individual = None
+    engine.nnew_since_best = 0
+    engine.population = RankedPopulation(size=3)
+    engine._completed_ids = set()
+    return engine
+
+
+def _count_since_best(search):
+    # how the search counted this before it was tracked in memory
+    best = search.best_individual
+    return search.individuals.filter(
+        energy_per_atom__gt=best.energy_per_atom,
+        created_at__gte=best.created_at,
+    ).count()
+
+
+def test_update_population(search):
+
+    engine = _get_engine(search)
+    engine._update_population()
+    assert engine.ncompleted == 0
+    assert not engine._check_stop_condition()
+
+    for energy in [-2, -6, -4]:
+        _add_individual(energy)
+    incomplete = _add_individual(None)
+
+    engine._update_population()
+    assert engine.ncompleted == 3
+    assert engine.best_individual.id == search.best_individual.id
+    assert engine.nnew_since_best == _count_since_best(search) == 1
+
+    # only new individuals are added, and nothing is counted twice
+    _add_individual(-1)
+    engine._update_population()
+    engine._update_population()
+    assert engine.ncompleted == 4
+    assert engine.nnew_since_best == _count_since_best(search) == 2
+
+    # individuals that complete later are picked up too, even when their
+    # timestamp is older than our last check (e.g. a worker's clock is behind)
+    MITStaticEnergy.objects.filter(id=incomplete.id).update(
+        energy_per_atom=-0.5,
+        updated_at=timezone.now() - timezone.timedelta(days=1),
+    )
+    engine._update_population()
+    assert engine.ncompleted == search.individuals_completed.count() == 5
+    assert engine.nnew_since_best == _count_since_best(search) == 3
+
+    # a new best individual resets the count
+    new_best = _add_individual(-10)
+    engine._update_population()
+    assert engine.best_individual.id == new_best.id
+    assert engine.nnew_since_best == _count_since_best(search) == 0
+
+    # the ranked population only keeps the best few
+    assert engine.population.ids == [
+        individual.id
+        for individual in search.individuals_completed.order_by("energy_per_atom")[:3]
+    ]
+
+    # and the stop condition uses these stats
+    assert not engine._check_stop_condition()
+    engine.nnew_since_best = engine.limit_best_survival + 1
+    assert engine._check_stop_condition()
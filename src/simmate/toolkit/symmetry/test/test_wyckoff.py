@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import itertools
+import json
+import os
+
+import pytest
+
+from simmate.toolkit.symmetry.wyckoff import (
+    WYCKOFF_CACHE_VERSION,
+    WYCKOFF_DATA,
+    WYCKOFF_DATA_HASH,
+    findValidWyckoffCombos,
+    findValidWyckoffCombosForListofSpacegroups,
+    getWyckoffGroups,
+    loadValidWyckoffCombos,
+)
+
+
+def _get_group_limit(wy_groups, wy_group):
+    # groups of sites with Availability = 1 can be used once per site
+    return wy_groups[wy_group].size if wy_group[1] == 1 else wy_group[1]
+
+
+def _find_combos_reference(stoich, spacegroup):
+    # The original (brute-force) version of findValidWyckoffCombos, which
+    # filters every possible combination. Used to check the pruned version.
+    wy_groups = getWyckoffGroups(spacegroup, WYCKOFF_DATA)
+
+    wy_combos = []
+    for nsites in stoich:
+        valid_group_combos = []
+        for size in range(1, nsites + 1):
+            for combo in itertools.combinations_with_replacement(wy_groups, size):
+                if sum(wy_group[0] for wy_group in combo) != nsites:
+                    continue
+                if all(
+                    combo.count(wy_group) <= _get_group_limit(wy_groups, wy_group)
+                    for wy_group in combo
+                ):
+                    valid_group_combos.append(combo)
+        wy_combos.append(valid_group_combos)
+
+    valid_combos = []
+    for combo in itertools.product(*wy_combos):
+        if all(
+            sum(element.count(wy_group) for element in combo)
+            <= _get_group_limit(wy_groups, wy_group)
+            for wy_group in wy_groups
+        ):
+            valid_combos.append(combo)
+    return valid_combos
+
+
+@pytest.mark.parametrize(
+    "stoich, spacegroup",
+    [
+        ([1], 1),
+        ([2, 1], 2),
+        ([4, 4, 12], 14),
+        ([2, 2, 6], 62),
+        ([3, 6], 166),
+        ([4, 8], 225),
+        ([2, 4], 227),
+    ],
+)
+def test_find_valid_wyckoff_combos(stoich, spacegroup):
+    combo_data = findValidWyckoffCombos(stoich, spacegroup)
+    # both the combos and their order should be unchanged
+    assert combo_data["ValidCombinations"] == _find_combos_reference(stoich, spacegroup)
+
+
+def test_load_valid_wyckoff_combos(tmp_path):
+
+    stoich = [2, 4]
+    spacegroups = [1, 2, 14, 225]
+    expected = {
+        spacegroup: _find_combos_reference(stoich, spacegroup)
+        for spacegroup in spacegroups
+    }
+
+    # finding the combos and then loading them from the cache gives the same
+    for _ in range(2):
+        results = loadValidWyckoffCombos(
+            stoich,
+            spacegroups,
+            nprocs=1,
+            cache_directory=tmp_path,
+        )
+        assert {
+            spacegroup: combo_data["ValidCombinations"]
+            for spacegroup, combo_data in results.items()
+        } == expected
+    assert os.listdir(tmp_path) == ["2_4.json.gz"]
+
+    # the list-of-spacegroups function gives the same results
+    results = findValidWyckoffCombosForListofSpacegroups(
+        stoich,
+        sg_include=spacegroups + [3],
+        sg_exclude=[3],
+        cache_directory=tmp_path,
+    )
+    assert {
+        spacegroup: combo_data["ValidCombinations"]
+        for spacegroup, combo_data in results.items()
+    } == expected
+
+
+def test_load_valid_wyckoff_combos_stale_cache(tmp_path):
+
+    # a cache file made from different wyckoff data is ignored (and replaced)
+    filename = tmp_path / "2.json.gz"
+    with gzip.open(filename, "wt") as file:
+        json.dump(
+            {
+                "version": WYCKOFF_CACHE_VERSION,
+                "data_hash": "made-from-other-data",
+                "spacegroups": {"1": []},
+            },
+            file,
+        )
+    results = loadValidWyckoffCombos([2], [1], nprocs=1, cache_directory=tmp_path)
+    assert results[1]["ValidCombinations"] == _find_combos_reference([2], 1)
+    with gzip.open(filename, "rt") as file:
+        assert json.load(file)["data_hash"] == WYCKOFF_DATA_HASH
+
+
+def test_load_valid_wyckoff_combos_custom_data(tmp_path):
+
+    # Drop all sites with limited availability. These results can't come from
+    # (or be saved to) the cache, which is for the default data only.
+    wy_data = WYCKOFF_DATA[WYCKOFF_DATA["Availability"] != 1]
+    loadValidWyckoffCombos([2], [1, 2], nprocs=1, cache_directory=tmp_path)
+    results = loadValidWyckoffCombos(
+        [2], [1, 2], nprocs=1, cache_directory=tmp_path, wy_data=wy_data
+    )
+    for spacegroup, combo_data in results.items():
+        assert combo_data["ValidCombinations"] == (
+            findValidWyckoffCombos([2], spacegroup, wy_data)["ValidCombinations"]
+        )
+    # spacegroup 2 only has sites with an availability of 1 besides the general
+    # position (with a multiplicity of 2), so this is a real change
+    assert results[2]["ValidCombinations"] == [(((2, float("inf")),),)]
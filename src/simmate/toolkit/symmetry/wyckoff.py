@@ -3,8 +3,17 @@
 ##############################################################################
 
 import os
+import gzip
+import hashlib
+import json
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy
 import pandas as pd
-import itertools
+from tqdm import tqdm
 
 ##############################################################################
 
@@ -72,162 +81,394 @@ def findValidWyckoffCombos(stoich, spacegroup, wy_data=loadWyckoffData()):
     speed improvement.
     """
 
-    # Grab all the wyckoff sites associated with the spacegroup given
-    wy_sg = wy_data.query("SpaceGroup == @spacegroup")
+    # Grab all the wyckoff groups associated with the spacegroup given
+    wy_groups = getWyckoffGroups(spacegroup, wy_data)
 
-    # This separate wy_sites into unique (MultiplicityPrimitive, Availability)
-    # groups. This is useful for massive speed-up in the function as we can
-    # find combos of these groups instead of all wy_sites. For example, all
-    # wy_sites with Multiplicity = 2 and Availability = 2 will be treated as
-    # one group when making combos then when that combo is used (in a
-    # different function), it randomly grabs one wy_site from the group.
-    wy_groups = wy_sg.groupby(["MultiplicityPrimitive", "Availability"]).groups
+    # The total times that a wy_group is allowed to be used. If a single
+    # wy_site in the group has Availability = 1, this is the length of the
+    # group. For example, the group of 6 wy_sites that have Availability = 1 can
+    # be used a maximum of 6 times. Otherwise, the group can be used an
+    # infinite number of times. Note index 1 of a group is its Availability.
+    group_keys = list(wy_groups.keys())
+    group_limits = [
+        wy_groups[wy_group].size if wy_group[1] == 1 else wy_group[1]
+        for wy_group in group_keys
+    ]
 
     # First, we need to find what the valid combinations are for each of the
-    # individual elements. This code finds all combinations of wyckoffs sites.
-    # Combinations can be up to nsites. So we go through all combinations
-    # and see which ones meet the following criteria:
-    #   1) total wyckoff sites used is less than nsites
-    #   2) the total multiplicity of all wyckoff sites is equal to nsites
-    #   3) no wyckoff site with an availability of 1 is used multiple times
+    # individual elements. We want all combinations of wyckoff groups where:
+    #   1) the total multiplicity of all wyckoff sites is equal to nsites
+    #   2) no wyckoff group is used more times than it is available
+    # Rather than checking every possible combination, we build them up one
+    # group at a time and stop as soon as the multiplicity is too large.
     wy_combos = []
     for i, nsites in enumerate(stoich):
         # Don't search for wyckoff combinations if it's already been done for
         # a given nsite size. In [4,4,12] example, we run this code for
-        # nsites=4 twice, which is unneccessary. Instead, we want to copy the
-        # result of the first run, which is much faster. This IF statement
-        # (and all code in it) is therefore a shortcut. The algorithm works
-        # the same without this check, just slower.
-        if nsites in stoich[:i]:  # if nsites value is earlier in stoich list
-            # Find where in stoich that the nsites was done before
-            i_match = stoich.index(nsites)
-            # The index of the first occurence in stoich will match the
-            # index in wy_combos. Copy the result of that wy_combo result over.
-            wy_combos.append(wy_combos[i_match])
-            # then skip to the next nsites
+        # nsites=4 twice, which is unneccessary. Instead, we copy the result.
+        if nsites in stoich[:i]:
+            wy_combos.append(wy_combos[stoich.index(nsites)])
             continue
-        # Make an empty list that we can store all the valid combinations in
-        valid_group_combos = []
-        # Try each combination size up to the value of nsite
-        for s in range(1, nsites + 1):  # +1 because range stops at value prior
-            # Find all combinations at the combo size of s
-            combos = itertools.combinations_with_replacement(wy_groups, s)
-            # For each combination, check that criteria are met
-            for combo in combos:
-                # Say the combo is valid until proven otherwise
-                is_valid = True
-                # The total multiplicity of all wyckoff sites must be equal to
-                # nsites. Note, index 0 is "MultiplicityPrimitive".
-                mults = sum([wy_group[0] for wy_group in combo])
-                if mults != nsites:
-                    # No need to check further, so jump to the next combo.
-                    continue  # same as is_valid=False, but faster
-                # No wy_site with an availability of 1 can used multiple times.
-                # For example, site 0,0,0 cant be used more than once.
-                for wy_group in combo:
-                    # The 'uses' is total times that a given wy_group is used
-                    uses = combo.count(wy_group)
-                    # The 'avail_s' is the availabilitiy of a single wy_site
-                    # in the wy_group, which is either 1 or infinite (inf).
-                    avail_s = wy_group[1]
-                    # If a single wy_site in the group has Availability = 1
-                    if avail_s == 1:
-                        # The total times that a wy_group is allowed to be
-                        # used is the length of the group. For example, the
-                        # group of 6 wy_sites that have Availability = 1 can
-                        # be used a maximum of 6 times.
-                        avail_g = wy_groups[wy_group].size
-                    # If a single wy_site in the group has Availability = inf
-                    else:
-                        # The total times that this group can be used is inf.
-                        # Note index 1 grabs the'inf' availability value.
-                        avail_g = wy_group[1]
-                    # Now check if the site is overused.
-                    if uses > avail_g:
-                        is_valid = False
-                        break  # no need to check further in this combo
-                # If the combo has passed all tests if it reached this point,
-                # then add it to the valid list.
-                if is_valid:
-                    valid_group_combos.append(combo)
-        wy_combos.append(valid_group_combos)
+        wy_combos.append(_findElementCombos(nsites, group_keys, group_limits))
 
     # We now need to find the unique combinations of wy_combos accross all
-    # elements. For example, we ensure that Mg and Si both can't use 0,0,0.
-    # Make an empty list that we can store all the valid combinations in
-    valid_combos = []
-    #!!! The "*" uses "star expression, which I don't fully understand but it
-    #!!! gives the desired output that I want.
-    combos = itertools.product(*wy_combos)
-    for combo in combos:
-        # say the combo is valid until proven otherwise
-        is_valid = True
-        # The combo is invalid if a wycoff sites use is more than it's total
-        # availibility. For example, the wyckoff site of (0,0,0) cannot be
-        # used by both Mg and Si, whereas the wyckoff site of (0,0,z) can be
-        # used by multiple elements.
-        for wy_group in wy_groups:
-            # The 'uses' is total times that a given wy_group is used
-            uses = sum([element.count(wy_group) for element in combo])
-            # The 'avail_s' is the availabilitiy of a single wy_site
-            # in the wy_group, which is either 1 or infinite (inf).
-            avail_s = wy_group[1]
-            # If a single wy_site in the group has Availability = 1
-            if avail_s == 1:
-                # The total times that a wy_group is allowed to be
-                # used is the length of the group. For example, the
-                # group of 6 wy_sites that have Availability = 1 can
-                # be used a maximum of 6 times.
-                avail_g = wy_groups[wy_group].size
-            # If a single wy_site in the group has Availability = inf
-            else:
-                # The total times that this group can be used is inf.
-                # Note index 1 grabs the'inf' availability value.
-                avail_g = wy_group[1]
-            if uses > avail_g:
-                is_valid = False
-                break  # no need to check further in this combo
-        # If the combo has passed all tests if it reached this point,
-        # then add it to the valid list.
-        if is_valid:
-            valid_combos.append(combo)
+    # elements. For example, we ensure that Mg and Si both can't use 0,0,0,
+    # whereas the wyckoff site of (0,0,z) can be used by multiple elements.
+    # Again, we build these up one element at a time and stop as soon as a
+    # wyckoff group is overused.
+    valid_combos = _findCombinedCombos(wy_combos, group_keys, group_limits)
+
     # We want to return the valid combinations of wyckoff groups because
     # groups can refer to a number of wy_sites (a,b,c, etc.)
     #!!! TO-DO: add a better explanation of what's being returned here
     return {"WyckoffGroups": wy_groups, "ValidCombinations": valid_combos}
 
 
+def getWyckoffGroups(spacegroup, wy_data=loadWyckoffData()):
+
+    """
+    This separates the wy_sites of a spacegroup into unique
+    (MultiplicityPrimitive, Availability) groups. This is useful for massive
+    speed-up when finding combinations as we can find combos of these groups
+    instead of all wy_sites. For example, all wy_sites with Multiplicity = 2 and
+    Availability = 2 will be treated as one group when making combos then when
+    that combo is used (in a different function), it randomly grabs one wy_site
+    from the group.
+
+    The output is a dictionary of {(multiplicity, availability): row indicies}
+    that is sorted by multiplicity.
+    """
+
+    wy_sg = wy_data.query("SpaceGroup == @spacegroup")
+    return wy_sg.groupby(["MultiplicityPrimitive", "Availability"]).groups
+
+
+def _findElementCombos(nsites, group_keys, group_limits):
+
+    # Finds all combinations of wyckoff groups (with replacement) that have a
+    # total multiplicity of nsites. Combos are given in the same order as
+    # itertools.combinations_with_replacement -- sorted by size and then
+    # by group order.
+
+    combos = []
+    combo = []
+
+    def extend(start, nremaining):
+        if nremaining == 0:
+            combos.append(tuple(combo))
+            return
+        for i in range(start, len(group_keys)):
+            wy_group = group_keys[i]
+            # Groups are sorted by multiplicity (index 0), so once one is too
+            # large, all the ones after it will be too.
+            if wy_group[0] > nremaining:
+                break
+            if combo.count(wy_group) >= group_limits[i]:
+                continue
+            combo.append(wy_group)
+            extend(i, nremaining - wy_group[0])
+            combo.pop()
+
+    extend(0, nsites)
+    combos.sort(key=len)
+    return combos
+
+
+def _findCombinedCombos(wy_combos, group_keys, group_limits):
+
+    # Finds all combinations of one combo per element where no wyckoff group
+    # is used more than it is available. Combos are given in the same order as
+    # itertools.product.
+
+    # only groups with a limited availability can be overused
+    limited_groups = {
+        wy_group: limit
+        for wy_group, limit in zip(group_keys, group_limits)
+        if limit != float("inf")
+    }
+    # count how many times each element combo uses these groups up front
+    wy_combos_uses = [
+        [
+            (element_combo, Counter(g for g in element_combo if g in limited_groups))
+            for element_combo in element_combos
+        ]
+        for element_combos in wy_combos
+    ]
+
+    valid_combos = []
+    combo = []
+    uses_total = Counter()
+
+    def extend(i):
+        if i == len(wy_combos_uses):
+            valid_combos.append(tuple(combo))
+            return
+        for element_combo, uses in wy_combos_uses[i]:
+            if any(
+                uses_total[wy_group] + n > limited_groups[wy_group]
+                for wy_group, n in uses.items()
+            ):
+                continue
+            uses_total.update(uses)
+            combo.append(element_combo)
+            extend(i + 1)
+            combo.pop()
+            uses_total.subtract(uses)
+
+    extend(0)
+    return valid_combos
+
+
 ##############################################################################
 
 
+# Valid combinations are saved to this directory so that they only need to be
+# found once for a given stoichiometry and spacegroup:
+#   [home_directory] ~/.simmate/wyckoff_combinations
+WYCKOFF_CACHE_DIRECTORY = os.path.join(Path.home(), ".simmate", "wyckoff_combinations")
+
+# Increase this whenever the format of cache files (or how combos are found)
+# changes so that old cache files are ignored.
+WYCKOFF_CACHE_VERSION = 1
+
+# The cache files are only valid for the wyckoff data that ships with simmate,
+# so we keep a reference to it in order to tell when other data is given.
+WYCKOFF_DATA = loadWyckoffData()
+
+# Cache files also store a hash of the wyckoff data file. If the data file is
+# ever changed, old cache files are ignored without needing a new version.
+with open(os.path.join(os.path.dirname(__file__), "wyckoffdata.csv"), "rb") as file:
+    WYCKOFF_DATA_HASH = hashlib.sha256(file.read()).hexdigest()
+
+
+def loadValidWyckoffCombos(
+    stoich,
+    spacegroups=range(1, 231),
+    nprocs=None,
+    cache_directory=WYCKOFF_CACHE_DIRECTORY,
+    wy_data=WYCKOFF_DATA,
+):
+
+    """
+    This gives the same results as findValidWyckoffCombos but for a list of
+    spacegroups at once. The output is a dictionary of
+    {spacegroup: {"WyckoffGroups": ..., "ValidCombinations": ...}}.
+
+    Finding combinations can take minutes for larger stoichiometries, so
+    results are saved to a file in cache_directory (one gzipped json file per
+    stoichiometry) and loaded from there the next time. Any spacegroups that are
+    not in the cache yet are found in parallel using nprocs processes (all
+    cores by default) and then added to the cache. Set cache_directory=None to
+    turn off the cache. The cache is also skipped when any wy_data other than
+    the default is given.
+
+    In the cache, each wyckoff group is stored by its index in the spacegroup's
+    WyckoffGroups, so a combination for [4,4,12] is saved as something like
+    [[3], [3], [0, 5]]. The WyckoffGroups themselves are quick to remake.
+    """
+
+    spacegroups = list(spacegroups)
+    stoich = [int(nsites) for nsites in stoich]
+
+    # cache files are only for the default wyckoff data
+    if wy_data is not WYCKOFF_DATA:
+        cache_directory = None
+
+    # load whatever has been found already
+    if cache_directory:
+        filename = os.path.join(
+            cache_directory, "_".join(str(n) for n in stoich) + ".json.gz"
+        )
+        cached_combos = _readWyckoffCache(filename)
+    else:
+        cached_combos = {}
+
+    # find the combinations that are missing. This is the slow part, so we
+    # split the spacegroups across a pool of processes.
+    spacegroups_missing = [sg for sg in spacegroups if sg not in cached_combos]
+    if spacegroups_missing:
+        message = "Generating Wyckoff combinations for every spacegroup: "
+        if nprocs == 1 or len(spacegroups_missing) == 1:
+            new_combos = [
+                _findEncodedWyckoffCombos(stoich, sg, wy_data)
+                for sg in tqdm(spacegroups_missing, desc=message)
+            ]
+        else:
+            # The default wyckoff data is already loaded in each process, so we
+            # only send wy_data when it's different.
+            inputs = [[stoich] * len(spacegroups_missing), spacegroups_missing]
+            if wy_data is not WYCKOFF_DATA:
+                inputs.append([wy_data] * len(spacegroups_missing))
+            with ProcessPoolExecutor(max_workers=nprocs) as executor:
+                new_combos = list(
+                    tqdm(
+                        executor.map(_findEncodedWyckoffCombos, *inputs),
+                        total=len(spacegroups_missing),
+                        desc=message,
+                    )
+                )
+        new_combos = dict(zip(spacegroups_missing, new_combos))
+        cached_combos.update(new_combos)
+        if cache_directory:
+            _writeWyckoffCache(filename, new_combos)
+
+    # convert the group indicies back to the (multiplicity, availability) keys
+    # that findValidWyckoffCombos uses
+    results = {}
+    for spacegroup in spacegroups:
+        wy_groups = getWyckoffGroups(spacegroup, wy_data)
+        group_keys = list(wy_groups.keys())
+        valid_combos = [
+            tuple(
+                tuple(group_keys[i] for i in element_combo) for element_combo in combo
+            )
+            for combo in cached_combos[spacegroup]
+        ]
+        results[spacegroup] = {
+            "WyckoffGroups": wy_groups,
+            "ValidCombinations": valid_combos,
+        }
+    return results
+
+
 def findValidWyckoffCombosForListofSpacegroups(
-    stoich, sg_include=range(1, 231), sg_exclude=[]
+    stoich,
+    sg_include=range(1, 231),
+    sg_exclude=[],
+    cache_directory=WYCKOFF_CACHE_DIRECTORY,
 ):
 
     """
     Find all wyckoff group combinations for specified list of spacegroups.
-    This function calls the findValidWyckoffCombos function repeatedly, so
-    really this is just a convience function.
+    This is just a convience function for loadValidWyckoffCombos, which gives
+    the same results (and uses the same cache).
 
     stoich = list of nsites for each element
         (i.e. Mg4Si4O12 has stoich = [4,4,12])
     sg_include = list of spacegroups that we are interested in.
         (default is all 230 spacegroups)
     sg_exclude = list of spacegroups that we should explicitly ignore
+    cache_directory = where combinations are cached (None turns this off)
     """
 
     # Combine the inputs into a list of spacegroups we need to investigate
     sg_to_search = [sg for sg in sg_include if sg not in sg_exclude]
+    return loadValidWyckoffCombos(stoich, sg_to_search, cache_directory=cache_directory)
+
+
+def _findEncodedWyckoffCombos(stoich, spacegroup, wy_data=WYCKOFF_DATA):
+
+    # Runs findValidWyckoffCombos and converts each wyckoff group in the
+    # results to its index. This is both what we store in the cache and what
+    # we send back from worker processes (which is much smaller than pickling
+    # the full results).
+
+    combo_data = findValidWyckoffCombos(stoich, spacegroup, wy_data)
+    group_indices = {
+        wy_group: i for i, wy_group in enumerate(combo_data["WyckoffGroups"].keys())
+    }
+    return [
+        [
+            [group_indices[wy_group] for wy_group in element_combo]
+            for element_combo in combo
+        ]
+        for combo in combo_data["ValidCombinations"]
+    ]
+
+
+def _readWyckoffCache(filename):
+
+    # Returns the cached {spacegroup: encoded_combos}. Missing, outdated, or
+    # corrupt files (or those made from other wyckoff data) are treated as
+    # empty.
+
+    try:
+        with gzip.open(filename, "rt") as file:
+            data = json.load(file)
+    except (OSError, EOFError, ValueError):
+        return {}
+    if (
+        data.get("version") != WYCKOFF_CACHE_VERSION
+        or data.get("data_hash") != WYCKOFF_DATA_HASH
+    ):
+        return {}
+    return {int(sg): combos for sg, combos in data["spacegroups"].items()}
+
+
+def _writeWyckoffCache(filename, new_combos):
+
+    # Adds combos to the cache file. Another process may have added other
+    # spacegroups since we read the file, so we read it again right before
+    # writing. The file is written to a temporary file first and then moved
+    # into place, so that readers never see a partially written file.
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    all_combos = _readWyckoffCache(filename)
+    all_combos.update(new_combos)
+    data = {
+        "version": WYCKOFF_CACHE_VERSION,
+        "data_hash": WYCKOFF_DATA_HASH,
+        "spacegroups": {str(sg): combos for sg, combos in sorted(all_combos.items())},
+    }
+
+    file_descriptor, temp_filename = tempfile.mkstemp(
+        dir=os.path.dirname(filename), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as raw_file:
+            with gzip.open(raw_file, "wt") as file:
+                json.dump(data, file, separators=(",", ":"))
+        os.replace(temp_filename, filename)
+    except OSError:
+        # the cache is only for speed, so we don't fail if it can't be written
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
 
-    # We save the outputs as a dictionary where the spacegroup (integer) is
-    # the key to combo results.
-    #!!! Consider changing this to a list where index=spacegroup-1
-    combos_by_sg = {}
-    for spacegroup in sg_to_search:
-        combos = findValidWyckoffCombos(stoich, spacegroup)
-        combos_by_sg.update({spacegroup: combos})
 
-    return combos_by_sg
+##############################################################################
+
+
+def loadWyckoffAffineData(wy_data=loadWyckoffData()):
+
+    """
+    Every wyckoff site's coordinates (such as "x,x+1/2,0") are an affine function
+    of (x,y,z). This function converts the "Coordinates" column into a matrix and
+    translation for each site so that its coordinates can be found with
+    numpy (matrix @ [x,y,z] + translation) rather than eval().
+
+    The output is a tuple of (matrices, translations) with shapes (N,3,3) and
+    (N,3), where N is the number of rows in wy_data (and in the same order).
+    """
+
+    # many sites share the same coordinates, so we only convert each once
+    affine_data = {
+        coordinates: _getAffineFromCoordinates(coordinates)
+        for coordinates in wy_data["Coordinates"].unique()
+    }
+    matrices = numpy.array(
+        [affine_data[coordinates][0] for coordinates in wy_data["Coordinates"]]
+    )
+    translations = numpy.array(
+        [affine_data[coordinates][1] for coordinates in wy_data["Coordinates"]]
+    )
+    return matrices, translations
+
+
+def _getAffineFromCoordinates(coordinates):
+
+    # Because the coordinates are affine, the translation is what we get at
+    # (0,0,0) and each column of the matrix is the change when x, y, or z is 1.
+    code = compile(coordinates, "<wyckoff>", "eval")
+    translation = numpy.array(eval(code, {}, dict(x=0, y=0, z=0)), dtype=float)
+    matrix = numpy.array(
+        [
+            numpy.array(eval(code, {}, dict(zip("xyz", unit_vector))), dtype=float)
+            - translation
+            for unit_vector in numpy.identity(3)
+        ]
+    ).T
+    return matrix, translation
 
 
 ##############################################################################
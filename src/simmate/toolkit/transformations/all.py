@@ -128,8 +128,9 @@ class LatticeStrain(Transformation):
 
     def apply_transformation(self, structure, max_attempts=100):
 
-        # first we need 6 strain matrix components
-        components = self.component_generator.new_vector(size=6)
+        # first we need 6 strain matrix components, which we take from two
+        # random vectors
+        components = self.component_generator.new_vectors(2).flatten()
 
         # next we need to assemble the strain matrix using these components
         #!!! is there a better way to do this? I'm just using equation (3) in the USPEX paper
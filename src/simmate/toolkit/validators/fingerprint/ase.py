@@ -9,9 +9,7 @@ from matminer.featurizers.structure import SiteStatsFingerprint as ssf
 from matminer.featurizers.structure import RadialDistributionFunction as rdf
 from matminer.featurizers.structure import PartialRadialDistributionFunction as prdf
 
-from pymatdisc.core.featurizers.fingerprint import PartialsSiteStatsFingerprint
-
-from scipy.spatial.distance import cosine
+from simmate.toolkit.validators.fingerprint.index import FingerprintIndex
 
 
 class ASEFingerprint:
@@ -52,8 +50,9 @@ class ASEFingerprint:
 
         self.adaptor = AseAtomsAdaptor
 
-        # generate the fingerprint for each of the initial input structures
-        self.fingerprint_database = []
+        # generate the fingerprint for each of the initial input structures.
+        # We compare these with the cosine distance, so we tell the index that.
+        self.fingerprint_database = FingerprintIndex(metric="cosine")
         for structure in initial_structures:
             # convert the structure to ase Atoms object
             structure_ase = self.adaptor.get_atoms(structure)
@@ -71,9 +70,7 @@ class ASEFingerprint:
             fingerprint = np.hstack(fingerprints)
 
             # add to the database
-            self.fingerprint_database.append(fingerprint)
-        # now make the datebase into a numpy array for speed
-        self.fingerprint_database = np.array(self.fingerprint_database)
+            self.fingerprint_database.add(fingerprint)
 
     def check_structure(self, structure, tolerance=5e-3):
 
@@ -94,26 +91,14 @@ class ASEFingerprint:
 
         # we now want to get the distance of this fingerprint relative to all others
         # if the distance is within the specified tolerance, then the structures are too similar - we return false
-        # if we make it through all structures and no distance is below the tolerance, we are good to go!
-        for fingerprint2 in self.fingerprint_database:
-            # we want the cosine distance
-            # https://docs.scipy.org/doc/scipy/reference/generated/scipy.spatial.distance.cosine.html
-            # I use the numpy version of this for speed
-            distance = cosine(fingerprint1, fingerprint2)
-            if distance < tolerance:
-                # we can end the whole function as soon as one structure is deemed too similar
-                return False
-            else:
-                continue
-
-        # if we finished the loop above, we can add this structure to the database and return a success
-        # this method I use to append is pretty slow for numpy. Is there a better way to do this?
-        if self.fingerprint_database.size == 0:
-            self.fingerprint_database = np.array([fingerprint1])
-        else:
-            self.fingerprint_database = np.append(
-                self.fingerprint_database, [fingerprint1], axis=0
-            )
+        # we want the cosine distance (same as scipy.spatial.distance.cosine)
+        # https://docs.scipy.org/doc/scipy/reference/generated/scipy.spatial.distance.cosine.html
+        if self.fingerprint_database.any_within(fingerprint1, tolerance):
+            return False
+
+        # if no distance is below the tolerance, we can add this structure to
+        # the database and return a success
+        self.fingerprint_database.add(fingerprint1)
 
         return True
 
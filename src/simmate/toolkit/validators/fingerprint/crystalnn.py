@@ -9,6 +9,8 @@ from matminer.featurizers.structure import SiteStatsFingerprint as ssf
 from matminer.featurizers.structure import RadialDistributionFunction as rdf
 from matminer.featurizers.structure import PartialRadialDistributionFunction as prdf
 
+from simmate.toolkit.validators.fingerprint.index import FingerprintIndex
+
 
 class CrystalNNFingerprint:
 
@@ -52,18 +54,16 @@ class CrystalNNFingerprint:
         # so we check that first and decide which is quickest
         # sometimes the script will stall/fail when trying parallel (like when in Spyder) so the option to turn of parallel is also there
         if len(initial_structures) <= 15 and not parallel:
-            # do this serially and make into a numpy array for speed
-            self.fingerprint_database = np.array(
-                [
-                    self.featurizer.featurize(structure)
-                    for structure in initial_structures
-                ]
-            )
+            # do this serially
+            fingerprints = [
+                self.featurizer.featurize(structure) for structure in initial_structures
+            ]
         else:
-            # use matminer's parallel functionality and make into a numpy array for speed
-            self.fingerprint_database = self.featurizer.featurize_many(
+            # use matminer's parallel functionality
+            fingerprints = self.featurizer.featurize_many(
                 initial_structures, pbar=False
             )
+        self.fingerprint_database = FingerprintIndex(fingerprints)
 
     def check_structure(self, structure, tolerance=1e-4):
 
@@ -72,22 +72,11 @@ class CrystalNNFingerprint:
 
         # we now want to get the distance of this fingerprint relative to all others
         # if the distance is within the specified tolerance, then the structures are too similar - we return false
-        # if we make it through all structures and no distance is below the tolerance, we are good to go!
-        for fingerprint2 in self.fingerprint_database:
-            distance = np.linalg.norm(fingerprint1 - fingerprint2)
-            if distance < tolerance:
-                # we can end the whole function as soon as one structure is deemed too similar
-                return False
-            else:
-                continue
-
-        # if we finished the loop above, we can add this structure to the database and return a success
-        # this method I use to append is pretty slow for numpy. Is there a better way to do this?
-        if self.fingerprint_database.size == 0:
-            self.fingerprint_database = np.array([fingerprint1])
-        else:
-            self.fingerprint_database = np.append(
-                self.fingerprint_database, [fingerprint1], axis=0
-            )
+        if self.fingerprint_database.any_within(fingerprint1, tolerance):
+            return False
+
+        # if no distance is below the tolerance, we can add this structure to
+        # the database and return a success
+        self.fingerprint_database.add(fingerprint1)
 
         return True
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+
+
+class FingerprintIndex:
+    """
+    Stores a growing list of fingerprints and quickly answers whether a new
+    fingerprint is within some distance of any stored one. This is what our
+    fingerprint validators use to decide if a structure is unique.
+
+    Fingerprints are kept in a single preallocated 2D array that doubles in size
+    when it fills up, so adding a fingerprint doesn't copy all of the others
+    (which numpy.append does). Distances to every stored fingerprint are then
+    calculated with a single matrix-vector product, using the fact that
+    |a - b|^2 = |a|^2 + |b|^2 - 2 a.b and that |b|^2 is saved for each row.
+
+    Both euclidean and cosine distances are supported. For cosine distances,
+    fingerprints are stored as unit vectors, where the cosine distance is
+    then just half the squared euclidean distance.
+
+    Note, we don't use a KD-tree here because fingerprints typically have
+    hundreds of features, where trees are no faster than checking every row.
+    """
+
+    # how many fingerprints to compare at a time. Searches stop after the
+    # first chunk that has a match, so duplicates are found without checking
+    # the full index.
+    chunk_size = 8192
+
+    def __init__(
+        self,
+        fingerprints: numpy.ndarray = None,
+        metric: str = "euclidean",
+        capacity: int = 64,
+    ):
+        if metric not in ["euclidean", "cosine"]:
+            raise Exception(
+                f"Unknown metric '{metric}'. Options are 'euclidean' and 'cosine'."
+            )
+        self.metric = metric
+        self.capacity = capacity
+        self.nfingerprints = 0
+        # these are created once we know the length of the fingerprints
+        self._fingerprints = None
+        self._norms_squared = None
+
+        if fingerprints is not None and len(fingerprints):
+            self.add_many(fingerprints)
+
+    def __len__(self):
+        return self.nfingerprints
+
+    @property
+    def fingerprints(self) -> numpy.ndarray:
+        """
+        A 2D array of all fingerprints added so far. For the cosine metric,
+        these are the normalized fingerprints. This is a view of the index's
+        storage and should not be modified.
+        """
+        if self._fingerprints is None:
+            return numpy.empty((0, 0))
+        return self._fingerprints[: self.nfingerprints]
+
+    def add(self, fingerprint: numpy.ndarray):
+        """
+        Adds a single fingerprint to the index.
+        """
+        self.add_many([fingerprint])
+
+    def add_many(self, fingerprints: numpy.ndarray):
+        """
+        Adds a list or 2D array of fingerprints to the index.
+        """
+        fingerprints = self._prepare(fingerprints)
+        nnew = len(fingerprints)
+        if not nnew:
+            return
+
+        self._reserve(self.nfingerprints + nnew, fingerprints.shape[1])
+
+        start, end = self.nfingerprints, self.nfingerprints + nnew
+        self._fingerprints[start:end] = fingerprints
+        self._norms_squared[start:end] = numpy.einsum(
+            "ij,ij->i", fingerprints, fingerprints
+        )
+        self.nfingerprints = end
+
+    def any_within(self, fingerprint: numpy.ndarray, tolerance: float) -> bool:
+        """
+        Returns True if any fingerprint in the index is closer than the
+        tolerance to the one given.
+        """
+        if not self.nfingerprints:
+            return False
+
+        fingerprint = self._prepare([fingerprint])[0]
+        if len(fingerprint) != self._fingerprints.shape[1]:
+            raise Exception(
+                f"This fingerprint has {len(fingerprint)} features but the "
+                f"index has fingerprints of {self._fingerprints.shape[1]}."
+            )
+
+        # convert the tolerance to a squared euclidean distance
+        if self.metric == "cosine":
+            cutoff = 2 * tolerance
+        else:
+            cutoff = tolerance**2
+        # The expanded form of the distance loses some precision, so we use a
+        # slightly larger cutoff and then check any hits with exact distances.
+        norm_squared = fingerprint @ fingerprint
+        slack = 1e-8 * (1 + norm_squared)
+
+        for start in range(0, self.nfingerprints, self.chunk_size):
+            end = min(start + self.chunk_size, self.nfingerprints)
+            distances = (
+                self._norms_squared[start:end]
+                + norm_squared
+                - 2 * (self._fingerprints[start:end] @ fingerprint)
+            )
+            hits = numpy.flatnonzero(distances < cutoff + slack)
+            if hits.size:
+                differences = self._fingerprints[start + hits] - fingerprint
+                exact = numpy.einsum("ij,ij->i", differences, differences)
+                if (exact < cutoff).any():
+                    return True
+
+        return False
+
+    def _prepare(self, fingerprints) -> numpy.ndarray:
+        fingerprints = numpy.array(fingerprints, dtype=numpy.float64, ndmin=2)
+        if self.metric == "cosine":
+            norms = numpy.linalg.norm(fingerprints, axis=1, keepdims=True)
+            # empty fingerprints are left as they are
+            norms[norms == 0] = 1
+            fingerprints = fingerprints / norms
+        return fingerprints
+
+    def _reserve(self, nrows: int, nfeatures: int):
+
+        if self._fingerprints is None:
+            self.capacity = max(self.capacity, nrows)
+            self._fingerprints = numpy.empty((self.capacity, nfeatures))
+            self._norms_squared = numpy.empty(self.capacity)
+            return
+
+        if nfeatures != self._fingerprints.shape[1]:
+            raise Exception(
+                f"These fingerprints have {nfeatures} features but the "
+                f"index has fingerprints of {self._fingerprints.shape[1]}."
+            )
+
+        if nrows <= self.capacity:
+            return
+
+        # double the size of our arrays (or more if needed) so that the cost
+        # of copying is spread out over many additions
+        self.capacity = max(2 * self.capacity, nrows)
+        fingerprints = numpy.empty((self.capacity, nfeatures))
+        fingerprints[: self.nfingerprints] = self.fingerprints
+        norms_squared = numpy.empty(self.capacity)
+        norms_squared[: self.nfingerprints] = self._norms_squared[: self.nfingerprints]
+        self._fingerprints = fingerprints
+        self._norms_squared = norms_squared
@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import json
+
 import numpy
-from tqdm import tqdm
 
 from django.utils import timezone
 
 from matminer.featurizers.site import CrystalNNFingerprint
 
 from simmate.toolkit.featurizers.fingerprint import PartialsSiteStatsFingerprint
+from simmate.toolkit.validators.fingerprint.index import FingerprintIndex
 
 # TODO: what if we want to add to the structure_pool list later on? Should this
 # be integrated with the Simmate database tables? An example use-case is with
@@ -55,19 +58,26 @@ class PartialCrystalNNFingerprint:
             [element.symbol for element in composition.elements]
         )
 
+        # Fingerprints saved to the database are only reused when they were
+        # made with the exact same settings, so we make a hash of them all.
+        settings = dict(
+            elements=list(self.featurizer.elements_),
+            stat_options=list(stat_options),
+            crystalnn_options=crystalnn_options or "ops_preset_x_diff_weight_3",
+        )
+        self.featurizer_hash = hashlib.sha256(
+            json.dumps(settings, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
         # check if we were given a list of pymatgen structures.
         if isinstance(structure_pool, list):
             # set this variable as none to help with some warnings methods such
             # as the update_fingerprint_database
             self.structure_pool_queryset = "local_only"
-            # If so, we generate the fingerprint for each of the initial input structures
-            # We convert this to a numpy array for speed improvement at later stages
-            # OPTIMIZE: this can be slow and I should support parallel featurization
-            self.fingerprint_database = numpy.array(
-                [
-                    self.featurizer.featurize(structure)
-                    for structure in tqdm(structure_pool)
-                ]
+            # If so, we generate the fingerprint for each of the initial input
+            # structures, which is split across all of our cores.
+            self.fingerprint_database = FingerprintIndex(
+                self.featurizer.featurize_structures(structure_pool)
             )
 
         # otherwise we have a queryset that should be used to populate the
@@ -76,7 +86,7 @@ class PartialCrystalNNFingerprint:
             # we store the queryset as an attribute because we may want to
             # update the structure pool later on.
             self.structure_pool_queryset = structure_pool
-            self.fingerprint_database = numpy.array([])
+            self.fingerprint_database = FingerprintIndex()
             # we also keep a log of the last update so we only grab new structures
             # each time we update the database. To start, we set this as the
             # eariest possible date, which tells our update_fingerprint_database
@@ -94,18 +104,18 @@ class PartialCrystalNNFingerprint:
         # make the fingerprint for this structure and make into a numpy array for speed
         fingerprint1 = numpy.array(self.featurizer.featurize(structure))
 
+        return self.check_fingerprint(fingerprint1, tolerance)
+
+    def check_fingerprint(self, fingerprint1, tolerance=0.001):
+        # This is the same as check_structure, but for a fingerprint that was
+        # already made (e.g. in another process) with this validator's featurizer.
+
         # We now want to get the distance of this fingerprint relative to all others.
         # If the distance is within the specified tolerance, then the structures
         # are too similar - and we return  for a failure.
-        for fingerprint2 in self.fingerprint_database:
-            distance = numpy.linalg.norm(fingerprint1 - fingerprint2)
-            if distance < tolerance:
-                # we can end the whole function as soon as one structure is deemed too similar
-                return False
-            else:
-                continue
-        # If we make it through all structures and no distance is below the
-        # tolerance, we have a new and unique structure!
+        if self.fingerprint_database.any_within(fingerprint1, tolerance):
+            return False
+        # If no distance is below the tolerance, we have a new and unique structure!
 
         # add this new structure to the database if it was requested.
         if self.add_unique_to_pool:
@@ -129,13 +139,43 @@ class PartialCrystalNNFingerprint:
         last_update_safe = self.last_update
         self.last_update = timezone.now()
 
-        # now grab all the new structures!
-        new_structures = (
-            self.structure_pool_queryset.filter(created_at__gte=last_update_safe)
-            .only("structure_string")
-            .to_pymatgen()
+        # We import this here because the database is only needed when the
+        # structure pool is a queryset.
+        from simmate.toolkit.structure_prediction.evolution.database import (
+            Fingerprint,
         )
 
+        new_queryset = self.structure_pool_queryset.filter(
+            created_at__gte=last_update_safe
+        )
+
+        # Many of these structures may have had their fingerprint calculated
+        # before (e.g. by a previous run of this search), so we only grab the
+        # structures that still need one. We run this query before loading saved
+        # fingerprints so that one saved in the meantime is never missed.
+        database_table = self.structure_pool_queryset.model._meta.label
+        fingerprints_saved = Fingerprint.objects.filter(
+            database_table=database_table,
+            featurizer_hash=self.featurizer_hash,
+        )
+        saved_ids = fingerprints_saved.values("database_id")
+        new_structures = list(
+            new_queryset.exclude(id__in=saved_ids).only("id", "structure_string")
+        )
+
+        # now load all of the saved fingerprints at once
+        fingerprints_found = list(
+            fingerprints_saved.filter(
+                database_id__in=new_queryset.values("id")
+            ).values_list("fingerprint", flat=True)
+        )
+        if fingerprints_found:
+            self.fingerprint_database.add_many(
+                numpy.frombuffer(
+                    b"".join(bytes(fingerprint) for fingerprint in fingerprints_found)
+                ).reshape(len(fingerprints_found), -1)
+            )
+
         # If there aren't any new structures, just exit without printing the
         # message and tqdm progress bar below
         if not new_structures:
@@ -145,15 +185,28 @@ class PartialCrystalNNFingerprint:
             f"Found {len(new_structures)} new structures for the fingerprint database."
         )
 
-        # calculate each fingerprint and add it to the database
-        for structure in tqdm(new_structures):
-            fingerprint = numpy.array(self.featurizer.featurize(structure))
-            self._add_fingerprint_to_database(fingerprint)
+        # calculate each fingerprint (split across all of our cores) and add
+        # them all to the database
+        fingerprints = self.featurizer.featurize_structures(
+            [structure.to_pymatgen() for structure in new_structures]
+        )
+        self.fingerprint_database.add_many(fingerprints)
+
+        # and save them so that we don't need to calculate them again. Another
+        # process may have saved some of these in the meantime, so we ignore
+        # any that are already there.
+        Fingerprint.objects.bulk_create(
+            [
+                Fingerprint(
+                    database_table=database_table,
+                    database_id=structure.id,
+                    featurizer_hash=self.featurizer_hash,
+                    fingerprint=fingerprint.tobytes(),
+                )
+                for structure, fingerprint in zip(new_structures, fingerprints)
+            ],
+            ignore_conflicts=True,
+        )
 
     def _add_fingerprint_to_database(self, fingerprint):
-        if self.fingerprint_database.size == 0:
-            self.fingerprint_database = numpy.array([fingerprint])
-        else:
-            self.fingerprint_database = numpy.append(
-                self.fingerprint_database, [fingerprint], axis=0
-            )
+        self.fingerprint_database.add(fingerprint)
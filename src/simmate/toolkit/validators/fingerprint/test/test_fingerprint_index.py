@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+
+from simmate.toolkit.validators.fingerprint.index import FingerprintIndex
+
+
+def _any_within_brute_force(fingerprints, fingerprint, tolerance, metric):
+    fingerprints = numpy.array(fingerprints, dtype=numpy.float64)
+    fingerprint = numpy.array(fingerprint, dtype=numpy.float64)
+    if metric == "cosine":
+        norms = numpy.linalg.norm(fingerprints, axis=1) * numpy.linalg.norm(fingerprint)
+        distances = 1 - fingerprints @ fingerprint / norms
+    else:
+        distances = numpy.linalg.norm(fingerprints - fingerprint, axis=1)
+    return bool((distances < tolerance).any())
+
+
+@pytest.mark.parametrize("metric", ["euclidean", "cosine"])
+def test_fingerprint_index_matches_brute_force(metric):
+
+    rng = numpy.random.default_rng(0)
+    fingerprints = rng.random((300, 20))
+    index = FingerprintIndex(fingerprints[:50], metric=metric, capacity=4)
+
+    # adding one at a time and many at once should both grow the index
+    for fingerprint in fingerprints[50:60]:
+        index.add(fingerprint)
+    index.add_many(fingerprints[60:])
+    assert len(index) == 300
+    assert index.capacity >= 300
+    assert index.fingerprints.shape == (300, 20)
+
+    # small chunks make sure that searches across chunks work too
+    index.chunk_size = 64
+    for tolerance in [1e-4, 0.05, 0.5]:
+        for fingerprint in rng.random((25, 20)):
+            assert index.any_within(fingerprint, tolerance) == (
+                _any_within_brute_force(fingerprints, fingerprint, tolerance, metric)
+            )
+
+    # a fingerprint that is already in the index is always found
+    assert index.any_within(fingerprints[123], 1e-8)
+
+
+def test_fingerprint_index_edge_cases():
+
+    # an empty index never has a match
+    index = FingerprintIndex()
+    assert len(index) == 0
+    assert index.fingerprints.shape == (0, 0)
+    assert not index.any_within([1, 2, 3], 1e9)
+
+    # fingerprints must all be the same length
+    index.add([1, 2, 3])
+    with pytest.raises(Exception):
+        index.add([1, 2])
+    with pytest.raises(Exception):
+        index.any_within([1, 2], 0.1)
+
+    # cosine distances ignore the length of the fingerprint
+    index = FingerprintIndex([[1, 0], [0, 0]], metric="cosine")
+    assert index.any_within([5, 0], 1e-6)
+    assert not index.any_within([1, 1], 0.1)
+
+    with pytest.raises(Exception):
+        FingerprintIndex(metric="manhattan")
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+from pymatgen.core import Composition, Lattice, Structure
+
+pytest.importorskip("matminer")
+
+from simmate.database.base_data_types import Spacegroup
+from simmate.database.local_calculations.energy import MITStaticEnergy
+from simmate.toolkit.featurizers.fingerprint import PartialsSiteStatsFingerprint
+from simmate.toolkit.structure_prediction.evolution.database import Fingerprint
+from simmate.toolkit.validators.fingerprint.pcrystalnn import (
+    PartialCrystalNNFingerprint,
+)
+
+
+@pytest.fixture
+def structure_pool(transactional_db):
+    Spacegroup.load_database_from_pymatgen()
+    MITStaticEnergy.bulk_save(
+        [
+            dict(
+                structure=Structure(
+                    Lattice.cubic(3 + 0.5 * i),
+                    ["Na", "Cl"],
+                    [[0, 0, 0], [0.5, 0.5, 0.5]],
+                ),
+                energy=-1.0 * i,
+                prefect_flow_run_id=str(i),
+            )
+            for i in range(3)
+        ],
+        nprocs=1,
+        progressbar=False,
+    )
+    return MITStaticEnergy.objects.all()
+
+
+def test_saved_fingerprints(structure_pool, monkeypatch):
+
+    composition = Composition("NaCl")
+
+    # the first validator featurizes every structure and saves the results
+    validator = PartialCrystalNNFingerprint(composition, structure_pool=structure_pool)
+    assert len(validator.fingerprint_database) == 3
+    fingerprints_saved = Fingerprint.objects.filter(
+        database_table="local_calculations.MITStaticEnergy",
+        featurizer_hash=validator.featurizer_hash,
+    )
+    assert fingerprints_saved.count() == 3
+
+    # a validator with the same settings loads them instead of featurizing
+    def fail(*args, **kwargs):
+        raise Exception("Fingerprints should have been loaded from the database")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(PartialsSiteStatsFingerprint, "featurize_structures", fail)
+        validator_reloaded = PartialCrystalNNFingerprint(
+            composition, structure_pool=structure_pool
+        )
+    assert validator_reloaded.featurizer_hash == validator.featurizer_hash
+    numpy.testing.assert_allclose(
+        numpy.sort(validator_reloaded.fingerprint_database.fingerprints, axis=0),
+        numpy.sort(validator.fingerprint_database.fingerprints, axis=0),
+    )
+
+    # different settings give a different hash, so fingerprints are remade
+    validator_other = PartialCrystalNNFingerprint(
+        composition,
+        stat_options=["mean", "std_dev"],
+        structure_pool=structure_pool,
+    )
+    assert validator_other.featurizer_hash != validator.featurizer_hash
+    assert len(validator_other.fingerprint_database) == 3
+    assert Fingerprint.objects.count() == 6
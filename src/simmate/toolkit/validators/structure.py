@@ -3,7 +3,6 @@
 ##############################################################################
 
 import numpy
-import itertools
 
 from simmate.toolkit.validators.base import Validator
 
@@ -70,42 +69,96 @@ class SiteDistanceMatrix(Validator):
                 max_sites=-1
             )
 
+        # Because we only check by element (see the bug note above), we condense
+        # the matrix to one row/column per element. Any specie's cutoff being
+        # broken fails the check, so the largest cutoff is the one that matters.
+        self._elements = []
+        for specie in self.composition:
+            if specie.symbol not in self._elements:
+                self._elements.append(specie.symbol)
+        specie_elements = [
+            self._elements.index(specie.symbol) for specie in self.composition
+        ]
+        nelements = len(self._elements)
+        self._element_cutoffs = numpy.zeros((nelements, nelements))
+        for i1, e1 in enumerate(specie_elements):
+            for i2, e2 in enumerate(specie_elements):
+                self._element_cutoffs[e1, e2] = max(
+                    self._element_cutoffs[e1, e2],
+                    self.element_distance_matrix[i1][i2],
+                )
+
+    # Structures with more sites than this are checked using a neighbor list
+    # rather than a full distance matrix. See _check_with_neighbor_list.
+    nsites_neighbor_list = 100
+
     def check_structure(self, structure):
-        # now using the matrix above, we need to look at the structure
-        # and determine if there are any distances that are below matrix limits
-        # to save time, we want to iterate through each site and see that the site meets all requirements
-        # as soon as any requirement is failed for any site, the whole loop ends
-        #!!! This function is slow.
-        # Maybe instead of making all comparisons, we can only look at nearest neighbors
-
-        # we get a massive speedup if we make this matrix upfront
-        # for extremely large structures with many sites, this might not be the case though - I still need to test for that
-        dm = structure.distance_matrix
+        # Using the matrix above, we look at every pair of sites in the structure
+        # and determine if there are any distances that are below the matrix limits.
+        # NOTE: we use the nearest image distance between sites, which might
+        # not be in an adjacent cell!
+
+        # give each site the index of its element in our cutoff matrix. Sites
+        # of elements that aren't in our composition are ignored.
+        site_elements = numpy.array(
+            [
+                self._elements.index(site.specie.symbol)
+                if site.specie.symbol in self._elements
+                else -1
+                for site in structure
+            ],
+            dtype=int,
+        )
+
+        if len(structure) > self.nsites_neighbor_list:
+            return self._check_with_neighbor_list(structure, site_elements)
+
+        # For small structures, it's fastest to compare the full distance matrix
+        # to a matrix of the cutoff for each pair of sites all at once.
+        cutoffs = self._element_cutoffs[site_elements][:, site_elements]
+        ignored = site_elements < 0
+        cutoffs[ignored, :] = 0
+        cutoffs[:, ignored] = 0
+        # we skip comparing a site to itself
+        numpy.fill_diagonal(cutoffs, 0)
+
+        return not (structure.distance_matrix < cutoffs).any()
+
+    def _check_with_neighbor_list(self, structure, site_elements, chunk_size=64):
+        # For large structures, the full distance matrix is expensive and most
+        # pairs are far apart. We instead use pymatgen's cell-list neighbor search
+        # to find only the pairs within our largest cutoff. Sites are checked in
+        # chunks so that we can stop as soon as one distance is too short.
+        max_cutoff = self._element_cutoffs.max()
+        if max_cutoff <= 0:
+            return True
+
+        for start in range(0, len(structure), chunk_size):
+            sites = structure.sites[start : start + chunk_size]
+            # By default, pymatgen drops pairs at zero distance as self-pairs,
+            # which can let duplicate sites pass (it compares indices within
+            # our chunk to those of the structure). We keep them and instead
+            # remove self-pairs by index below.
+            centers, neighbors, _, distances = structure.get_neighbor_list(
+                r=max_cutoff,
+                sites=sites,
+                exclude_self=False,
+            )
+            centers = centers + start
+            # we skip comparing a site to itself (including its periodic images)
+            # and any sites of elements not in our composition
+            keep = (
+                (centers != neighbors)
+                & (site_elements[centers] >= 0)
+                & (site_elements[neighbors] >= 0)
+            )
+            cutoffs = self._element_cutoffs[
+                site_elements[centers[keep]], site_elements[neighbors[keep]]
+            ]
+            if (distances[keep] < cutoffs).any():
+                # one False is enough to stop
+                return False
 
-        # go through each element-element combo and check distances
-        for i1, element1 in enumerate(self.composition):
-            element1_indicies = structure.indices_from_symbol(element1.symbol)
-            for i2, element2 in enumerate(self.composition):
-                # grab the cutoff distance for these two specie/element types
-                dist_cutoff = self.element_distance_matrix[i1][i2]
-                element2_indicies = structure.indices_from_symbol(element2.symbol)
-                combos = itertools.product(element1_indicies, element2_indicies)
-                for s1, s2 in combos:
-                    # skip if we are looking at the same site
-                    if s1 == s2:
-                        continue
-                    # grab the periodic sites
-                    # NOTE: sites here are PeriodicSite objects, not Site objects
-                    # This is extremely important because we want nearest image distance, which might not be in an adjacent cell!
-                    # site1 = structure[s1]
-                    # site2 = structure[s2]
-                    # Now get the distance between the two periodic sites
-                    # distance = site1.distance(site2)
-                    distance = dm[s1][s2]
-                    # compare the distance to the cutoff matrix
-                    if distance < dist_cutoff:
-                        # one False is enough to stop - end the whole function
-                        return False
         # the function will only reach this point if all distance criteria are met
         return True
 
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from pymatgen.core import Composition, Lattice, Structure
+
+from simmate.toolkit.validators.structure import SiteDistanceMatrix
+
+
+@pytest.mark.parametrize(
+    "overlap, expected",
+    [(None, True), ("duplicate", False), ("close", False)],
+)
+def test_site_distance_matrix(overlap, expected):
+
+    # a rock salt NaCl supercell, where sites are well separated. This has
+    # 2 * 5**3 = 250 sites, which is over the limit for the neighbor list.
+    structure = Structure(
+        Lattice.cubic(5.6),
+        ["Na", "Cl"],
+        [[0, 0, 0], [0.5, 0.5, 0.5]],
+    )
+    structure.make_supercell([5, 5, 5])
+    if overlap == "duplicate":
+        structure.append("Na", structure[10].frac_coords)
+    elif overlap == "close":
+        structure.append("Na", structure[10].frac_coords + 0.005)
+
+    validator = SiteDistanceMatrix(
+        composition=Composition("NaCl"),
+        radius_method="atomic",
+    )
+    assert len(structure) > validator.nsites_neighbor_list
+    with_neighbor_list = validator.check_structure(structure)
+
+    # raising the limit makes us use the full distance matrix instead
+    validator.nsites_neighbor_list = len(structure)
+    with_matrix = validator.check_structure(structure)
+
+    assert with_neighbor_list == with_matrix == expected
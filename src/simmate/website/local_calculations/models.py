@@ -28,4 +28,5 @@ from simmate.database.local_calculations.relaxation import (
 from simmate.database.local_calculations.evolution import (
     EvolutionarySearch,
     StructureSource,
+    Fingerprint,
 )
@@ -2,7 +2,12 @@
 
 from abc import ABC, abstractmethod
 
+import codecs
+import contextvars
 import os
+import re
+import threading
+from contextlib import contextmanager
 
 
 class ErrorHandler(ABC):
@@ -74,22 +79,16 @@ class ErrorHandler(ABC):
         # establish the full path to the output file
         filename = os.path.join(directory, self.filename_to_check)
 
-        # check to see that the file is there first
-        if os.path.exists(filename):
-
-            # read the file content and then close it
-            with open(filename) as file:
-                file_text = file.read()
-            # Check if each error is present
-            for message in self.possible_error_messages:
-                # if the error is NOT present, find() returns a -1
-                if file_text.find(message) != -1:
-                    # If one of the messages is found, we immediately return that
-                    # the error has been found.
-                    return True
-        # If the file doesn't exist, then we are not seeing any error yet. This line
-        # will also be reached if no error was found above.
-        return False
+        # Rather than reading the full file each time, we use a scanner that
+        # is shared by all handlers checking this file during a task run. It only
+        # reads what was added since the last check and remembers all messages
+        # it has seen.
+        # If the file doesn't exist, then we are not seeing any error yet.
+        scanner = get_log_scanner(filename)
+        messages_found = scanner.find(self.possible_error_messages)
+
+        # If one of the messages is found, we return that the error has been found.
+        return bool(messages_found)
 
     @abstractmethod
     def correct(self, directory: str) -> str:
@@ -111,3 +110,237 @@ class ErrorHandler(ABC):
         of this class.
         """
         return self.__class__.__name__
+
+
+class LogScanner:
+    """
+    Searches a file for a set of messages, where each search only reads the
+    part of the file that was added since the last search. This is useful for
+    output files that continuously grow while a program runs (such as vasp.out)
+    because the cost of each check only depends on how much new output there is.
+
+    Messages are remembered once found, so searching is equivalent to searching
+    the full file. All messages are searched for at once using a single compiled
+    regular expression.
+
+    You typically don't create these directly, but instead grab the one that
+    is shared by all ErrorHandlers of a task run with get_log_scanner.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.messages = set()
+        self._pattern = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all messages found so that the file will be read from the start
+        on the next search.
+        """
+        # where we stopped reading the file last time
+        self._offset = 0
+        # the end of the text we last searched. This is added to the start of
+        # the next search so that we don't miss messages that are split between
+        # two reads.
+        self._carry = ""
+        # handles unicode characters that are split between two reads
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._messages_found = set()
+
+    def find(self, messages: list) -> list:
+        """
+        Reads any new content of the file and returns which of the given messages
+        have been found in the file so far.
+        """
+        with self._lock:
+            self._add_messages(messages)
+            self._update()
+            return [message for message in messages if message in self._messages_found]
+
+    def _add_messages(self, messages: list):
+
+        new_messages = set(messages) - self.messages
+        if not new_messages:
+            return
+        self.messages.update(new_messages)
+
+        # We search for the longest messages first. The lookahead "(?=...)" lets
+        # us find matches that overlap one another.
+        messages_ordered = sorted(self.messages, key=len, reverse=True)
+        self._pattern = re.compile(
+            "(?=(" + "|".join(re.escape(message) for message in messages_ordered) + "))"
+        )
+        self._carry_length = len(messages_ordered[0]) - 1
+
+        # Only the longest match is found at each position, so when a message
+        # contains another message, finding it means we've found both.
+        self._messages_implied = {
+            message: {other for other in self.messages if other in message}
+            for message in self.messages
+        }
+
+        # The text we've already read was never searched for the new messages,
+        # so we start over (while keeping what we've found already).
+        messages_found = self._messages_found
+        self.reset()
+        self._messages_found = messages_found
+
+    def _update(self):
+
+        # If the file doesn't exist, then there's nothing to search yet
+        try:
+            filesize = os.path.getsize(self.filename)
+        except OSError:
+            return
+
+        # If the file is now smaller than where we stopped reading, it was
+        # rewritten (e.g. the program was restarted) and we start over.
+        if filesize < self._offset:
+            self.reset()
+        if filesize == self._offset:
+            return
+
+        with open(self.filename, "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+        self._offset += len(data)
+
+        text = self._carry + self._decoder.decode(data)
+        for match in self._pattern.finditer(text):
+            self._messages_found.update(self._messages_implied[match.group(1)])
+        self._carry = text[-self._carry_length :] if self._carry_length else ""
+
+
+class FileCache:
+    """
+    Holds the LogScanners and parsed files of a single task run, so that every
+    handler checking the same file shares them. A SupervisedStagedShellTask
+    makes one of these for each call to execute() and activates it with
+    use_file_cache.
+
+    You typically don't use this directly, but instead call get_log_scanner and
+    get_parsed_file, which use whichever FileCache is active.
+    """
+
+    def __init__(self):
+        # LogScanners are stored as {filename: scanner}
+        self.log_scanners = {}
+        # parsed files are stored as {(filename, parser): (stamp, result)}. The
+        # stamp is the file's modification time and size, which tells us when
+        # to parse it again.
+        self.parsed_files = {}
+        self._parsed_files_locks = {}
+        self._lock = threading.Lock()
+
+    def get_log_scanner(self, filename: str) -> LogScanner:
+        filename = os.path.abspath(filename)
+        with self._lock:
+            if filename not in self.log_scanners:
+                self.log_scanners[filename] = LogScanner(filename)
+            return self.log_scanners[filename]
+
+    def get_parsed_file(self, filename: str, parser):
+        filename = os.path.abspath(filename)
+        key = (filename, parser)
+
+        with self._lock:
+            lock = self._parsed_files_locks.setdefault(key, threading.Lock())
+
+        # Only one thread parses a given file at a time. Other threads wait for
+        # it and then reuse its result.
+        with lock:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                self.parsed_files.pop(key, None)
+                return None
+            stamp = (stat.st_mtime_ns, stat.st_size)
+
+            cached = self.parsed_files.get(key)
+            if cached and cached[0] == stamp:
+                return cached[1]
+
+            result = parser(filename)
+            self.parsed_files[key] = (stamp, result)
+            return result
+
+    def clear(self, directory: str = None):
+        """
+        Removes the LogScanners and parsed files of all files in this directory
+        (or of all files if no directory is given).
+        """
+        if directory:
+            directory = os.path.join(os.path.abspath(directory), "")
+        with self._lock:
+            for filename in list(self.log_scanners.keys()):
+                if not directory or filename.startswith(directory):
+                    self.log_scanners.pop(filename)
+            for key in list(self._parsed_files_locks.keys()):
+                if not directory or key[0].startswith(directory):
+                    self.parsed_files.pop(key, None)
+                    self._parsed_files_locks.pop(key)
+
+
+# The FileCache of the task that is currently running (if any). We use a context
+# variable so that tasks running at the same time in different threads each
+# see their own.
+_active_file_cache = contextvars.ContextVar("active_file_cache", default=None)
+
+
+@contextmanager
+def use_file_cache(file_cache: FileCache = None):
+    """
+    Makes get_log_scanner and get_parsed_file use this FileCache (or a new one)
+    until the with-block exits. Threads started inside the block need to be run
+    in a copy of the context (see contextvars.copy_context) to share it.
+    """
+    file_cache = file_cache or FileCache()
+    token = _active_file_cache.set(file_cache)
+    try:
+        yield file_cache
+    finally:
+        _active_file_cache.reset(token)
+
+
+def get_log_scanner(filename: str) -> LogScanner:
+    """
+    Returns the LogScanner for this file from the active FileCache, creating it
+    if it doesn't exist yet. Outside of a task run (e.g. when calling
+    handler.check() directly), nothing is cached and a new scanner is returned.
+    """
+    file_cache = _active_file_cache.get()
+    if not file_cache:
+        return LogScanner(os.path.abspath(filename))
+    return file_cache.get_log_scanner(filename)
+
+
+def get_parsed_file(filename: str, parser):
+    """
+    Returns the result of parser(filename), only calling the parser again if the
+    file was modified since the last call. If the file doesn't exist, then None
+    is returned. Results are only reused within a task run (i.e. while a
+    FileCache is active) -- otherwise, the file is always parsed.
+
+    This lets several handlers read the same output file (e.g. OSZICAR or INCAR)
+    within a single check while only parsing it once. The returned object is
+    shared with other handlers, so it should be treated as read-only. Only use
+    this in check() methods -- correct() methods change files and should read
+    them directly.
+    """
+    file_cache = _active_file_cache.get()
+    if not file_cache:
+        return parser(filename) if os.path.exists(filename) else None
+    return file_cache.get_parsed_file(filename, parser)
+
+
+def clear_file_caches(directory: str):
+    """
+    Removes the LogScanners and parsed files of all files in this directory from
+    the active FileCache. This should be called whenever a program is restarted
+    in this directory (as its output files will be rewritten).
+    """
+    file_cache = _active_file_cache.get()
+    if file_cache:
+        file_cache.clear(directory)
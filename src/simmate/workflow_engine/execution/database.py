@@ -1,9 +1,13 @@
 # --------------------------------------------------------------------------------------
 
-# import pickle
-import cloudpickle  # needed to serialize Prefect workflow runs and tasks
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
 
 from simmate.database.base_data_types import DatabaseTable, table_column
+from simmate.workflow_engine.execution import serialization
 
 # TYPES OF RELATIONSHIPS:
 # ManyToMany - place in either but not both
@@ -12,10 +16,9 @@ from simmate.database.base_data_types import DatabaseTable, table_column
 
 # --------------------------------------------------------------------------------------
 
-# For serialization, I just use the pickle module, but in the future, I may
-# want to do a priority of MsgPk >> JSON >> Pickle. I could check if the given
-# object(s) has a serialize() method, check if has a to_json() method, and then
-# as a last resort just pickle the object.
+# For serialization, we use the serialization module, which uses cloudpickle
+# by default but also supports msgpack and compression. See that module for
+# more details.
 # https://docs.python.org/3/library/pickle.html
 
 # Pickled objects are just written as byte strings, so I stored them in django
@@ -32,19 +35,126 @@ from simmate.database.base_data_types import DatabaseTable, table_column
 
 # --------------------------------------------------------------------------------------
 
+# When using Postgres, workers NOTIFY this channel every time they complete a
+# WorkItem. Anything waiting on results can LISTEN to it instead of constantly
+# querying the WorkItem table.
+# https://www.postgresql.org/docs/current/sql-notify.html
+WORKITEM_CHANNEL = "simmate_workitems"
+
+
+def notify_workitems_completed():
+    """
+    Signals to anyone listening that WorkItem(s) were just completed. This
+    does nothing if the database isn't Postgres.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"NOTIFY {WORKITEM_CHANNEL};")
+
+
+# --------------------------------------------------------------------------------------
+
+
+class Worker(DatabaseTable):
+
+    """
+    A record of each SimmateWorker that has been started. Running workers
+    regularly update their "last_heartbeat" so that others can tell whether
+    they are still alive. If a worker dies without shutting down (e.g. it is
+    killed by a cluster's walltime), its heartbeat stops and the WorkItems it
+    was running can be reclaimed. See WorkItem.reclaim_orphans.
+    """
+
+    # where the worker is running
+    hostname = table_column.CharField(max_length=255)
+    pid = table_column.IntegerField()
+
+    # the number of WorkItems the worker can run at the same time
+    nslots = table_column.IntegerField(default=1)
+
+    # when the worker started and when it last reported that it's still alive
+    created_at = table_column.DateTimeField(auto_now_add=True)
+    last_heartbeat = table_column.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        app_label = "workflow_execution"
+
+
+class WorkItemFunction(DatabaseTable):
+
+    """
+    A serialized function that one or more WorkItems call. The same function
+    is often submitted thousands of times, so we only store it once and
+    have WorkItems point to it. Functions are looked up by the checksum of
+    their bytes.
+    """
+
+    # sha256 hash of the data column
+    checksum = table_column.CharField(max_length=64, unique=True)
+
+    # the serialized function
+    data = table_column.BinaryField()
+
+    class Meta:
+        app_label = "workflow_execution"
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """
+        Returns the id of the function with these bytes, adding it to the
+        table if it doesn't exist yet.
+        """
+        function, created = cls.objects.only("id").get_or_create(
+            checksum=serialization.get_checksum(data),
+            defaults=dict(data=data),
+        )
+        return function.id
+
+    @classmethod
+    def clear_unused(cls):
+        """
+        Deletes all functions that no longer have any WorkItems pointing to them.
+        """
+        cls.objects.filter(workitems__isnull=True).delete()
+
+
+class WorkItemTag(DatabaseTable):
+
+    """
+    A label that can be given to WorkItems, such as "gpu" or "large-memory".
+    Workers only grab WorkItems whose tags are all in the worker's own tags.
+    """
+
+    name = table_column.CharField(max_length=100, unique=True)
+
+    class Meta:
+        app_label = "workflow_execution"
+
+    @classmethod
+    def from_names(cls, names: list):
+        """
+        Returns the ids of the tags with these names, adding any that don't
+        exist yet.
+        """
+        return [cls.objects.get_or_create(name=name)[0].id for name in set(names)]
+
 
 class WorkItem(DatabaseTable):
 
     """Base info"""
 
     # The function to be called
-    fxn = table_column.BinaryField()
+    fxn = table_column.ForeignKey(
+        WorkItemFunction,
+        on_delete=table_column.PROTECT,
+        related_name="workitems",
+    )
 
     # arguments to be passed into fxn
-    args = table_column.BinaryField(default=cloudpickle.dumps([]))
+    args = table_column.BinaryField(default=serialization.dumps([]))
 
     # keyword arguments to be passed into fxn
-    kwargs = table_column.BinaryField(default=cloudpickle.dumps({}))
+    kwargs = table_column.BinaryField(default=serialization.dumps({}))
 
     # the output of fxn(*args, **kwargs)
     result = table_column.BinaryField(blank=True, null=True)
@@ -58,17 +168,103 @@ class WorkItem(DatabaseTable):
         # CANCELLED_AND_NOTIFIED = "N"  # !!! when should I use this?
         FINISHED = "F"
 
-    # TODO -- I should consider indexing this column for speed because it's
-    # the most queried column by far.
+    # This is the most queried column by far (every worker filters on it when
+    # looking for a new WorkItem), so we index it for speed.
     status = table_column.CharField(
         max_length=1,
         choices=StatusOptions.choices,
         default=StatusOptions.PENDING,
+        db_index=True,
+    )
+
+    # Workers run WorkItems with a higher priority first. WorkItems with the
+    # same priority are ran in the order that they were submitted.
+    priority = table_column.IntegerField(default=0, db_index=True)
+
+    # labels used to decide which workers can run this WorkItem
+    tags = table_column.ManyToManyField(
+        WorkItemTag,
+        blank=True,
+        related_name="workitems",
     )
 
-    # TODO -- This really should be a separate table with a relationship to WorkItem
-    # the worker ID that grabbed the workitem
-    # worker_id = table_column.CharField(max_length=50, blank=True, null=True)
+    # timestamps of when the WorkItem was submitted and last changed. Workers
+    # use created_at to run WorkItems in the order that they were submitted.
+    created_at = table_column.DateTimeField(auto_now_add=True)
+    updated_at = table_column.DateTimeField(auto_now=True)
+
+    # the worker that grabbed the workitem
+    worker = table_column.ForeignKey(
+        Worker,
+        on_delete=table_column.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="workitems",
+    )
 
     class Meta:
         app_label = "workflow_execution"
+
+    @classmethod
+    def add_tags(cls, workitem_ids: list, tags: list):
+        """
+        Gives all of the WorkItems the list of tag names. This is done with a
+        single INSERT no matter how many WorkItems there are.
+        """
+        tag_ids = WorkItemTag.from_names(tags)
+        cls.tags.through.objects.bulk_create(
+            [
+                cls.tags.through(workitem_id=workitem_id, workitemtag_id=tag_id)
+                for workitem_id in workitem_ids
+                for tag_id in tag_ids
+            ]
+        )
+
+    @classmethod
+    def reclaim_orphans(cls, lease: float = 600, requeue: bool = True):
+        """
+        Finds RUNNING WorkItems whose worker hasn't sent a heartbeat in the
+        last `lease` seconds and either puts them back in the queue or marks
+        them as finished with a WorkerLostError as their result. Returns the
+        number of WorkItems reclaimed.
+
+        Parameters
+        ----------
+        lease : float
+            The number of seconds without a heartbeat before a worker is
+            considered dead. This should be several times larger than the
+            heartbeat interval of your workers.
+        requeue : bool
+            If True, orphaned WorkItems are set back to PENDING so that another
+            worker can run them. If False, they are marked as FINISHED and
+            calling result() on their future will raise a WorkerLostError.
+        """
+
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=lease)
+
+        # WorkItems claimed by a dead worker. Those without a worker at all
+        # are only considered orphaned if they've been untouched for the lease.
+        orphans = cls.objects.filter(status="R").filter(
+            Q(worker__last_heartbeat__lt=cutoff)
+            | Q(worker__isnull=True, updated_at__lt=cutoff)
+        )
+
+        if requeue:
+            return orphans.update(status="P", worker=None, updated_at=now)
+        else:
+            error = WorkerLostError(
+                "The worker running this WorkItem stopped sending heartbeats "
+                f"for over {lease} seconds and is assumed to be dead."
+            )
+            nreclaimed = orphans.update(
+                status="F",
+                result=serialization.dumps(error),
+                updated_at=now,
+            )
+            notify_workitems_completed()
+            return nreclaimed
+
+
+class WorkerLostError(Exception):
+    pass
@@ -1,14 +1,17 @@
 # -*- coding: utf-8 -*-
 
-# import pickle
-import cloudpickle  # needed to serialize Prefect workflow runs and tasks
+import itertools
+import time
+
+from django.db import connection, transaction
 
 # from concurrent.futures import Executor # No need to inherit at the moment
 from prefect.executors.base import Executor  # OPTIMIZE: prefect is slow AF
 
 from simmate.configuration.django import setup_full  # ensures setup
-from simmate.workflow_engine.execution.database import WorkItem
-from simmate.workflow_engine.execution.future import DjangoFuture
+from simmate.workflow_engine.execution import serialization
+from simmate.workflow_engine.execution.database import WorkItem, WorkItemFunction
+from simmate.workflow_engine.execution.future import DjangoFuture, as_completed
 
 # This class is modeled after the following...
 # https://github.com/python/cpython/blob/master/Lib/concurrent/futures/thread.py
@@ -32,24 +35,43 @@ class SimmateExecutor(Executor):
     signals are one-directional -- that is they query a database and there
     is never a signal sent to the worker like other executors do. Thus
     we can have workers anywhere we'd like as long as they have access
-    to internet - so even multiple HPC clusters will work. At the moment,
-    the executor has no idea how many workers exist and their state. I may
-    add a "worker heartbeat" table to the queue database for the executor
-    to read and run managerial tasks based off though.
+    to internet - so even multiple HPC clusters will work. Workers register
+    themselves in a "worker heartbeat" table (see the Worker database table),
+    which the executor reads to run managerial tasks such as
+    reclaim_orphaned_workitems.
     """
 
-    # There are no arguments to pass the init at the momemnt. I may want to build
-    # options for this in the future. If so, I should also use super().__init__()
-    # to make sure the parent class runs as well
-    # def __init__(self):
-    #     pass
+    def __init__(self, serializer="cloudpickle", compression=None):
+
+        # make sure the parent class runs as well
+        super().__init__()
+
+        # How to convert inputs to bytes for the database. Results are stored
+        # by workers using these same settings. See the serialization module
+        # for all options.
+        self.serializer = serializer
+        self.compression = compression
 
-    def submit(self, fxn, *args, extra_context=None, **kwargs):
+    def submit(
+        self,
+        fxn,
+        *args,
+        priority=0,
+        tags=None,
+        extra_context=None,
+        **kwargs,
+    ):
 
         # NOTE: extra_context is only for Prefect compatibility and not needed outside
         # of that. It must be after *args as well to avoid bug of assigning an
         # arg to extra_context instead
 
+        # priority and tags are used by workers to decide which WorkItem to
+        # run next and whether they can run it at all. Workers run WorkItems
+        # with higher priority first, and only run WorkItems whose tags are
+        # all in the worker's own tags. Note, because of this, fxn can't be
+        # given kwargs named "priority" or "tags".
+
         # The *args and **kwargs input separates args into a tuple and kwargs into
         # a dictionary for me, which makes their storage very easy!
 
@@ -61,10 +83,13 @@ class SimmateExecutor(Executor):
         # adding another WorkItem at the same time.
         # TODO - should I put pickling in a "try" in case it fails?
         workitem = WorkItem.objects.create(
-            fxn=cloudpickle.dumps(fxn),
-            args=cloudpickle.dumps(args),
-            kwargs=cloudpickle.dumps(kwargs),
+            fxn_id=self._get_function_id(fxn),
+            args=self._dumps(args),
+            kwargs=self._dumps(kwargs),
+            priority=priority,
         )
+        if tags:
+            WorkItem.add_tags([workitem.pk], tags)
 
         # create the future object
         future = DjangoFuture(pk=workitem.pk)
@@ -72,24 +97,172 @@ class SimmateExecutor(Executor):
         # and return the future for use
         return future
 
-    def map(self, fxn, iterables, timeout=None, chunksize=100):  # TODO
-        # chunksize indicates how many to add at one
-        # iterables is a list of (*args, **kwargs)
-        # add many fn(*args, **kwargs) to queue
+    def map(
+        self,
+        fxn,
+        *iterables,
+        timeout=None,
+        chunksize=100,
+        priority=0,
+        tags=None,
+    ):
+        """
+        Works like concurrent.futures.Executor.map, where fxn(*args) is submitted
+        for every set of args given by zip(*iterables) and an iterator of the
+        results (in the same order) is returned.
+
+        All calls are submitted right away (see submit_many), and the iterator
+        then waits on each result as it is requested. If a result isn't ready
+        within timeout seconds of calling map, a TimeoutError is raised. If the
+        iterator is closed early, the remaining WorkItems are cancelled.
+
+        Parameters
+        ----------
+        fxn : callable
+            The function to call for each set of arguments.
+        *iterables :
+            Iterables of arguments, which behave exactly like those given to
+            python's builtin map() (i.e. they are zipped together).
+        timeout : float
+            The maximum number of seconds to wait for all results.
+        chunksize : int
+            The number of WorkItems to add to the database at once.
+        priority : int
+            The priority given to every WorkItem. See submit() for details.
+        tags : list
+            The tags given to every WorkItem. See submit() for details.
+        """
+
+        futures = self.submit_many(
+            fxn,
+            *iterables,
+            chunksize=chunksize,
+            priority=priority,
+            tags=tags,
+        )
+        end_time = None if timeout is None else time.monotonic() + timeout
+
+        # This is a nested generator so that the WorkItems above are submitted
+        # when map is called rather than when we first iterate.
+        def result_iterator():
+            try:
+                # we pop the futures as we go so that the finally block
+                # only cancels the ones we haven't returned a result for
+                futures.reverse()
+                while futures:
+                    future = futures.pop()
+                    try:
+                        if end_time is None:
+                            yield future.result()
+                        else:
+                            yield future.result(end_time - time.monotonic())
+                    except Exception:
+                        future.cancel()
+                        raise
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return result_iterator()
+
+    def submit_many(self, fxn, *iterables, chunksize=100, priority=0, tags=None):
+        """
+        Submits fxn(*args) for every set of args given by zip(*iterables) and
+        returns a list of DjangoFutures (one per call and in the same order).
+
+        Unlike calling submit() in a loop, the function is only pickled once
+        and the WorkItems are written to the database in batches of `chunksize`
+        using bulk_create. This turns thousands of INSERT statements into a
+        handful of them.
+
+        See map() for a description of the parameters.
+        """
+
+        # The function and kwargs are identical for every WorkItem, so we only
+        # pickle them once and reuse them.
+        fxn_id = self._get_function_id(fxn)
+        kwargs_pickled = self._dumps({})
+
+        # zip is lazy, so we only ever hold one chunk of args in memory at a time
+        all_args = zip(*iterables)
+
+        futures = []
+        while True:
+            chunk = list(itertools.islice(all_args, chunksize))
+            if not chunk:
+                break
+            workitems = [
+                WorkItem(
+                    fxn_id=fxn_id,
+                    args=self._dumps(args),
+                    kwargs=kwargs_pickled,
+                    priority=priority,
+                )
+                for args in chunk
+            ]
+            pks = self._bulk_create_workitems(workitems)
+            if tags:
+                WorkItem.add_tags(pks, tags)
+            futures += [DjangoFuture(pk=pk) for pk in pks]
 
-        # TODO -- This is not supported at the moment. I should use the
-        # .bulk_create method to do this in the future:
-        # https://docs.djangoproject.com/en/3.1/ref/models/querysets/#bulk-create
+        return futures
 
-        # raise an error to ensure user sees this isn't supported yet.
-        raise Exception("This method is not supported yet")
+    def _dumps(self, obj):
+        """
+        Converts an object to bytes using this executor's serialization settings.
+        """
+        return serialization.dumps(
+            obj,
+            serializer=self.serializer,
+            compression=self.compression,
+        )
+
+    def _get_function_id(self, fxn):
+        """
+        Serializes the function and returns its id in the WorkItemFunction table.
+        Identical functions are only ever stored once.
+        """
+        # Functions are always pickled because msgpack can't handle them
+        fxn_pickled = serialization.dumps(fxn, compression=self.compression)
+        return WorkItemFunction.from_bytes(fxn_pickled)
+
+    @staticmethod
+    def _bulk_create_workitems(workitems):
+        """
+        Saves a list of WorkItems with a single INSERT and returns their ids.
+        """
+
+        # Postgres returns the new ids from bulk_create, so this is all we need.
+        if connection.features.can_return_rows_from_bulk_insert:
+            workitems = WorkItem.objects.bulk_create(workitems)
+            return [workitem.pk for workitem in workitems]
+
+        # SQLite leaves the ids unset. Instead, we grab the newest ids within the
+        # same transaction. SQLite holds a write lock on the whole database until
+        # the transaction ends, so no other executor can add rows in between
+        # these two queries.
+        if connection.vendor == "sqlite":
+            with transaction.atomic():
+                WorkItem.objects.bulk_create(workitems)
+                pks_newest = WorkItem.objects.order_by("-pk").values_list(
+                    "pk", flat=True
+                )
+                return list(pks_newest[: len(workitems)])[::-1]
+
+        # Other backends (such as MySQL) neither return the ids nor lock the
+        # whole table, so other executors could add rows in between. We can't
+        # trust the newest ids here and save each WorkItem on its own instead.
+        with transaction.atomic():
+            for workitem in workitems:
+                workitem.save()
+        return [workitem.pk for workitem in workitems]
 
     def shutdown(self, wait=True, cancel_futures=False):  # TODO
         # whether to wait until the queue is empty
         # whether to cancel futures and clear database
         pass
 
-    def wait(self, futures):
+    def wait(self, futures, timeout=None):
         """
         Waits for all futures to complete before returning a list of their results
         """
@@ -97,18 +270,22 @@ class SimmateExecutor(Executor):
         # then we return a dictionary of which futures replaced by results.
         # NOTE: this is really for compatibility with Prefect's FlowRunner.
         if isinstance(futures, dict):
-            print("\n\nWAIT")
-            import time
-
-            time.sleep(10)
-            for key, future in futures.items():
-                print((key, future, future.pk, future.done()))
-                # print(future.result())
+            self.as_completed(futures.values(), timeout=timeout)
             return {key: future.result() for key, future in futures.items()}
         # otherwise this is a list of futures, so return a list of results
         else:
+            self.as_completed(futures, timeout=timeout)
             return [future.result() for future in futures]
 
+    def as_completed(self, futures, timeout=None):
+        """
+        Returns a list of the given futures in the order that they complete
+        (finished or cancelled). This waits for all of them to complete. See
+        simmate.workflow_engine.execution.future.as_completed for an iterator
+        version that yields futures one at a time.
+        """
+        return list(as_completed(futures, timeout=timeout))
+
     # ------------------------------------------------------------------------
     # ------------------------------------------------------------------------
     # ------------------------------------------------------------------------
@@ -131,6 +308,18 @@ class SimmateExecutor(Executor):
         queue_size = WorkItem.objects.filter(status="P").count()
         return queue_size
 
+    def reclaim_orphaned_workitems(self, lease=600, requeue=True):
+        """
+        Finds WorkItems that are stuck as RUNNING because their worker died
+        and either puts them back in the queue or marks them as failed. Returns
+        the number of WorkItems reclaimed. See WorkItem.reclaim_orphans for
+        details on the parameters.
+
+        Workers already do this whenever they find the queue empty, so you only
+        need to call this yourself if all of your workers are busy or gone.
+        """
+        return WorkItem.reclaim_orphans(lease=lease, requeue=requeue)
+
     def clear_queue(self, are_you_sure=False):
         """
         Empties the WorkItem database table and delete everything. This will
@@ -144,6 +333,7 @@ class SimmateExecutor(Executor):
             )
         else:
             WorkItem.objects.all().delete()
+            WorkItemFunction.objects.all().delete()
 
     def clear_finished(self, are_you_sure=False):
         """
@@ -155,3 +345,4 @@ class SimmateExecutor(Executor):
             raise Exception
         else:
             WorkItem.objects.filter(status="F").delete()
+            WorkItemFunction.clear_unused()
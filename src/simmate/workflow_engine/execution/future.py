@@ -1,22 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import select
 import time
 
-# import pickle
-import cloudpickle  # needed to serialize Prefect workflow runs and tasks
-
 # from concurrent.futures import Future # No need to inherit at the moment
 
+from django.db import connection
+from django.utils import timezone
+
 from simmate.configuration.django import setup_full  # ensures setup
-from simmate.workflow_engine.execution.database import WorkItem
+from simmate.workflow_engine.execution import serialization
+from simmate.workflow_engine.execution.database import WorkItem, WORKITEM_CHANNEL
 
 # class based on...
 # https://docs.python.org/3/library/concurrent.futures.html
 # Some methods still need to be added, but I have no need for them yet.
 
-# locking rows is done by...
-# https://docs.djangoproject.com/en/3.1/ref/models/querysets/#select-for-update
-
 
 class DjangoFuture:  # (Future)
     def __init__(self, pk):
@@ -25,6 +24,11 @@ class DjangoFuture:  # (Future)
         # we should loook at.
         self.pk = pk
 
+        # Once the WorkItem is found to be completed, we store its final status
+        # and result here so that we never need to query them again.
+        self._status = None
+        self._result_pickled = None
+
     def cancel(self):
         """
         Attempt to cancel the call. If the call is currently being executed or
@@ -32,21 +36,16 @@ class DjangoFuture:  # (Future)
         False, otherwise the call will be cancelled and the method will return
         True.
         """
-        # Query the WorkItem, lock it for editting, and check the status.
-        workitem = WorkItem.objects.select_for_update().get(pk=self.pk)
-
-        # check if the status is *not* PENDING
-        if workitem.status != "P":
-            # if so, the job is already running or finished, in which case
-            # we can't cancel it.
-            return False
-
-        else:
-            # If it is still pending, we can go ahead and cancel it.
-            # This does not delete the task from the queue database though
-            workitem.status = "C"
-            workitem.save()
-            return True
+        # Only update the status if the WorkItem is still PENDING. This is a
+        # single UPDATE statement, so no worker can claim the WorkItem while
+        # we are cancelling it. If zero rows are updated, the job is already
+        # running or finished, in which case we can't cancel it.
+        # This does not delete the task from the queue database though
+        nupdated = WorkItem.objects.filter(pk=self.pk, status="P").update(
+            status="C",
+            updated_at=timezone.now(),
+        )
+        return bool(nupdated)
 
     def cancelled(self):
         """
@@ -100,37 +99,138 @@ class DjangoFuture:  # (Future)
 
         If the call raised, this method will raise the same exception.
         """
-        # if no timeout was set, use infinity so we wait forever.
-        if not timeout:
-            timeout = float("inf")
-
-        # Loop endlessly until the job completes or we timeout
-        time_start = time.time()
-
-        while (time.time() - time_start) < timeout:
-            # I don't use a lock to check the status here
-            workitem = WorkItem.objects.only("status", "result").get(pk=self.pk)
-            status = workitem.status
-
-            if status == "F":  # FINISHED
-                # grab the result, unpickle it, and return it
-                result = cloudpickle.loads(workitem.result)
-                # if the result is an Error or Exception, raise it
-                if isinstance(result, Exception):
-                    raise result
-                # otherwise return the result as-s
-                else:
-                    return result
-
-            elif status == "C":  # CANCELED
-                raise CancelledError("This item was cancelled and has no result")
-
-            elif status == "P" or status == "R":  # PENDING or RUNNING
-                # sleep the set amount before restarting the while loop
-                time.sleep(sleep_step)
-
-        # if the loop exits and we reached this line, then we've hit the timeout
-        raise TimeoutError("The time-limit to wait for this result has been exceeded")
+
+        # wait for the call to complete if we haven't seen it complete already.
+        # as_completed handles timeouts and how often we check the database.
+        if self._status is None:
+            for _ in as_completed([self], timeout=timeout, sleep_step=sleep_step):
+                pass
+
+        if self._status == "F":  # FINISHED
+            # grab the result, unpickle it, and return it
+            result = serialization.loads(self._result_pickled)
+            # if the result is an Error or Exception, raise it
+            if isinstance(result, Exception):
+                raise result
+            # otherwise return the result as-s
+            else:
+                return result
+
+        elif self._status == "C":  # CANCELED
+            raise CancelledError("This item was cancelled and has no result")
+
+
+def as_completed(futures, timeout=None, sleep_step=0.1, sleep_step_max=5):
+    """
+    Yields each of the given DjangoFutures as it completes (finished or
+    cancelled). If all futures haven't completed within timeout seconds, a
+    TimeoutError is raised.
+
+    Unlike calling result() on each future, the status of all pending futures is
+    checked with a single query. Between checks, we sleep for sleep_step seconds
+    and double this each time nothing new has completed (up to sleep_step_max).
+    On Postgres, we also LISTEN for workers to signal that they've finished a
+    WorkItem so that we wake up right away instead of sleeping the full time.
+    """
+
+    # if no timeout was set, use infinity so we wait forever. Note, a timeout
+    # of 0 means we only check once.
+    if timeout is None:
+        timeout = float("inf")
+    time_start = time.time()
+
+    # futures that we already know are done don't need to be queried again
+    pending = {}
+    for future in futures:
+        if future._status is None:
+            pending.setdefault(future.pk, []).append(future)
+        else:
+            yield future
+
+    listener = CompletionListener()
+    sleep_time = sleep_step
+    try:
+        while pending:
+            # grab the status and result of every pending WorkItem that has
+            # completed since our last check
+            ncompleted = 0
+            for pk, status, result_pickled in _query_completed(list(pending.keys())):
+                for future in pending.pop(pk):
+                    future._status = status
+                    future._result_pickled = result_pickled
+                    ncompleted += 1
+                    yield future
+            if not pending:
+                return
+
+            # if nothing new completed, we wait a little longer before the next
+            # check to avoid hammering the database.
+            if ncompleted:
+                sleep_time = sleep_step
+            else:
+                sleep_time = min(sleep_time * 2, sleep_step_max)
+
+            # make sure we don't sleep past the timeout
+            time_remaining = timeout - (time.time() - time_start)
+            if time_remaining <= 0:
+                raise TimeoutError(
+                    "The time-limit to wait for this result has been exceeded"
+                )
+            listener.wait(min(sleep_time, time_remaining))
+    finally:
+        listener.close()
+
+
+def _query_completed(pks):
+    """
+    Returns (pk, status, result) for all of the given WorkItems that are
+    either FINISHED or CANCELLED.
+    """
+    # SQLite limits the number of parameters in a single query, so we may need
+    # to break up the list of ids. Postgres has no limit (None).
+    batch_size = connection.features.max_query_params or len(pks)
+    completed = []
+    for i in range(0, len(pks), batch_size):
+        completed += WorkItem.objects.filter(
+            pk__in=pks[i : i + batch_size],
+            status__in=["F", "C"],
+        ).values_list("pk", "status", "result")
+    return completed
+
+
+class CompletionListener:
+    """
+    Waits until something signals that new results are available or until
+    a given amount of time has passed -- whichever is first. By default, this
+    listens for workers completing WorkItems, but any channel can be given.
+
+    Signals are only supported with Postgres (via LISTEN/NOTIFY). For all
+    other databases, this simply sleeps for the given amount of time.
+    """
+
+    def __init__(self, channel: str = WORKITEM_CHANNEL):
+        self.channel = channel
+        self.is_listening = connection.vendor == "postgresql"
+        if self.is_listening:
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel};")
+
+    def wait(self, seconds):
+        if not self.is_listening:
+            time.sleep(seconds)
+            return
+        # this is the underlying psycopg2 connection
+        pg_connection = connection.connection
+        select.select([pg_connection], [], [], seconds)
+        # The notifications only tell us to check the database again, so we
+        # don't need their contents.
+        pg_connection.poll()
+        pg_connection.notifies.clear()
+
+    def close(self):
+        if self.is_listening:
+            with connection.cursor() as cursor:
+                cursor.execute(f"UNLISTEN {self.channel};")
 
 
 class CancelledError(Exception):
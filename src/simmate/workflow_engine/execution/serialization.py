@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module converts python objects to and from bytes so that they can be stored
+in the WorkItem table (see WorkItem.fxn/args/kwargs/result).
+
+Every blob starts with a small header that says how it was made, so readers
+never need to know the settings of the executor that wrote it:
+
+    MAGIC (4 bytes) + serializer id (1 byte) + compressor id (1 byte) + payload
+
+Blobs that don't start with MAGIC are plain cloudpickle bytes, which is how
+everything was stored before this module existed. These are still loaded
+just fine.
+
+Serializers:
+    - "cloudpickle": works for any python object. We use pickle protocol 5 so
+      that large buffers (e.g. numpy arrays) are passed "out-of-band" and
+      appended to the payload as-is instead of being copied into the pickle.
+    - "msgpack": much faster and smaller for plain data (dicts, lists, str,
+      numbers, ...). Objects that msgpack can't handle automatically fall back
+      to cloudpickle. Note, tuples are loaded back as lists. Requires the
+      msgpack package (which is installed alongside dask).
+
+Compressors:
+    - None: no compression (the default)
+    - "zlib": from python's standard library
+    - "lz4": very fast but with less compression. Requires the lz4 package.
+    - "zstd": fast with great compression. Requires the zstandard package.
+"""
+
+import hashlib
+import importlib
+import struct
+import zlib
+
+import cloudpickle
+
+MAGIC = b"SMT\x01"
+
+SERIALIZERS = {"cloudpickle": 1, "msgpack": 2}
+COMPRESSORS = {None: 0, "zlib": 1, "lz4": 2, "zstd": 3}
+
+# for converting the ids in a header back to their names
+_SERIALIZER_NAMES = {value: key for key, value in SERIALIZERS.items()}
+_COMPRESSOR_NAMES = {value: key for key, value in COMPRESSORS.items()}
+
+
+def dumps(obj, serializer: str = "cloudpickle", compression: str = None) -> bytes:
+    """
+    Converts a python object to bytes using the given serializer and compression.
+    """
+
+    if serializer not in SERIALIZERS:
+        raise Exception(
+            f"Unknown serializer '{serializer}'. Options are {list(SERIALIZERS)}."
+        )
+    if compression not in COMPRESSORS:
+        raise Exception(
+            f"Unknown compression '{compression}'. Options are {list(COMPRESSORS)}."
+        )
+
+    if serializer == "msgpack":
+        msgpack = _import_optional("msgpack", "msgpack")
+        try:
+            payload = msgpack.packb(obj, use_bin_type=True)
+        # msgpack only supports plain data, so everything else is pickled instead
+        except (TypeError, ValueError, OverflowError):
+            serializer = "cloudpickle"
+    if serializer == "cloudpickle":
+        payload = _dumps_cloudpickle(obj)
+
+    payload = _compress(payload, compression)
+
+    header = MAGIC + bytes([SERIALIZERS[serializer], COMPRESSORS[compression]])
+    return header + payload
+
+
+def loads(data: bytes):
+    """
+    Converts bytes made by dumps (or by plain cloudpickle) back to a python object.
+    """
+
+    # django may give us a memoryview for BinaryFields
+    data = bytes(data)
+
+    # this is a plain cloudpickle blob from before we added headers
+    if not data.startswith(MAGIC):
+        return cloudpickle.loads(data)
+
+    serializer_id, compressor_id = data[len(MAGIC)], data[len(MAGIC) + 1]
+    payload = _decompress(data[len(MAGIC) + 2 :], _COMPRESSOR_NAMES[compressor_id])
+
+    if _SERIALIZER_NAMES[serializer_id] == "msgpack":
+        msgpack = _import_optional("msgpack", "msgpack")
+        return msgpack.unpackb(payload, raw=False)
+    else:
+        return _loads_cloudpickle(payload)
+
+
+def get_settings(data: bytes) -> dict:
+    """
+    Returns the serializer and compression that were used to make the given
+    bytes. This lets a worker store a result in the same way that the
+    WorkItem's inputs were stored.
+    """
+    data = bytes(data[: len(MAGIC) + 2])
+    if not data.startswith(MAGIC):
+        return dict(serializer="cloudpickle", compression=None)
+    return dict(
+        serializer=_SERIALIZER_NAMES[data[len(MAGIC)]],
+        compression=_COMPRESSOR_NAMES[data[len(MAGIC) + 1]],
+    )
+
+
+def get_checksum(data: bytes) -> str:
+    """
+    Returns a sha256 hash of the bytes. Identical objects (such as the same
+    function submitted many times) will give the same checksum.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+# --------------------------------------------------------------------------------------
+
+# The cloudpickle payload is laid out as...
+#   number of buffers (uint32)
+#   length of the pickle and each buffer (uint64 each)
+#   the pickle followed by each buffer
+
+
+def _dumps_cloudpickle(obj) -> bytes:
+    buffers = []
+    pickled = cloudpickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    buffers = [buffer.raw() for buffer in buffers]
+    lengths = [len(pickled)] + [buffer.nbytes for buffer in buffers]
+    header = struct.pack(f"<I{len(lengths)}Q", len(buffers), *lengths)
+    return b"".join([header, pickled, *buffers])
+
+
+def _loads_cloudpickle(payload: bytes):
+    (nbuffers,) = struct.unpack_from("<I", payload)
+    lengths = struct.unpack_from(f"<{nbuffers + 1}Q", payload, offset=4)
+
+    # split the payload back into the pickle and its buffers without copying
+    view = memoryview(payload)
+    start = 4 + 8 * len(lengths)
+    chunks = []
+    for length in lengths:
+        chunks.append(view[start : start + length])
+        start += length
+
+    return cloudpickle.loads(chunks[0], buffers=chunks[1:])
+
+
+def _compress(payload: bytes, compression: str) -> bytes:
+    if compression == "zlib":
+        return zlib.compress(payload)
+    elif compression == "lz4":
+        lz4_frame = _import_optional("lz4.frame", "lz4")
+        return lz4_frame.compress(payload)
+    elif compression == "zstd":
+        zstandard = _import_optional("zstandard", "zstandard")
+        return zstandard.ZstdCompressor().compress(payload)
+    return payload
+
+
+def _decompress(payload: bytes, compression: str) -> bytes:
+    if compression == "zlib":
+        return zlib.decompress(payload)
+    elif compression == "lz4":
+        lz4_frame = _import_optional("lz4.frame", "lz4")
+        return lz4_frame.decompress(payload)
+    elif compression == "zstd":
+        zstandard = _import_optional("zstandard", "zstandard")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return payload
+
+
+def _import_optional(module_name: str, package_name: str):
+    try:
+        return importlib.import_module(module_name)
+    except ModuleNotFoundError:
+        raise Exception(
+            f"You must have {package_name} installed to use this serialization option."
+        )
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from django.db import connection
+
+from simmate.workflow_engine.execution import serialization
+from simmate.workflow_engine.execution.database import WorkItem, WorkItemFunction
+from simmate.workflow_engine.execution.executor import SimmateExecutor
+from simmate.workflow_engine.execution.future import CancelledError
+from simmate.workflow_engine.execution.worker import SimmateWorker
+
+
+@pytest.mark.django_db
+def test_executor_submit_many():
+
+    executor = SimmateExecutor()
+
+    # use a chunksize that doesn't evenly divide the number of calls so that
+    # we also check the final (partial) chunk
+    futures = executor.submit_many(pow, range(25), [2] * 25, chunksize=10)
+    assert len(futures) == 25
+    assert WorkItem.objects.count() == 25
+
+    # the futures should point to the WorkItems in the order they were given
+    for n, future in enumerate(futures):
+        workitem = WorkItem.objects.get(pk=future.pk)
+        assert serialization.loads(workitem.args) == (n, 2)
+        assert serialization.loads(workitem.kwargs) == {}
+        assert workitem.status == "P"
+
+    # the function is pickled once and shared by every WorkItem
+    assert WorkItemFunction.objects.count() == 1
+    executor.submit(pow, 3, 2)
+    assert WorkItemFunction.objects.count() == 1
+
+    assert executor.queue_size() == 26
+
+
+@pytest.mark.django_db
+def test_executor_submit_many_without_returned_ids(monkeypatch):
+
+    # backends like MySQL neither return ids from bulk inserts nor lock the
+    # whole table, so WorkItems are saved one at a time instead
+    monkeypatch.setattr(connection, "vendor", "mysql")
+    monkeypatch.setattr(connection.features, "can_return_rows_from_bulk_insert", False)
+
+    executor = SimmateExecutor()
+    futures = executor.submit_many(pow, range(5), [2] * 5, chunksize=2)
+    for n, future in enumerate(futures):
+        workitem = WorkItem.objects.get(pk=future.pk)
+        assert serialization.loads(workitem.args) == (n, 2)
+
+
+@pytest.mark.django_db
+def test_executor_map():
+
+    executor = SimmateExecutor()
+
+    # like concurrent.futures, every call is submitted right away and an
+    # iterator of the results is returned
+    results = executor.map(pow, range(5), [2] * 5, chunksize=2)
+    assert not isinstance(results, list)
+    assert executor.queue_size() == 5
+
+    worker = SimmateWorker(close_on_empty_queue=True, waittime_on_empty_queue=0)
+    worker.start()
+    assert list(results) == [0, 1, 4, 9, 16]
+
+    # results that never finish hit the timeout and everything is cancelled
+    results = executor.map(abs, [-1, -2], timeout=0.1)
+    with pytest.raises(TimeoutError):
+        next(results)
+    assert executor.queue_size() == 0
+
+    # closing the iterator early cancels the WorkItems that are left
+    results = executor.map(abs, [-1, -2, -3])
+    worker = SimmateWorker(nitems_max=1)
+    worker.start()
+    assert next(results) == 1
+    results.close()
+    assert executor.queue_size() == 0
+
+
+@pytest.mark.django_db
+def test_executor_wait():
+
+    executor = SimmateExecutor()
+    futures = executor.submit_many(abs, [-1, -2, -3])
+    future_cancelled = executor.submit(abs, -4)
+
+    # nothing has ran yet (and a timeout of 0 only checks once)
+    with pytest.raises(TimeoutError):
+        executor.wait(futures, timeout=0.1)
+    with pytest.raises(TimeoutError):
+        futures[0].result(timeout=0)
+
+    # pretend a worker finished the WorkItems in reverse order
+    for n, future in reversed(list(enumerate(futures))):
+        WorkItem.objects.filter(pk=future.pk).update(
+            status="F",
+            result=serialization.dumps(n + 1),
+        )
+    future_cancelled.cancel()
+
+    assert executor.wait(futures) == [1, 2, 3]
+    assert executor.wait({"a": futures[0], "b": futures[2]}) == {"a": 1, "b": 3}
+    assert len(executor.as_completed(futures + [future_cancelled])) == 4
+    with pytest.raises(CancelledError):
+        future_cancelled.result()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import cloudpickle
+import numpy
+import pytest
+
+from simmate.workflow_engine.execution import serialization
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_serialization(compression):
+
+    # numpy arrays are passed out-of-band and should come back unchanged
+    array = numpy.arange(1000, dtype=float).reshape(10, 100)
+    data = serialization.dumps(dict(array=array), compression=compression)
+    assert numpy.array_equal(serialization.loads(data)["array"], array)
+    assert serialization.get_settings(data) == dict(
+        serializer="cloudpickle",
+        compression=compression,
+    )
+
+    # plain data is stored with msgpack while everything else falls back to
+    # cloudpickle
+    data = serialization.dumps([1, "a", {"b": 2.5}], serializer="msgpack")
+    assert serialization.loads(data) == [1, "a", {"b": 2.5}]
+    assert serialization.get_settings(data)["serializer"] == "msgpack"
+    data = serialization.dumps(abs, serializer="msgpack")
+    assert serialization.loads(data) is abs
+    assert serialization.get_settings(data)["serializer"] == "cloudpickle"
+
+    # blobs made before serialization headers existed still load
+    assert serialization.loads(cloudpickle.dumps([1, 2])) == [1, 2]
+
+    with pytest.raises(Exception):
+        serialization.dumps(1, compression="fake")
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from simmate.workflow_engine.execution.database import (
+    WorkItem,
+    Worker,
+    WorkerLostError,
+)
+from simmate.workflow_engine.execution.executor import SimmateExecutor
+from simmate.workflow_engine.execution.worker import SimmateWorker
+
+
+@pytest.mark.django_db
+def test_worker_claim_workitem():
+
+    executor = SimmateExecutor()
+    futures = executor.submit_many(abs, [-1, -2])
+
+    worker = SimmateWorker()
+
+    # WorkItems are claimed in the order they were submitted and never twice
+    workitem1 = worker.claim_workitem()
+    workitem2 = worker.claim_workitem()
+    assert workitem1.pk == futures[0].pk
+    assert workitem2.pk == futures[1].pk
+    assert WorkItem.objects.filter(status="R").count() == 2
+
+    # the queue is now empty
+    assert worker.claim_workitem() is None
+
+    # running WorkItems can't be cancelled
+    assert not futures[0].cancel()
+
+
+@pytest.mark.django_db
+def test_worker_start():
+
+    executor = SimmateExecutor()
+    futures = executor.submit_many(abs, [-1, -2, -3])
+    future_cancelled = executor.submit(abs, -4)
+    assert future_cancelled.cancel()
+
+    worker = SimmateWorker(close_on_empty_queue=True, waittime_on_empty_queue=0)
+    worker.start()
+
+    assert executor.wait(futures) == [1, 2, 3]
+    assert future_cancelled.cancelled()
+
+
+@pytest.mark.django_db
+def test_worker_start_nslots():
+
+    executor = SimmateExecutor()
+    futures = executor.submit_many(abs, [-1, -2, -3, -4, -5])
+
+    # with 2 slots and a limit of 3 items, two WorkItems should be left over
+    worker = SimmateWorker(
+        nitems_max=3,
+        nslots=2,
+        close_on_empty_queue=True,
+        waittime_on_empty_queue=0,
+    )
+    worker.start()
+
+    assert WorkItem.objects.filter(status="F").count() == 3
+    assert executor.queue_size() == 2
+    assert executor.wait(futures[:3]) == [1, 2, 3]
+
+
+@pytest.mark.django_db
+def test_worker_reclaim_orphans():
+
+    executor = SimmateExecutor()
+    futures = executor.submit_many(abs, [-1, -2])
+
+    # pretend a worker grabbed both WorkItems and then died an hour ago
+    worker = SimmateWorker()
+    worker.worker_id = Worker.objects.create(
+        hostname="dead-node",
+        pid=0,
+        last_heartbeat=timezone.now() - timedelta(hours=1),
+    ).id
+    workitem1 = worker.claim_workitem()
+    workitem2 = worker.claim_workitem()
+    assert workitem1.worker_id == worker.worker_id
+
+    # a short lease finds them but a long one doesn't
+    assert WorkItem.reclaim_orphans(lease=7200) == 0
+    assert WorkItem.reclaim_orphans(lease=60) == 2
+    assert executor.queue_size() == 2
+
+    # now mark them as failed instead
+    worker.claim_workitem()
+    worker.claim_workitem()
+    assert WorkItem.reclaim_orphans(lease=60, requeue=False) == 2
+    with pytest.raises(WorkerLostError):
+        futures[0].result()
+
+    # a live worker registers itself while it runs and removes itself from
+    # the heartbeat table when it stops
+    future3 = executor.submit(abs, -3)
+    worker = SimmateWorker(close_on_empty_queue=True, waittime_on_empty_queue=0)
+    worker.start()
+    assert future3.result() == 3
+    assert worker.worker_id is not None
+    assert not Worker.objects.filter(id=worker.worker_id).exists()
+
+
+@pytest.mark.django_db
+def test_worker_priority_and_tags():
+
+    executor = SimmateExecutor()
+    future_low = executor.submit(abs, -1, priority=-5)
+    future_normal = executor.submit(abs, -2)
+    future_high = executor.submit(abs, -3, priority=10)
+    futures_gpu = executor.submit_many(abs, [-4, -5], tags=["gpu"])
+    future_gpu_big = executor.submit(abs, -6, tags=["gpu", "bigmem"])
+
+    # a worker without tags can only run the untagged items, which it
+    # grabs in order of priority
+    worker = SimmateWorker()
+    assert worker.claim_workitem().pk == future_high.pk
+    assert worker.claim_workitem().pk == future_normal.pk
+    assert worker.claim_workitem().pk == future_low.pk
+    assert worker.claim_workitem() is None
+
+    # a gpu worker can't run the item that also needs lots of memory
+    worker = SimmateWorker(tags=["gpu"])
+    assert worker.claim_workitem().pk == futures_gpu[0].pk
+    assert worker.claim_workitem().pk == futures_gpu[1].pk
+    assert worker.claim_workitem() is None
+
+    worker = SimmateWorker(tags=["bigmem", "gpu", "other"])
+    assert worker.claim_workitem().pk == future_gpu_big.pk
+
+
+@pytest.mark.django_db
+def test_worker_heartbeat_row():
+
+    future = SimmateExecutor().submit(Worker.objects.count)
+
+    # the worker's row exists while it runs workitems and is deleted after
+    worker = SimmateWorker(close_on_empty_queue=True, waittime_on_empty_queue=0)
+    worker.start()
+    assert future.result() == 1
+    assert Worker.objects.count() == 0
+
+    # this also happens when the worker stops because of an error
+    def fail():
+        raise KeyboardInterrupt
+
+    worker = SimmateWorker()
+    worker.claim_workitem = fail
+    with pytest.raises(KeyboardInterrupt):
+        worker.start()
+    assert Worker.objects.count() == 0
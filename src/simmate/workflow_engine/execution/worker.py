@@ -1,21 +1,34 @@
 # -*- coding: utf-8 -*-
 
+import multiprocessing
+import os
+import socket
+import threading
 import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
 
-# import pickle
-import cloudpickle  # needed to serialize Prefect workflow runs and tasks
-
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils import timezone
 
 from simmate.configuration.django import setup_full  # ensures setup
-from simmate.workflow_engine.execution.database import WorkItem
-
-# In the future, I might want this worker to be a local dask cluster that has
-# two threads going. One thread will update the queue database with a "heartbeat" to
-# let it know that it is still working on tasks. The other thread will run the
-# given workitems in serial. I could even allow for more threads so that this
-# worker can run multiple workitems at once and in parallel. I'm not sure if
-# asyncio would play into this though.
+from simmate.workflow_engine.execution import serialization
+from simmate.workflow_engine.execution.database import (
+    WorkItem,
+    WorkItemFunction,
+    WorkItemTag,
+    Worker,
+    notify_workitems_completed,
+)
+
+# Each worker has two threads going. One thread updates the queue database with a
+# "heartbeat" to let it know that it is still working on tasks. The other thread
+# runs the given workitems. Running multiple workitems at once is supported
+# through the nslots option, which uses a pool of processes.
 
 # This string is just something fancy to display in the console when a worker
 # starts up.
@@ -39,6 +52,14 @@ class SimmateWorker:
         # settings on what to do when the queue is empty
         close_on_empty_queue=False,
         waittime_on_empty_queue=60,
+        # number of workitems to run at the same time
+        nslots=1,
+        # which workitems this worker is allowed to run
+        tags=None,
+        # settings for the heartbeat and for reclaiming workitems of dead workers
+        heartbeat_interval=60,
+        lease=600,
+        requeue_orphans=True,
     ):
 
         # the maximum number of workitems to run before closing down
@@ -60,103 +81,285 @@ class SimmateWorker:
         # still empty, close the worker.
         self.waittime_on_empty_queue = waittime_on_empty_queue
 
+        # The number of workitems this worker runs in parallel. When this is
+        # above 1, workitems are ran in a pool of processes while this worker
+        # remains the only one that talks to the queue database.
+        self.nslots = nslots
+
+        # This worker only runs workitems whose tags are all in this list. By
+        # default, this means only workitems without any tags are ran.
+        self.tags = tags or []
+
+        # How often (in seconds) this worker tells the database that it's still
+        # alive. This is done in a separate thread so that it continues while
+        # long workitems are running.
+        self.heartbeat_interval = heartbeat_interval
+
+        # When the queue is found to be empty, this worker looks for workitems
+        # whose worker hasn't sent a heartbeat in over `lease` seconds. These are
+        # either put back into the queue or marked as failed (requeue_orphans).
+        # See WorkItem.reclaim_orphans for more.
+        self.lease = lease
+        self.requeue_orphans = requeue_orphans
+
+        # The row in the Worker table for this worker. This is set when the
+        # worker starts.
+        self.worker_id = None
+
+        # functions that this worker has already downloaded. These are stored
+        # as {fxn_id: fxn_pickled}
+        self._functions = {}
+
     def start(self):
 
         # print the header in the console to let the user know the worker started
         print(HEADER_ART)
 
+        # register this worker and start sending heartbeats
+        worker = Worker.objects.create(
+            hostname=socket.gethostname(),
+            pid=os.getpid(),
+            nslots=self.nslots,
+        )
+        self.worker_id = worker.id
+        heartbeat_stop = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=self._send_heartbeats,
+            args=(heartbeat_stop,),
+            daemon=True,
+        )
+        heartbeat_thread.start()
+
         # establish starting point for the worker
         time_start = time.time()
         ntasks_finished = 0
 
+        # keeps track of {local_future: workitem_id} for all workitems that
+        # are currently running
+        running = {}
+
+        # whether the last pass through the loop found an empty queue and then
+        # slept in hopes of it filling back up
+        waited_on_empty_queue = False
+
+        # When we have more than one slot, workitems are ran in separate processes.
+        # These processes are spawned rather than forked. The pool only starts
+        # its processes once the first workitem is submitted, and by then this
+        # process has an open database connection and a running heartbeat
+        # thread -- neither of which can be safely copied into a forked child.
+        if self.nslots > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=self.nslots,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            pool = None
+
         # Loop endlessly until one of the following happens...
         #   the timeout limit is hit
         #   the queue is empty
         #   the nitems limit is hit
-        while True:
+        # Running workitems are always allowed to finish before we exit.
+        try:
+            while True:
+
+                # check for timeout and the number of jobs started so far. If
+                # we've hit either limit, we don't start any new workitems.
+                if (time.time() - time_start) > self.timeout:
+                    # TODO - check wait_on_timeout if running in parallel.
+                    stop_message = "The time-limit for this worker has been hit."
+                elif ntasks_finished + len(running) >= self.nitems_max:
+                    stop_message = "Maxium number of WorkItems hit for this worker."
+                else:
+                    stop_message = None
+
+                # Grab PENDING WorkItems to fill all of our open slots.
+                queue_is_empty = False
+                while (
+                    not stop_message
+                    and len(running) < self.nslots
+                    and ntasks_finished + len(running) < self.nitems_max
+                ):
+                    workitem = self.claim_workitem()
+                    if not workitem:
+                        queue_is_empty = True
+                        break
+
+                    # Print out the job ID that is being ran for the user to see
+                    print(f"Running WorkItem with id {workitem.id}.")
+                    future = self._submit_workitem(pool, workitem)
+                    running[future] = workitem.id
+
+                # If nothing is running, we either shutdown or wait for the
+                # queue to fill up.
+                if not running:
+                    if stop_message:
+                        print(stop_message)
+                        return
 
-            # check for timeout before starting a new workitem and exit
-            # if we've hit the limit.
-            if (time.time() - time_start) > self.timeout:
-                # TODO - check wait_on_timeout if running in parallel.
-                print("The time-limit for this worker has been hit.")
-                return
-
-            # check the number of jobs completed so far, and exit if we hit
-            # the limit
-            if ntasks_finished >= self.nitems_max:
-                print("Maxium number of WorkItems hit for this worker.")
-                return
-
-            # check the length of the queue and while it is empty, we want to
-            # loop. The exception of looping endlessly is if we want the worker
-            # to shutdown instead.
-            while self.queue_size() == 0:
-                # if it is empty, we want to sleep for a little and check again
-                time.sleep(self.waittime_on_empty_queue)
-
-                # This is a special condition where we may want to close the
-                # worker if the queue stays empty
-                if self.close_on_empty_queue:
-                    # after we just waited, let's check the queue size again
-                    if self.queue_size() == 0:
-                        # if it's still empty, we should close the worker
+                    # Before giving up on the queue, see if any workitems were
+                    # left behind by dead workers. If they are put back in the
+                    # queue, we can grab them right away.
+                    nreclaimed = WorkItem.reclaim_orphans(
+                        lease=self.lease,
+                        requeue=self.requeue_orphans,
+                    )
+                    if nreclaimed and self.requeue_orphans:
+                        continue
+
+                    # This is a special condition where we may want to close the
+                    # worker if the queue stays empty
+                    if waited_on_empty_queue and self.close_on_empty_queue:
                         print("The queue is empty so the worker has been closed.")
                         return
 
-            # If we've made it this far, we're ready to grab a new WorkItem
-            # and run it!
-            # Query for PENDING WorkItems, lock it for editting, and update
-            # the status to RUNNING
-            workitem = WorkItem.objects.select_for_update().filter(status="P").first()
+                    # if it is empty, we want to sleep for a little and check again
+                    time.sleep(self.waittime_on_empty_queue)
+                    waited_on_empty_queue = True
+                    continue
+                waited_on_empty_queue = False
+
+                # Wait for at least one workitem to finish. If we have open slots
+                # because the queue was empty, we only wait so long before
+                # checking the queue again.
+                done, _ = wait(
+                    running,
+                    timeout=self.waittime_on_empty_queue if queue_is_empty else None,
+                    return_when=FIRST_COMPLETED,
+                )
+
+                for future in done:
+                    workitem_id = running.pop(future)
+
+                    # The workitem itself can't raise an error (see _run_workitem),
+                    # but the process running it can be lost. We treat this just
+                    # like an error from the workitem.
+                    try:
+                        result_pickled = future.result()
+                    except Exception as exception:
+                        result_pickled = serialization.dumps(exception)
+
+                    # update the workitem's result and status. This is a single
+                    # UPDATE statement, so no lock is needed.
+                    WorkItem.objects.filter(pk=workitem_id).update(
+                        result=result_pickled,
+                        status="F",
+                        updated_at=timezone.now(),
+                    )
+                    notify_workitems_completed()
+
+                    # mark down that we've completed one WorkItem
+                    ntasks_finished += 1
+
+                    # Print out the job ID that was just finished for the user to see.
+                    print("Completed WorkItem.")
+
+        finally:
+            if pool:
+                pool.shutdown()
+            heartbeat_stop.set()
+            heartbeat_thread.join()
+            # Remove this worker from the heartbeat table so that stopped workers
+            # don't build up. Any WorkItems it still had running are left without
+            # a worker and are reclaimed once their lease is up.
+            Worker.objects.filter(id=self.worker_id).delete()
+
+    def _send_heartbeats(self, stop_event):
+        """
+        Updates this worker's last_heartbeat every heartbeat_interval seconds
+        until stop_event is set. This is meant to be ran in a separate thread.
+        """
+        try:
+            while not stop_event.wait(self.heartbeat_interval):
+                # A failed heartbeat (e.g. the database is briefly unreachable)
+                # shouldn't stop the worker or future heartbeats.
+                try:
+                    Worker.objects.filter(id=self.worker_id).update(
+                        last_heartbeat=timezone.now()
+                    )
+                except Exception as exception:
+                    print(f"Failed to send heartbeat: {exception}")
+        finally:
+            # each thread has its own database connection, so we close it here
+            connection.close()
+
+    def _submit_workitem(self, pool, workitem):
+        """
+        Starts running the WorkItem and returns a concurrent.futures.Future for it.
 
-            # our lock exists only within this transation
-            with transaction.atomic():
-                # update the status to running before starting it so no other
-                # worker tries to grab the same WorkItem
-                workitem.status = "R"
-                # TODO -- indicate that the WorkItem is with this Worker (relationship)
-                workitem.save()
-
-            # Print out the job ID that is being ran for the user to see
-            print(f"Running WorkItem with id {workitem.id}.")
-
-            # now let's unpickle the WorkItem components
-            fxn = cloudpickle.loads(workitem.fxn)
-            args = cloudpickle.loads(workitem.args)
-            kwargs = cloudpickle.loads(workitem.kwargs)
-
-            # Try running the WorkItem
-            try:
-                result = fxn(*args, **kwargs)
-            # if it fails, we want to "capture" the error and return it
-            # rather than have the Worker fail itself.
-            except Exception as exception:
-                result = exception
-
-            # whatever the result, we need to try to pickle it now
-            try:
-                result_pickled = cloudpickle.dumps(result)
-            # if this fails, we even want to pickle the error and return it
-            except Exception as exception:
-                result_pickled = cloudpickle.dumps(exception)
-
-            # requery the WorkItem to restart our lock
-            workitem = WorkItem.objects.select_for_update().get(pk=workitem.pk)
+        If there is no pool (i.e. we only have one slot), the WorkItem is ran
+        right here and an already-completed Future is returned.
+        """
+        fxn_pickled = self._get_function(workitem.fxn_id)
+        if pool:
+            return pool.submit(
+                _run_workitem,
+                fxn_pickled,
+                workitem.args,
+                workitem.kwargs,
+            )
+        future = Future()
+        future.set_result(_run_workitem(fxn_pickled, workitem.args, workitem.kwargs))
+        return future
+
+    def _get_function(self, fxn_id):
+        """
+        Returns the serialized function with the given id. Functions never
+        change, so each one is only downloaded once by this worker.
+        """
+        if fxn_id not in self._functions:
+            self._functions[fxn_id] = bytes(
+                WorkItemFunction.objects.values_list("data", flat=True).get(id=fxn_id)
+            )
+        return self._functions[fxn_id]
 
-            # our lock exists only within this transation
-            with transaction.atomic():
-                # pickle the result and update the workitem's result and status
-                # !!! should I have the pickle inside of a Try?
-                workitem.result = result_pickled
-                workitem.status = "F"
-                workitem.save()
+    def claim_workitem(self):
+        """
+        Grabs the PENDING WorkItem with the highest priority (and the oldest
+        one if there's a tie), marks it as RUNNING, and returns it. Only WorkItems
+        whose tags are all in this worker's tags are considered. If there are no
+        WorkItems for this worker, None is returned instead.
 
-            # mark down that we've completed one WorkItem
-            ntasks_finished += 1
+        Selecting and updating the WorkItem is done atomically, so two workers
+        will never claim the same WorkItem.
+        """
 
-            # Print out the job ID that was just finished for the user to see.
-            print("Completed WorkItem.")
+        # We exclude any WorkItem that has a tag this worker doesn't have
+        pending_items = (
+            WorkItem.objects.filter(status="P")
+            .exclude(tags__in=WorkItemTag.objects.exclude(name__in=self.tags))
+            .order_by("-priority", "created_at", "id")
+        )
+
+        # On databases that support it (e.g. Postgres), we lock the first row
+        # that isn't already locked by another worker. Workers therefore never
+        # wait on each other -- they just grab the next row instead.
+        # https://www.postgresql.org/docs/current/sql-select.html#SQL-FOR-UPDATE-SHARE
+        if connection.features.has_select_for_update_skip_locked:
+            # our lock exists only within this transation
+            with transaction.atomic():
+                workitem = pending_items.select_for_update(skip_locked=True).first()
+                if workitem:
+                    workitem.status = "R"
+                    workitem.worker_id = self.worker_id
+                    workitem.save(update_fields=["status", "worker", "updated_at"])
+            return workitem
+
+        # Other databases (e.g. SQLite) don't support row-level locks. Instead,
+        # we use a conditional UPDATE that only succeeds if the WorkItem is
+        # still pending. If another worker claimed it first, zero rows are
+        # updated and we try the next WorkItem.
+        while True:
+            workitem_id = pending_items.values_list("id", flat=True).first()
+            if not workitem_id:
+                return None
+            nupdated = WorkItem.objects.filter(id=workitem_id, status="P").update(
+                status="R",
+                worker_id=self.worker_id,
+                updated_at=timezone.now(),
+            )
+            if nupdated:
+                return WorkItem.objects.get(id=workitem_id)
 
     def queue_size(self):
         """
@@ -168,3 +371,37 @@ class SimmateWorker:
         #   ...filter(Q(status="P") | Q(status="R"))
         queue_size = WorkItem.objects.filter(status="P").count()
         return queue_size
+
+
+def _run_workitem(fxn_pickled, args_pickled, kwargs_pickled):
+    """
+    Unpickles the WorkItem components, runs them, and returns the pickled result.
+
+    This is a module-level function (rather than a method) so that it can be sent
+    to other processes when the worker has more than one slot.
+    """
+
+    # now let's unpickle the WorkItem components
+    fxn = serialization.loads(fxn_pickled)
+    args = serialization.loads(args_pickled)
+    kwargs = serialization.loads(kwargs_pickled)
+
+    # results are stored in the same way that the inputs were
+    settings = serialization.get_settings(args_pickled)
+
+    # Try running the WorkItem
+    try:
+        result = fxn(*args, **kwargs)
+    # if it fails, we want to "capture" the error and return it
+    # rather than have the Worker fail itself.
+    except Exception as exception:
+        result = exception
+
+    # whatever the result, we need to try to pickle it now
+    try:
+        result_pickled = serialization.dumps(result, **settings)
+    # if this fails, we even want to pickle the error and return it
+    except Exception as exception:
+        result_pickled = serialization.dumps(exception, **settings)
+
+    return result_pickled
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
+import contextvars
 import os
 import platform
 import time
 import signal
 import subprocess
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas
 
@@ -17,15 +20,18 @@ from simmate.utilities import get_directory, make_archive
 
 from typing import List, Any
 from pymatgen.core.structure import Structure
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import (
+    ErrorHandler,
+    clear_file_caches,
+    use_file_cache,
+)
 
 # cleanup_on_fail=False, # TODO I should add a Prefect state_handler that can
 # reset the working directory between task retries -- in some cases we may
 # want to delete the entire directory.
 
-# OPTIMIZE: I think this class would greatly benefit from asyncio so that we
-# know exactly when a shelltask completes, rather than looping and checking every
-# set timestep.
+# By default, we use asyncio to supervise the shelltask so that we know exactly
+# when it completes, rather than looping and checking every set timestep.
 # https://docs.python.org/3/library/asyncio-subprocess.html#asyncio.create_subprocess_exec
 
 
@@ -172,6 +178,19 @@ class SupervisedStagedShellTask(Task):
     # we run monitoring functions every 5 minutes (10*30=300s=5min).
     monitor_freq = 30
 
+    # Whether to use asyncio while monitoring the shelltask. This lets us know
+    # the moment that the shelltask completes, rather than only finding out
+    # at the next polling_timestep. If an asyncio event loop is already running
+    # (e.g. in Jupyter), we fall back to polling.
+    use_asyncio = True
+
+    # Whether to run the check() of every handler at the same time using
+    # threads. Handlers often read the same output files, and these are only
+    # parsed once (see get_parsed_file), so this mostly helps when handlers
+    # spend their time on I/O. The highest-priority error is still the one
+    # applied.
+    parallel_checks = False
+
     def __init__(
         self,
         structure: Structure = None,
@@ -182,6 +201,8 @@ class SupervisedStagedShellTask(Task):
         monitor: bool = None,
         polling_timestep: float = None,
         monitor_freq: int = None,
+        use_asyncio: bool = None,
+        parallel_checks: bool = None,
         save_corrections_to_file: bool = True,
         corrections_filename: str = "simmate_corrections.csv",
         compress_output: bool = False,
@@ -227,6 +248,15 @@ class SupervisedStagedShellTask(Task):
             the monitor checks every other loop -- or every 2*10 = 20 seconds. The
             default values of polling_timestep=10 and monitor_freq=30 indicate that
             we run monitoring functions every 5 minutes (10*30=300s=5min).
+        use_asyncio : bool (optional)
+            Whether to use asyncio while monitoring the command. This detects
+            the moment the command completes, rather than checking every
+            polling_timestep. The monitors still run every
+            polling_timestep*monitor_freq seconds.
+        parallel_checks : bool (optional)
+            Whether to run the check() of all handlers at the same time using
+            threads. The correction of the highest-priority handler that finds
+            an error is still the only one applied. The default is False.
         save_corrections_to_file : bool (optional)
             Whether to write a log file of the corrections made. The default is True.
         corrections_filename : str (optional)
@@ -262,6 +292,10 @@ class SupervisedStagedShellTask(Task):
             self.polling_timestep = polling_timestep
         if monitor_freq:
             self.monitor_freq = monitor_freq
+        if use_asyncio is not None:
+            self.use_asyncio = use_asyncio
+        if parallel_checks is not None:
+            self.parallel_checks = parallel_checks
         # These parameters will never have a default which is set to the attribute,
         # so go ahead and set them from what was given in the init
         self.directory = directory
@@ -323,6 +357,20 @@ class SupervisedStagedShellTask(Task):
 
         """
 
+        # Error handlers share the output files that they scan and parse (see
+        # get_log_scanner and get_parsed_file). These are only kept for this
+        # run, so nothing carries over to other runs -- even if we raise an error.
+        with use_file_cache():
+            return self._execute(directory, command)
+
+    def _execute(self, directory: str, command: str):
+        """
+        The main loop of execute(), which is ran with a FileCache active.
+
+        Users should never call this directly becuase this is instead applied
+        within the execute() method.
+        """
+
         # some error_handlers run while the shelltask is running. These are known as
         # Monitors and are labled via the is_monitor attribute. It's good for us
         # to separate these out from other error_handlers.
@@ -343,93 +391,37 @@ class SupervisedStagedShellTask(Task):
         # number of attempts made on the calculation.
         while len(corrections) <= self.max_corrections:
 
-            # launch the shelltask without waiting for it to complete. Also,
-            # make sure to use common shell commands and to set the working
-            # directory.
-            # The preexec_fn keyword allows us to properly terminate jobs that
-            # are launched with parallel processes (such as mpirun). This assigns
-            # a parent id to it that we use when killing a job (if an error
-            # handler calls for us to do so). This isn't possible on Windows though.
-            # Stderr keyword indicates that we should capture the error if one
-            # occurs so that we can report it to the user.
-            process = subprocess.Popen(
-                command,
-                cwd=directory,
-                shell=True,
-                preexec_fn=None if platform.system() == "Windows" else os.setsid,
-                stderr=subprocess.PIPE,
-            )
+            # Each attempt rewrites the output files, so any error handlers that
+            # scan these files for messages need to start from the beginning.
+            clear_file_caches(directory)
+
+            # Launch the shelltask and supervise it until it either completes or
+            # a monitor finds an error. We prefer using asyncio for this because
+            # it lets us know the moment the shelltask completes. However, asyncio
+            # can't be used if an event loop is already running in this thread
+            # (e.g. in Jupyter), so we fall back to polling in that case.
+            # Both of these are only relevent when we have monitors. Otherwise,
+            # we simply wait for the shelltask to finish.
+            if (
+                self.monitor
+                and self.monitors
+                and self.use_asyncio
+                and not _is_event_loop_running()
+            ):
+                returncode, errors, has_error = asyncio.run(
+                    self._run_and_monitor_async(directory, command, corrections)
+                )
+            else:
+                returncode, errors, has_error = self._run_and_monitor(
+                    directory, command, corrections
+                )
 
-            # Assume the shelltask has no errors until proven otherwise
-            has_error = False
-
-            # If monitor=True, then we want to supervise this shelltask as it
-            # runs. If montors=[m1,m2,...], then we have monitors in place to actually
-            # perform the monitoring. If both of these cases are true, then we
-            # want to go through the error_handlers to check for errors until
-            # the shelltask completes.
-            if self.monitor and self.monitors:
-
-                # ------ start of monitor while loop ------
-
-                # We want to loop until we find an error and keep track of
-                # which loops to run the monitor function on because we don't
-                # want them to run nonstop. This variable allows us to monitor
-                # checks every Nth loop, while we check the shelltask status
-                # on all other loops.
-                monitor_freq_n = 0
-                while not has_error:
-                    monitor_freq_n += 1
-                    # Sleep the set amount before checking the shelltask status
-                    time.sleep(self.polling_timestep)
-
-                    # check if the shelltasks is complete. poll will return 0
-                    # when it's done, in which case we break the loop
-                    if process.poll() is not None:
-                        break
-                    # check whether we should run monitors on this poll loop
-                    if monitor_freq_n % self.monitor_freq == 0:
-                        # iterate through each monitor
-                        for error_handler in self.monitors:
-                            # check if there's an error with this error_handler
-                            # and grab the error if so
-                            error = error_handler.check(directory)
-                            if error:
-                                # determine if it is_terminating
-                                if error_handler.is_terminating:
-                                    # If so, we kill the process but don't apply
-                                    # the fix quite yet. That step is done below.
-                                    self._terminate_job(process, command)
-                                # Otherwise apply the fix and let the shelltask end
-                                # naturally. An example of this is for codes
-                                # where you add a STOP file to get it to
-                                # finish rather than just killing the process.
-                                # This is the special case error_handler that I talk
-                                # about in my notes, where we really want to
-                                # end the shelltask right away.
-                                else:
-                                    # apply the fix now
-                                    correction = error_handler.correct(directory)
-                                    # record what's been changed
-                                    corrections.append((error_handler.name, correction))
-                                # there's no need to look at the other monitors
-                                # so break from the for-loop. We also don't
-                                # need to monitor the stagedtask anymore since we just
-                                # terminated it or signaled for its graceful
-                                # end. So update the while-loop condition.
-                                has_error = True
-                                break
-                # ------ end of monitor while loop ------
-            # Now just wait for the process to finish. Note we use communicate
-            # instead of the .wait() method. This is the recommended method
-            # when we have stderr=subprocess.PIPE, which we use above.
-            output, errors = process.communicate()
             # check if the return code is non-zero and thus failed.
             # The 'not has_error' is because terminate() will give a nonzero
             # when a monitor is triggered. We don't want to raise that
             # exception here but instead let the monitor handle that
             # error in the code below.
-            if process.returncode != 0 and not has_error:
+            if returncode != 0 and not has_error:
                 # convert the error from bytes to a string
                 errors = errors.decode("utf-8")
                 # and report the error to the user
@@ -440,29 +432,24 @@ class SupervisedStagedShellTask(Task):
             # priority than the monitor triggered above (if there was one).
             # Since the error_handlers are in order of priority, only the first
             # will actually be applied and then we can retry the calc.
-            for error_handler in self.error_handlers:
-
-                # NOTE - The following special case is handled above:
-                #   error_handler.is_monitor and not error_handler.is_terminating
-                # BUG: I can see this being a source of bugs in the process so I
-                # need to reconsider subclassing this special case. For now,
-                # users should have this case at the lowest priority.
 
-                # check if there's an error with this error_handler and grab the
-                # error if there is one
-                error = error_handler.check(directory)
-                if error:
-                    # record the error in case it wasn't done so above
-                    has_error = True
-                    # And apply the proper correction if there is one.
-                    # Some error_handlers will even raise an error here signaling
-                    # that the stagedtask is unrecoverable and a lost cause.
-                    correction = error_handler.correct(directory)
-                    # record what's been changed
-                    corrections.append((error_handler.name, correction))
-                    # break from the error_handler for-loop as we only apply the
-                    # highest priority fix and nothing else.
-                    break
+            # NOTE - The following special case is handled above:
+            #   error_handler.is_monitor and not error_handler.is_terminating
+            # BUG: I can see this being a source of bugs in the process so I
+            # need to reconsider subclassing this special case. For now,
+            # users should have this case at the lowest priority.
+
+            # find the highest priority error_handler that has an error
+            error_handler = self._find_error(self.error_handlers, directory)
+            if error_handler:
+                # record the error in case it wasn't done so above
+                has_error = True
+                # And apply the proper correction if there is one.
+                # Some error_handlers will even raise an error here signaling
+                # that the stagedtask is unrecoverable and a lost cause.
+                correction = error_handler.correct(directory)
+                # record what's been changed
+                corrections.append((error_handler.name, correction))
             # write the log of corrections to file if requested. This is written
             # as a CSV file format and done every while-loop cycle because it
             # lets the user monitor the calculation and error handlers applied
@@ -499,6 +486,209 @@ class SupervisedStagedShellTask(Task):
         # now return the corrections for them to stored/used elsewhere
         return corrections
 
+    def _run_and_monitor(self, directory: str, command: str, corrections: list):
+        """
+        Launches the command and, if monitoring is turned on, periodically checks
+        whether it has finished and runs the monitors. The shelltask's status
+        is checked every polling_timestep seconds.
+
+        Users should never call this directly becuase this is instead applied
+        within the execute() method. See _run_and_monitor_async for the
+        faster, asyncio version of this method.
+
+        Returns
+        -------
+        returncode : int
+            The returncode of the shelltask.
+        errors : bytes
+            The stderr of the shelltask.
+        has_error : bool
+            Whether one of the monitors found an error.
+        """
+
+        # launch the shelltask without waiting for it to complete. Also,
+        # make sure to use common shell commands and to set the working
+        # directory.
+        # The preexec_fn keyword allows us to properly terminate jobs that
+        # are launched with parallel processes (such as mpirun). This assigns
+        # a parent id to it that we use when killing a job (if an error
+        # handler calls for us to do so). This isn't possible on Windows though.
+        # Stderr keyword indicates that we should capture the error if one
+        # occurs so that we can report it to the user.
+        process = subprocess.Popen(
+            command,
+            cwd=directory,
+            shell=True,
+            preexec_fn=None if platform.system() == "Windows" else os.setsid,
+            stderr=subprocess.PIPE,
+        )
+
+        # Assume the shelltask has no errors until proven otherwise
+        has_error = False
+
+        # If monitor=True, then we want to supervise this shelltask as it
+        # runs. If montors=[m1,m2,...], then we have monitors in place to actually
+        # perform the monitoring. If both of these cases are true, then we
+        # want to go through the error_handlers to check for errors until
+        # the shelltask completes.
+        if self.monitor and self.monitors:
+
+            # ------ start of monitor while loop ------
+
+            # We want to loop until we find an error and keep track of
+            # which loops to run the monitor function on because we don't
+            # want them to run nonstop. This variable allows us to monitor
+            # checks every Nth loop, while we check the shelltask status
+            # on all other loops.
+            monitor_freq_n = 0
+            while not has_error:
+                monitor_freq_n += 1
+                # Sleep the set amount before checking the shelltask status
+                time.sleep(self.polling_timestep)
+
+                # check if the shelltasks is complete. poll will return 0
+                # when it's done, in which case we break the loop
+                if process.poll() is not None:
+                    break
+                # check whether we should run monitors on this poll loop
+                if monitor_freq_n % self.monitor_freq == 0:
+                    has_error = self._check_monitors(
+                        process, directory, command, corrections
+                    )
+            # ------ end of monitor while loop ------
+
+        # Now just wait for the process to finish. Note we use communicate
+        # instead of the .wait() method. This is the recommended method
+        # when we have stderr=subprocess.PIPE, which we use above.
+        output, errors = process.communicate()
+
+        return process.returncode, errors, has_error
+
+    async def _run_and_monitor_async(
+        self,
+        directory: str,
+        command: str,
+        corrections: list,
+    ):
+        """
+        The asyncio version of _run_and_monitor. Rather than checking whether
+        the shelltask is done every polling_timestep, we await the shelltask
+        directly and so we know the moment it completes. Monitors are ran on
+        a separate timer of every polling_timestep*monitor_freq seconds, which
+        is the same frequency as in _run_and_monitor.
+
+        Users should never call this directly becuase this is instead applied
+        within the execute() method.
+        """
+
+        # launch the shelltask without waiting for it to complete. See
+        # _run_and_monitor for why we use these options.
+        process = await asyncio.create_subprocess_shell(
+            command,
+            cwd=directory,
+            preexec_fn=None if platform.system() == "Windows" else os.setsid,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        # Start waiting on the shelltask in the background. Using communicate
+        # ensures we continuously read stderr so that the shelltask never hangs
+        # on a full pipe.
+        completion = asyncio.ensure_future(process.communicate())
+
+        # Assume the shelltask has no errors until proven otherwise
+        has_error = False
+
+        # Wait for the shelltask to complete, but wake up to run the monitors
+        # every monitor_timestep. asyncio.wait returns as soon as the shelltask
+        # completes, even if we are in the middle of this timestep.
+        monitor_timestep = self.polling_timestep * self.monitor_freq
+        while not has_error:
+            done, _ = await asyncio.wait({completion}, timeout=monitor_timestep)
+            if done:
+                break
+            has_error = self._check_monitors(process, directory, command, corrections)
+
+        # wait for the process to finish (this is immediate if it's done already
+        # or if a monitor just killed it)
+        output, errors = await completion
+
+        return process.returncode, errors, has_error
+
+    def _check_monitors(
+        self,
+        process: subprocess.Popen,
+        directory: str,
+        command: str,
+        corrections: list,
+    ):
+        """
+        Runs all monitors and returns True if one of them found an error.
+
+        Users should never call this directly becuase this is instead applied
+        within the execute() method.
+        """
+        # find the highest priority monitor that has an error
+        error_handler = self._find_error(self.monitors, directory)
+        if not error_handler:
+            return False
+
+        # determine if it is_terminating
+        if error_handler.is_terminating:
+            # If so, we kill the process but don't apply
+            # the fix quite yet. That step is done in execute().
+            self._terminate_job(process, command)
+        # Otherwise apply the fix and let the shelltask end
+        # naturally. An example of this is for codes
+        # where you add a STOP file to get it to
+        # finish rather than just killing the process.
+        # This is the special case error_handler that I talk
+        # about in my notes, where we really want to
+        # end the shelltask right away.
+        else:
+            # apply the fix now
+            correction = error_handler.correct(directory)
+            # record what's been changed
+            corrections.append((error_handler.name, correction))
+        # We don't need to monitor the stagedtask anymore since we just
+        # terminated it or signaled for its graceful end.
+        return True
+
+    def _find_error(self, error_handlers: List[ErrorHandler], directory: str):
+        """
+        Returns the first handler (i.e. the highest priority one) whose check()
+        finds an error, or None if no errors are found.
+
+        By default, handlers are checked one at a time and we stop at the first
+        error. If parallel_checks is True, all handlers are checked at once
+        using threads instead.
+
+        Users should never call this directly becuase this is instead applied
+        within the execute() method.
+        """
+
+        if self.parallel_checks and len(error_handlers) > 1:
+            # map returns results in the same order as the handlers. Each
+            # check runs in a copy of our context so that it uses the same
+            # FileCache (see use_file_cache).
+            contexts = [contextvars.copy_context() for _ in error_handlers]
+            with ThreadPoolExecutor(max_workers=len(error_handlers)) as pool:
+                errors = list(
+                    pool.map(
+                        lambda handler, context: context.run(handler.check, directory),
+                        error_handlers,
+                        contexts,
+                    )
+                )
+            for error_handler, error in zip(error_handlers, errors):
+                if error:
+                    return error_handler
+            return None
+
+        for error_handler in error_handlers:
+            if error_handler.check(directory):
+                return error_handler
+        return None
+
     @staticmethod
     def _terminate_job(process: subprocess.Popen, command: str):
         """
@@ -538,8 +728,14 @@ class SupervisedStagedShellTask(Task):
         # which # is also passed on to all child processes.
         # This command also doesn not work on windows, so I need to address this
         # as well.
+        # If the process already finished (and was cleaned up) by the time we
+        # get here, there is nothing left to kill. This is common when using
+        # asyncio, which cleans up processes the moment they finish.
         if operating_system != "Windows":
-            os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+            try:
+                os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+            except ProcessLookupError:
+                pass
         # note: SIGTERM is the normal signal but I use SIGKILL to try to address
         # permission errors.
         else:
@@ -679,6 +875,18 @@ class SupervisedStagedShellTask(Task):
 # to exit.
 
 
+def _is_event_loop_running():
+    """
+    Checks whether an asyncio event loop is already running in this thread, in
+    which case we can't start a new one with asyncio.run().
+    """
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
 class MaxCorrectionsError(Exception):
     pass
 
@@ -18,10 +18,11 @@
 # test max_errors limit
 
 import os
+import time
 
 import pytest
 
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import ErrorHandler, get_log_scanner
 from simmate.workflow_engine.tasks.supervised_staged_shell_task import (
     SupervisedStagedShellTask as S3Task,
     NonZeroExitError,
@@ -168,3 +169,74 @@ def test_s3task_8(tmpdir):
         monitor_freq=2,
     )
     pytest.raises(MaxCorrectionsError, task.run, directory=tmpdir)
+
+
+def test_s3task_9(tmpdir):
+    # with asyncio, we know the moment the command finishes, even if the
+    # polling_timestep is long
+    task = DummyTask(
+        command="sleep 0.2",
+        error_handlers=[AlwaysPassesMonitor()],
+        polling_timestep=60,
+        monitor_freq=1,
+    )
+    time_start = time.time()
+    assert task.run(directory=tmpdir)["corrections"] == []
+    assert time.time() - time_start < 30
+
+
+def test_s3task_10(tmpdir):
+    # monitor failures with asyncio and with polling should give the same result
+    for use_asyncio in [True, False]:
+        task = DummyTask(
+            command="sleep 5",
+            error_handlers=[AlwaysFailsMonitor()],
+            polling_timestep=0.1,
+            monitor_freq=1,
+            max_corrections=1,
+            use_asyncio=use_asyncio,
+        )
+        time_start = time.time()
+        pytest.raises(MaxCorrectionsError, task.run, directory=tmpdir)
+        # the monitor should kill the command rather than waiting for it
+        assert time.time() - time_start < 5
+
+
+def test_s3task_11(tmpdir):
+    # checking handlers in parallel should still apply the highest priority fix
+    task = DummyTask(
+        error_handlers=[AlwaysPassesHandler(), AlwaysFailsHandler()],
+        max_corrections=1,
+        parallel_checks=True,
+    )
+    pytest.raises(MaxCorrectionsError, task.run, directory=tmpdir)
+    assert task._find_error(task.error_handlers, tmpdir) is task.error_handlers[1]
+
+
+class RecordsScannerHandler(ErrorHandler):
+    # records the LogScanner that each check is given
+    def __init__(self):
+        self.scanners = []
+
+    def check(self, directory):
+        self.scanners.append(get_log_scanner(os.path.join(directory, "dummy.out")))
+        return False
+
+    def correct(self, directory):
+        raise Exception
+
+
+def test_s3task_12(tmpdir):
+    # handlers share scanners within a run (even with parallel checks), but
+    # nothing is kept once the run ends -- even when it raises an error
+    handlers = [RecordsScannerHandler(), RecordsScannerHandler()]
+    task = DummyTask(error_handlers=handlers, parallel_checks=True)
+    task.run(directory=tmpdir)
+    assert handlers[0].scanners[-1] is handlers[1].scanners[-1]
+
+    task.run(directory=tmpdir)
+    assert handlers[0].scanners[-1] is not handlers[0].scanners[0]
+
+    task = DummyTask(command="NonexistantCommand 404", error_handlers=handlers)
+    pytest.raises(NonZeroExitError, task.run, directory=tmpdir)
+    assert get_log_scanner(tmpdir) is not get_log_scanner(tmpdir)
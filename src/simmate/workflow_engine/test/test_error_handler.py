@@ -2,7 +2,13 @@
 
 import os
 
-from simmate.workflow_engine.error_handler import ErrorHandler
+from simmate.workflow_engine.error_handler import (
+    ErrorHandler,
+    get_log_scanner,
+    get_parsed_file,
+    clear_file_caches,
+    use_file_cache,
+)
 
 
 class CheckREADME(ErrorHandler):
@@ -24,3 +30,105 @@ def test_error_handler():
     handler = CheckREADME()
 
     assert handler.check(directory=os.path.dirname(__file__))
+
+
+class CheckExample(ErrorHandler):
+    filename_to_check = "example.out"
+    possible_error_messages = ["ERROR"]
+
+    def correct(self, directory):
+        return "ExampleCorrection"
+
+
+def test_log_scanner(tmpdir):
+
+    filename = os.path.join(tmpdir, "example.out")
+    messages = ["ERROR A", "ERROR AB", "B ERROR", "ERROR C"]
+
+    with use_file_cache():
+        # handlers in the same task run share a scanner
+        scanner = get_log_scanner(filename)
+        assert get_log_scanner(filename) is scanner
+
+        # the file doesn't exist yet
+        assert scanner.find(messages) == []
+
+        # messages that overlap or contain one another are all found
+        with open(filename, "w") as file:
+            file.write("line 1\nERROR AB ERROR")
+        assert scanner.find(messages) == ["ERROR A", "ERROR AB", "B ERROR"]
+
+        # a message split between two writes is still found, and messages stay
+        # found even though they aren't in the new output
+        with open(filename, "a") as file:
+            file.write(" C\n")
+        assert scanner.find(messages) == messages
+
+        # a rewritten file starts the search over
+        with open(filename, "w") as file:
+            file.write("ERROR C")
+        clear_file_caches(tmpdir)
+        assert get_log_scanner(filename).find(messages) == ["ERROR C"]
+
+
+def test_file_cache_scope(tmpdir):
+
+    filename = os.path.join(tmpdir, "example.out")
+    handler = CheckExample()
+    with open(filename, "w") as file:
+        file.write("ERROR")
+
+    # a task run remembers what it found...
+    with use_file_cache():
+        assert handler.check(tmpdir)
+        with open(filename, "w") as file:
+            file.write("FINE!")
+        assert handler.check(tmpdir)
+
+    # ...but nothing carries over to other runs or to direct checks, even
+    # though the file was rewritten without shrinking
+    with use_file_cache():
+        assert not handler.check(tmpdir)
+    assert get_log_scanner(filename) is not get_log_scanner(filename)
+    assert not handler.check(tmpdir)
+    with open(filename, "w") as file:
+        file.write("ERROR")
+    assert handler.check(tmpdir)
+
+
+def test_parsed_file(tmpdir):
+
+    filename = os.path.join(tmpdir, "example.out")
+    calls = []
+
+    def parser(filename):
+        calls.append(filename)
+        with open(filename) as file:
+            return file.read()
+
+    with use_file_cache():
+        # the file doesn't exist yet
+        assert get_parsed_file(filename, parser) is None
+
+        # the file is only parsed once while it stays the same
+        with open(filename, "w") as file:
+            file.write("line 1\n")
+        assert get_parsed_file(filename, parser) == "line 1\n"
+        assert get_parsed_file(filename, parser) == "line 1\n"
+        assert len(calls) == 1
+
+        # and parsed again once it changes
+        with open(filename, "a") as file:
+            file.write("line 2\n")
+        assert get_parsed_file(filename, parser) == "line 1\nline 2\n"
+        assert len(calls) == 2
+
+        # clearing the cache forces a new parse
+        clear_file_caches(tmpdir)
+        get_parsed_file(filename, parser)
+        assert len(calls) == 3
+
+    # outside of a task run, the file is parsed every time
+    get_parsed_file(filename, parser)
+    get_parsed_file(filename, parser)
+    assert len(calls) == 5
@@ -3,6 +3,8 @@
 import prefect
 from prefect import Task
 
+from simmate.database.base_data_types.calculation import notify_calculations_saved
+
 
 class SaveOutputTask(Task):
     def __init__(self, calculation_table, **kwargs):
@@ -30,4 +32,7 @@ class SaveOutputTask(Task):
         # now update the calculation entry with our results
         calculation.update_from_vasp_run(vasprun, corrections, directory)
 
+        # let anything waiting on new results know (e.g. a SearchEngine)
+        notify_calculations_saved()
+
         return calculation.id